@@ -2,9 +2,14 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 from website import create_app, socketio
+from website.chat import flush_quietly
 
 app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
-    socketio.run(app, debug=True, port=port)
+    try:
+        socketio.run(app, debug=True, port=port)
+    finally:
+        # Write the chat lines still buffered (gunicorn does this in gunicorn.conf.py)
+        flush_quietly(app)
@@ -0,0 +1,168 @@
+"""
+bench_indexes.py - Shows the hot item/chat queries moving from table scans
+to index scans once the model indexes exist.
+
+Fills a scratch database with fake users, items and chats, then prints the
+query plan and median latency of each query without and with the indexes.
+
+    python benchmarks/bench_indexes.py                 # 100k items, temp SQLite file
+    python benchmarks/bench_indexes.py --rows 500000
+    python benchmarks/bench_indexes.py --url postgresql://localhost/bench   # throwaway DB!
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.extensions import db  # noqa: E402  pylint: disable=wrong-import-position
+from website import models  # noqa: E402,F401  pylint: disable=wrong-import-position,unused-import
+
+SELLERS = 2000
+
+QUERIES = {
+    "browse feed, first page": (
+        "SELECT * FROM item WHERE live_on_market = :live "
+        "ORDER BY date_created DESC, id DESC LIMIT 25"
+    ),
+    "browse feed, deep page": (
+        "SELECT * FROM item WHERE live_on_market = :live "
+        "AND (date_created, id) < (:created, :item_id) "
+        "ORDER BY date_created DESC, id DESC LIMIT 25"
+    ),
+    "seller listings": (
+        "SELECT * FROM item WHERE seller_id = :seller_id "
+        "ORDER BY date_created DESC, id DESC LIMIT 25"
+    ),
+    "chats about an item": "SELECT * FROM chat WHERE item_id = :item_id",
+    "chats of a seller": "SELECT * FROM chat WHERE seller_id = :seller_id",
+}
+
+
+def fill(engine, rows):
+    """Creates the schema without our indexes and inserts fake data."""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(conn)
+
+        now = datetime.utcnow()
+        conn.execute(db.metadata.tables["user"].insert(), [
+            {"id": i, "email": f"user{i}@colby.edu", "password_hash": "x",
+             "first_name": "User", "last_name": str(i), "date_created": now}
+            for i in range(1, SELLERS + 1)
+        ])
+
+        rng = random.Random(42)
+        batch = []
+        for i in range(1, rows + 1):
+            batch.append({
+                "id": i,
+                "seller_id": rng.randint(1, SELLERS),
+                "name": f"Item {i}",
+                "description": "A perfectly good thing",
+                "item_photos": "/static/assets/item_placeholder.svg",
+                "price": round(rng.uniform(1, 500), 2),
+                "condition": rng.choice(["New", "Like new", "Good", "Fair"]),
+                "live_on_market": rng.random() < 0.95,
+                "date_created": now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+            })
+            if len(batch) == 10000:
+                conn.execute(db.metadata.tables["item"].insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(db.metadata.tables["item"].insert(), batch)
+
+        conn.execute(db.metadata.tables["chat"].insert(), [
+            {"item_id": rng.randint(1, rows), "seller_id": rng.randint(1, SELLERS),
+             "buyer_ids": [], "messages": {"head": None, "tail": None, "nodes": {}}}
+            for _ in range(rows // 5)
+        ])
+
+
+def params_for(conn, rows):
+    """Picks realistic parameter values, e.g. a cursor 200 pages deep."""
+    deep = conn.execute(sa.text(
+        "SELECT date_created, id FROM item WHERE live_on_market = :live "
+        "ORDER BY date_created DESC, id DESC LIMIT 1 OFFSET 5000"
+    ), {"live": True}).first()
+    created = deep[0] if deep else datetime.utcnow()
+    item_id = deep[1] if deep else rows
+    return {"live": True, "created": created, "item_id": item_id, "seller_id": SELLERS // 2}
+
+
+def explain(conn, sql, params):
+    """Returns the database's plan for sql as one line of text."""
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(sa.text("EXPLAIN QUERY PLAN " + sql), params).all()
+        return " | ".join(row[-1] for row in rows)
+    rows = conn.execute(sa.text("EXPLAIN " + sql), params).all()
+    return " | ".join(row[0].strip() for row in rows)
+
+
+def median_ms(conn, sql, params, repeat):
+    """Median wall-clock time of running sql, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sa.text(sql), params).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def report(engine, label, rows, repeat):
+    """Prints plan and latency of every benchmark query."""
+    print(f"\n=== {label} ===")
+    with engine.connect() as conn:
+        conn.execute(sa.text("ANALYZE"))
+        params = params_for(conn, rows)
+        for name, sql in QUERIES.items():
+            print(f"{name:<26} {median_ms(conn, sql, params, repeat):9.2f} ms   "
+                  f"{explain(conn, sql, params)}")
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="number of items")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--url", help="database URL (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if url is None:
+        tmpdir = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    engine = sa.create_engine(url)
+    print(f"Filling {url} with {args.rows} items...")
+    fill(engine, args.rows)
+
+    report(engine, "without indexes", args.rows, args.repeat)
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn)
+
+    report(engine, "with indexes", args.rows, args.repeat)
+    engine.dispose()
+    if tmpdir:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+bench_socketio.py - Chat messages/sec with 1, 2, 4... web processes
+relaying through a Socket.IO message queue.
+
+Starts N copies of the app on their own ports (each one is a worker behind
+a sticky load balancer), puts every buyer on a different process than the
+seller they talk to, and times how long the sellers take to receive every
+line the buyers send. More than one process needs a real queue:
+
+    python benchmarks/bench_socketio.py                        # 1 process, no queue
+    python benchmarks/bench_socketio.py --workers 1,2,4 --queue redis://localhost:6379/0
+    python benchmarks/bench_socketio.py --pairs 20 --messages 200
+
+Every client logs in with a signed session cookie, as a browser would.
+Clients use long-polling, so the absolute numbers are low; compare the rows.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import socketio
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def serve(port):
+    """Runs one web process (called in a subprocess with --serve)."""
+    sys.path.insert(0, ROOT)
+    from website import create_app, socketio as server  # pylint: disable=import-outside-toplevel
+    app = create_app()
+    server.run(app, port=port, log_output=False)
+
+
+def seed(pairs):
+    """
+    Creates a seller, buyer and item per conversation and prints them with
+    session cookies logging each user in (called in a subprocess with --seed).
+    """
+    sys.path.insert(0, ROOT)
+    from website import create_app, db  # pylint: disable=import-outside-toplevel
+    from website.models import Item, User  # pylint: disable=import-outside-toplevel
+    app = create_app()
+    serializer = app.session_interface.get_signing_serializer(app)
+
+    def cookie(user):
+        return serializer.dumps({"_user_id": str(user.id)})
+
+    conversations = []
+    with app.app_context():
+        for n in range(pairs):
+            seller = User(email=f"seller{n}@bench.test", first_name="Seller", last_name=str(n),
+                          password_hash="-")
+            buyer = User(email=f"buyer{n}@bench.test", first_name="Buyer", last_name=str(n),
+                         password_hash="-")
+            db.session.add_all([seller, buyer])
+            db.session.flush()
+            item = Item(seller_id=seller.id, name=f"Item {n}", item_photos="placeholder.svg",
+                        price=1.0)
+            db.session.add(item)
+            db.session.flush()
+            conversations.append({"item_id": item.id, "seller": cookie(seller),
+                                  "buyer": cookie(buyer)})
+        db.session.commit()
+    print(json.dumps(conversations))
+
+
+def start_workers(count, base_port, env):
+    """Starts count web processes and waits until they answer."""
+    workers = []
+    for i in range(count):
+        port = base_port + i
+        workers.append((port, subprocess.Popen(
+            [sys.executable, __file__, "--serve", str(port)], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)))
+    for port, _ in workers:
+        for _ in range(300):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/favicon.ico", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"worker on port {port} did not start")
+    return workers
+
+
+def stop_workers(workers):
+    """Stops the web processes."""
+    for _, process in workers:
+        process.terminate()
+    for _, process in workers:
+        process.wait()
+
+
+class Conversation:
+    """A seller's inbox on one process and a buyer on another."""
+
+    def __init__(self, seeded, seller_port, buyer_port):
+        self.item_id = seeded["item_id"]
+        self.received = 0
+        self.done = threading.Event()
+        self.expected = None
+
+        self.seller_client = self._connect(seller_port, seeded["seller"])
+        self.seller_client.on("inbox_message", self._on_inbox_message)
+        self.seller_client.emit("join", {"item_id": self.item_id})
+
+        self.buyer_client = self._connect(buyer_port, seeded["buyer"])
+        self.buyer_client.emit("join", {"item_id": self.item_id})
+
+    @staticmethod
+    def _connect(port, cookie):
+        client = socketio.Client()
+        client.connect(f"http://127.0.0.1:{port}", transports=["polling"],
+                       headers={"Cookie": f"session={cookie}"})
+        return client
+
+    def _on_inbox_message(self, data):
+        if self.expected is None or not data["text"].startswith("Buyer "):
+            return  # join notices
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+    def send(self, count):
+        """
+        Sends count lines from the buyer, each once the server has taken
+        the last (a polling client can't post an unbounded burst).
+        """
+        for i in range(count):
+            self.buyer_client.call("message", {"item_id": self.item_id, "text": f"line {i}"})
+
+    def close(self):
+        """Disconnects both clients."""
+        self.buyer_client.disconnect()
+        self.seller_client.disconnect()
+
+
+def run(workers, seeded, messages, timeout):
+    """Returns (lines delivered, seconds) for one worker count."""
+    ports = [port for port, _ in workers]
+    conversations = [Conversation(c, ports[n % len(ports)], ports[(n + 1) % len(ports)])
+                     for n, c in enumerate(seeded)]
+    time.sleep(1)  # let the join notices go by
+    for conversation in conversations:
+        conversation.expected = messages
+
+    start = time.perf_counter()
+    senders = [threading.Thread(target=c.send, args=(messages,)) for c in conversations]
+    for sender in senders:
+        sender.start()
+    deadline = start + timeout
+    for conversation in conversations:
+        conversation.done.wait(max(0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+
+    for sender in senders:
+        sender.join()
+    delivered = sum(c.received for c in conversations)
+    for conversation in conversations:
+        conversation.close()
+    return delivered, elapsed
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--workers", default="1", help="comma-separated process counts")
+    parser.add_argument("--queue", help="SOCKETIO_MESSAGE_QUEUE URL (needed for >1 process)")
+    parser.add_argument("--pairs", type=int, default=10, help="buyer/seller conversations")
+    parser.add_argument("--messages", type=int, default=100, help="lines per buyer")
+    parser.add_argument("--port", type=int, default=5100, help="first port to use")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait per run")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+    if args.seed:
+        seed(args.seed)
+        return
+
+    counts = [int(n) for n in args.workers.split(",")]
+    if max(counts) > 1 and (not args.queue or args.queue.startswith("local://")):
+        parser.error("more than one worker needs --queue (a queue other processes can reach)")
+
+    tmpdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+               JOBS_IN_PROCESS="0")
+    env.pop("SOCKETIO_MESSAGE_QUEUE", None)
+    env.pop("REDIS_URL", None)
+    if args.queue:
+        env["SOCKETIO_MESSAGE_QUEUE"] = args.queue
+    try:
+        # Migrate and log the users in once, so the workers don't race each other
+        seeded = json.loads(subprocess.run(
+            [sys.executable, __file__, "--seed", str(args.pairs)], env=env,
+            check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+        env["AUTO_MIGRATE"] = "0"
+
+        print(f"{'workers':>7} {'lines':>8} {'seconds':>8} {'lines/s':>9}")
+        for count in counts:
+            workers = start_workers(count, args.port, env)
+            try:
+                delivered, elapsed = run(workers, seeded, args.messages, args.timeout)
+            finally:
+                stop_workers(workers)
+            missing = args.pairs * args.messages - delivered
+            note = f"   ({missing} not delivered)" if missing else ""
+            print(f"{count:>7} {delivered:>8} {elapsed:>8.2f} {delivered / elapsed:>9.0f}{note}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+gunicorn.conf.py - Gunicorn server hooks (see Procfile).
+"""
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    """Writes the chat lines a worker still buffers before it exits."""
+    from website.chat import flush_quietly  # pylint: disable=import-outside-toplevel
+    flush_quietly(worker.wsgi)
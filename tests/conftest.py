@@ -3,17 +3,25 @@
 import pytest
 import os
 from website import create_app, db, socketio
-from website.models import User, Item
+from website.models import User, Item, ItemPaymentOption, Bookmark, Job, Chat, Message
+from website.cache import invalidate_item_listings
+from website.chat import message_buffer
 from sqlalchemy.exc import IntegrityError
 
 
 @pytest.fixture(scope="session")
-def app():
+def app(tmp_path_factory):
     """
     Create a single Flask app instance for the test session,
     using the TestingConfig and setting up/tearing down the DB.
     """
     os.environ["CONFIG_TYPE"] = "config.TestingConfig"
+    # Spooled uploads go to a temp dir, not the real instance folder
+    os.environ["UPLOAD_SPOOL_DIR"] = str(tmp_path_factory.mktemp("upload_spool"))
+    # Tests run queued jobs themselves with jobs.run_pending()
+    os.environ["JOBS_IN_PROCESS"] = "0"
+    # ...and write buffered chat messages with message_buffer.flush()
+    os.environ["CHAT_FLUSH_INTERVAL"] = "0"
     flask_app = create_app()
 
     with flask_app.app_context():
@@ -24,6 +32,26 @@ def app():
     with flask_app.app_context():
         db.drop_all()
 
+@pytest.fixture(autouse=True)
+def empty_message_buffer():
+    """
+    Drops chat lines a test left unwritten, so they don't land in the next test's count.
+    """
+    yield
+    message_buffer.clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(tmp_path, monkeypatch):
+    """
+    Points the local storage backend at a temp dir so tests don't leave files behind.
+    """
+    from website import storage
+    root = tmp_path / "media"
+    root.mkdir()
+    monkeypatch.setattr(storage, "MEDIA_ROOT", str(root))
+    return root
+
 @pytest.fixture
 def test_client(app):
     """
@@ -81,9 +109,15 @@ def authed_client(app, test_client):
     yield client, user
 
     with app.app_context():
+        db.session.query(Job).delete()
+        db.session.query(Bookmark).delete()
+        db.session.query(Message).delete()
+        db.session.query(Chat).delete()
+        db.session.query(ItemPaymentOption).delete()
         db.session.query(Item).delete()
         db.session.query(User).delete()
         db.session.commit()
+    invalidate_item_listings()
 
 
 ##################
@@ -138,11 +172,14 @@ def fake_google(app):
 
 
 @pytest.fixture
-def test_socketio_client(app):
+def test_socketio_client(app, test_data_socketio):
     """
-    Creates a test client for the socketio client.
+    Creates a test client for the socketio client, logged in as the test
+    data's user1 (sockets of anonymous users are refused).
     """
     test_client = app.test_client()
+    with test_client.session_transaction() as sess:
+        sess["_user_id"] = str(test_data_socketio['user1'].id)
     socketio_test_client = socketio.test_client(app, flask_test_client=test_client)
 
     yield {'socketio_test_client': socketio_test_client, 'socketio': socketio}
@@ -169,13 +206,19 @@ def test_data_socketio(test_client):
 
         db.session.add(item)
         db.session.commit()
+        db.session.refresh(user1)
+        db.session.refresh(item)
 
-        yield {'user1': user1, 'item': item}
-
-        # db.session.remove()
-        # db.drop_all()
+    # Not yielded inside the app context: socket events would share its g,
+    # and with it Flask-Login's cached current_user
+    yield {'user1': user1, 'item': item}
 
+    with test_client.application.app_context():
         # Instead of drop_all(), just clear rows so other tests still have tables
+        db.session.query(Message).delete()
+        db.session.query(Chat).delete()
+        db.session.query(ItemPaymentOption).delete()
         db.session.query(Item).delete()
         db.session.query(User).delete()
         db.session.commit()
+    invalidate_item_listings()
@@ -0,0 +1,55 @@
+"""Functional tests for fingerprinted static assets and their cache headers."""
+
+import re
+
+from website import storage
+
+
+def _linked_stylesheet(client):
+    """Helper returning the stylesheet URL the login page links to."""
+    html = client.get("/login").get_data(as_text=True)
+    return re.search(r'<link rel="stylesheet" href="([^"]+)"', html).group(1)
+
+
+def test_pages_link_fingerprinted_assets(test_client, app):
+    """
+    GIVEN a rendered page
+    WHEN its stylesheet and script URLs are read
+    THEN they carry the files' content hashes from the manifest
+    """
+    manifest = app.extensions["asset_manifest"]
+    html = test_client.get("/login").get_data(as_text=True)
+
+    assert f'/static/styles.css?v={manifest["styles.css"]}' in html
+    assert f'/static/script.js?v={manifest["script.js"]}' in html
+    assert "window.ASSET_URLS" in html
+
+
+def test_fingerprinted_asset_is_cached_forever(test_client):
+    """
+    GIVEN the fingerprinted URL of a static file
+    WHEN it is fetched
+    THEN it is served with an immutable Cache-Control
+    """
+    resp = test_client.get(_linked_stylesheet(test_client))
+    assert resp.status_code == 200
+    assert resp.headers["Cache-Control"] == storage.IMMUTABLE_CACHE_CONTROL
+    resp.close()
+
+
+def test_unfingerprinted_asset_revalidates_with_etag(test_client, app):
+    """
+    GIVEN a static file requested without (or with a stale) fingerprint
+    WHEN it is fetched and then revalidated with its ETag
+    THEN it is not cached without asking, and revalidating answers 304
+    """
+    for url in ("/static/styles.css", "/static/styles.css?v=stale"):
+        resp = test_client.get(url)
+        assert resp.status_code == 200
+        assert resp.headers["Cache-Control"] == "no-cache"
+        etag = resp.headers["ETag"]
+        assert app.extensions["asset_manifest"]["styles.css"] in etag
+        resp.close()
+
+        again = test_client.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304
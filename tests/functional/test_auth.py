@@ -3,6 +3,7 @@ test_auth.py - Handles Tests for authentication routes in Auth.py
 """
 
 from authlib.integrations.base_client.errors import OAuthError
+from sqlalchemy import event
 import website.auth as auth_module
 from website import db
 from website.models import User
@@ -180,3 +181,108 @@ def test_google_login_error(test_client, fake_google, app, monkeypatch):
     resp = test_client.get("/login/google/callback")
     assert resp.status_code == 302
     assert "/login?error=Login+failed" in resp.location
+
+
+# ============================
+# (3) session principal
+# ============================
+
+def _count_statements(app, func):
+    """Helper that returns (func's result, SQL statements it ran)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        return func(), statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_session_principal_skips_user_query(authed_client, app):
+    """
+    GIVEN a logged-in session whose identity has been loaded once
+    WHEN a shell page is requested
+    THEN the request authenticates without touching the database
+    """
+    client, user = authed_client
+    first, statements = _count_statements(app, lambda: client.get("/item/new"))
+    assert first.status_code == 200
+    assert len(statements) == 1
+
+    with client.session_transaction() as sess:
+        assert sess["principal"]["id"] == user.id
+        assert sess["principal"]["first_name"] == "Test"
+
+    again, statements = _count_statements(app, lambda: client.get("/item/new"))
+    assert again.status_code == 200
+    assert statements == []
+
+
+def test_session_principal_is_rechecked_after_ttl(authed_client, app):
+    """
+    GIVEN a session identity older than PRINCIPAL_TTL for a user who was deleted
+    WHEN a page is requested
+    THEN the user is looked up again and treated as logged out
+    """
+    client, user = authed_client
+    client.get("/item/new")
+    with client.session_transaction() as sess:
+        principal = sess["principal"]
+        principal["checked"] -= auth_module.PRINCIPAL_TTL + 1
+        sess["principal"] = principal
+
+    with app.app_context():
+        db.session.delete(db.session.get(User, user.id))
+        db.session.commit()
+
+    resp = client.get("/item/new")
+    assert resp.status_code == 302
+    with client.session_transaction() as sess:
+        assert "principal" not in sess
+
+
+def test_deleted_user_with_a_fresh_principal_is_logged_out(authed_client, app):
+    """
+    GIVEN a session identity still within PRINCIPAL_TTL for a user who was deleted
+    WHEN a request needs the User row
+    THEN the user is logged out and sent to log in instead of the request failing
+    """
+    client, user = authed_client
+    client.get("/item/new")
+
+    with app.app_context():
+        db.session.delete(db.session.get(User, user.id))
+        db.session.commit()
+
+    resp = client.post("/profile/edit", data={"profile_description": "Hi"})
+    assert resp.status_code == 302
+    assert "/signup" in resp.headers["Location"]
+    with client.session_transaction() as sess:
+        assert "principal" not in sess
+        assert "_user_id" not in sess
+    assert client.get("/item/new").status_code == 302
+
+
+def test_session_user_loads_row_only_when_needed(authed_client, app):
+    """
+    GIVEN the current user as a SessionUser
+    WHEN identity fields, then other fields, are read and written
+    THEN only the latter load the User row, and writes reach it
+    """
+    client, user = authed_client
+    with app.test_request_context():
+        with client.session_transaction() as sess:
+            user_id = sess["_user_id"]
+        current = auth_module.load_principal(user_id)
+
+        assert (current.id, current.email) == (user.id, "testuser@colby.edu")
+        assert current._user is None  # pylint: disable=protected-access
+
+        current.profile_description = "Set through the principal"
+        db.session.commit()
+        assert db.session.get(User, user.id).profile_description == "Set through the principal"
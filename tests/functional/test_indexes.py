@@ -0,0 +1,63 @@
+"""Functional tests checking the hot item queries are served by indexes."""
+
+from sqlalchemy import event
+from website import db
+from website.models import Item
+
+
+def _explain_list_query(app, client, url):
+    """Helper that runs GET url and returns SQLite's plan for the item list SELECT."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().startswith("SELECT") and "ORDER BY item.date_created" in statement:
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    statement, parameters = captured[-1]
+    with engine.connect() as connection:
+        plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in plan)
+
+
+def test_browse_feed_uses_live_created_index(authed_client, app):
+    """
+    GIVEN some listings
+    WHEN the browse feed (and a later page of it) is requested
+    THEN the item rows are found through ix_item_live_created, not a table scan
+    """
+    client, user = authed_client
+    with app.app_context():
+        for i in range(3):
+            db.session.add(Item(seller_id=user.id, name=f"Thing {i}", price=1.0,
+                                item_photos="/static/assets/item_placeholder.svg"))
+        db.session.commit()
+
+    assert "ix_item_live_created" in _explain_list_query(app, client, "/api/items")
+
+    cursor = client.get("/api/items?limit=1").get_json()["next_cursor"]
+    plan = _explain_list_query(app, client, f"/api/items?limit=1&after={cursor}")
+    assert "ix_item_live_created" in plan
+
+
+def test_seller_listing_uses_seller_created_index(authed_client, app):
+    """
+    GIVEN a seller with listings
+    WHEN their profile listings are requested
+    THEN the item rows are found through ix_item_seller_created
+    """
+    client, user = authed_client
+    with app.app_context():
+        db.session.add(Item(seller_id=user.id, name="Mine", price=1.0,
+                            item_photos="/static/assets/item_placeholder.svg"))
+        db.session.commit()
+
+    plan = _explain_list_query(app, client, f"/api/items?seller_id={user.id}")
+    assert "ix_item_seller_created" in plan
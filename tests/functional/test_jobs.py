@@ -0,0 +1,220 @@
+"""Functional tests for the background job queue and photo processing jobs."""
+
+import io
+from datetime import datetime, timedelta
+
+from PIL import Image
+from website import db, jobs
+from website.models import Item, Job, User
+
+
+def test_failing_job_is_retried_then_marked_failed(app, monkeypatch):
+    """
+    GIVEN a job whose handler always raises
+    WHEN the worker runs it MAX_ATTEMPTS times
+    THEN it is retried with a delay, then marked failed and its failure hook runs once
+    """
+    calls, failures = [], []
+
+    def flaky(job):
+        calls.append(job.id)
+        raise RuntimeError("upstream unavailable")
+
+    monkeypatch.setitem(jobs.HANDLERS, "flaky", (flaky, failures.append))
+
+    with app.app_context():
+        jobs.enqueue("flaky", note="x")
+        db.session.commit()
+
+        for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+            assert jobs.run_pending() == 1
+            job = Job.query.one()
+            assert job.attempts == attempt
+            assert "upstream unavailable" in job.error
+            if attempt < jobs.MAX_ATTEMPTS:
+                # Not due yet, so a second pass finds nothing
+                assert job.status == "queued"
+                assert jobs.run_pending() == 0
+                job.run_after = datetime.utcnow()
+                db.session.commit()
+
+        assert job.status == "failed"
+        assert len(calls) == jobs.MAX_ATTEMPTS
+        assert len(failures) == 1
+        db.session.delete(job)
+        db.session.commit()
+
+
+def test_abandoned_running_job_is_reclaimed(app, monkeypatch):
+    """
+    GIVEN a job left "running" by a worker that died
+    WHEN its lease runs out
+    THEN another worker claims and finishes it
+    """
+    done = []
+    monkeypatch.setitem(jobs.HANDLERS, "noop", (lambda job: done.append(job.id), None))
+
+    with app.app_context():
+        job = jobs.enqueue("noop")
+        db.session.commit()
+        assert jobs.claim_next().id == job.id      # claimed, then the worker "dies"
+        assert jobs.run_pending() == 0             # still leased
+
+        job.run_after = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert jobs.run_pending() == 1
+        assert Job.query.get(job.id).status == "done"
+        assert done == [job.id]
+        db.session.delete(job)
+        db.session.commit()
+
+
+def test_job_that_keeps_killing_its_worker_is_failed(app, monkeypatch):
+    """
+    GIVEN a job whose worker dies on every attempt
+    WHEN its lease has run out MAX_ATTEMPTS times
+    THEN it is marked failed and its failure hook runs, instead of being claimed again
+    """
+    failures = []
+    monkeypatch.setitem(jobs.HANDLERS, "crashy", (lambda job: None, failures.append))
+
+    with app.app_context():
+        job = jobs.enqueue("crashy")
+        db.session.commit()
+        for _ in range(jobs.MAX_ATTEMPTS):
+            assert jobs.claim_next().id == job.id   # claimed, then the worker "dies"
+            job.run_after = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+
+        assert jobs.claim_next() is None
+        job = Job.query.get(job.id)
+        assert job.status == "failed"
+        assert job.attempts == jobs.MAX_ATTEMPTS
+        assert [failed.id for failed in failures] == [job.id]
+        db.session.delete(job)
+        db.session.commit()
+
+
+def test_corrupt_avatar_marks_profile_failed(authed_client, app, monkeypatch, media_root):
+    """
+    GIVEN an avatar PNG whose header is fine but whose image data is truncated
+    WHEN the avatar job runs
+    THEN the failed status is committed for the profile page to see and the upload is dropped
+    """
+    client, user = authed_client
+    monkeypatch.setattr("website.views.asset_folder", "local_marketplace")
+
+    png = io.BytesIO()
+    Image.new("RGB", (200, 200), color="purple").save(png, format="PNG")
+    truncated = io.BytesIO(png.getvalue()[:120])
+
+    client.post(
+        "/profile/edit",
+        data={"profile_description": "", "avatar": (truncated, "avatar.png")},
+        content_type="multipart/form-data",
+    )
+
+    with app.app_context():
+        jobs.run_pending()
+        db.session.rollback()
+        assert db.session.get(User, user.id).profile_image_status == "failed"
+    assert not list((media_root / "incoming").iterdir())
+
+
+def test_corrupt_photo_marks_item_failed(authed_client, app, monkeypatch):
+    """
+    GIVEN a PNG whose header is fine but whose image data is truncated
+    WHEN it is uploaded and the photo job runs
+    THEN the request is accepted, but the job marks the photo failed and keeps the placeholder
+    """
+    client, _ = authed_client
+    monkeypatch.setattr("website.views.asset_folder", "local_marketplace")
+
+    png = io.BytesIO()
+    Image.new("RGB", (200, 200), color="purple").save(png, format="PNG")
+    truncated = io.BytesIO(png.getvalue()[:120])
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Broken", "price": "1", "image_file": (truncated, "broken.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 202
+    item_id = resp.get_json()["item"]["id"]
+
+    with app.app_context():
+        jobs.run_pending()
+        item = db.session.get(Item, item_id)
+        assert item.photo_status == "failed"
+        assert item.item_photos == "/static/assets/item_placeholder.svg"
+
+
+def test_photo_is_resized_and_reencoded(authed_client, app, monkeypatch, media_root):
+    """
+    GIVEN a large PNG upload
+    WHEN the photo job runs
+    THEN the stored file is a JPEG no larger than MAX_DIMENSION
+    """
+    client, _ = authed_client
+    monkeypatch.setattr("website.views.asset_folder", "local_marketplace")
+
+    big = io.BytesIO()
+    Image.new("RGBA", (3000, 1000), color=(10, 20, 30, 255)).save(big, format="PNG")
+    big.seek(0)
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Banner", "price": "1", "image_file": (big, "banner.png")},
+        content_type="multipart/form-data",
+    )
+    item_id = resp.get_json()["item"]["id"]
+
+    with app.app_context():
+        jobs.run_pending()
+        url = db.session.get(Item, item_id).item_photos
+
+    with Image.open(media_root / url[len("/media/"):]) as stored:
+        assert stored.format == "JPEG"
+        assert stored.size == (2048, 683)
+
+
+def test_photo_gets_thumbnails_without_exif(authed_client, app, monkeypatch, media_root):
+    """
+    GIVEN a JPEG upload carrying EXIF metadata
+    WHEN the photo job runs
+    THEN the item exposes 256/512/1024px WebP and JPEG thumbnails as srcsets,
+    and no stored file keeps the EXIF
+    """
+    client, _ = authed_client
+    monkeypatch.setattr("website.views.asset_folder", "local_marketplace")
+
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"   # Make
+    photo = io.BytesIO()
+    Image.new("RGB", (1500, 1000), color="orange").save(photo, format="JPEG", exif=exif)
+    photo.seek(0)
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Sofa", "price": "1", "image_file": (photo, "sofa.jpg")},
+        content_type="multipart/form-data",
+    )
+    item_id = resp.get_json()["item"]["id"]
+    assert resp.get_json()["item"]["photo_srcset"] is None
+
+    with app.app_context():
+        jobs.run_pending()
+
+    item = client.get(f"/api/items/{item_id}").get_json()["item"]
+    webp = item["photo_srcset"]["webp"].split(", ")
+    jpeg = item["photo_srcset"]["jpeg"].split(", ")
+    assert [entry.split(" ")[1] for entry in webp] == ["256w", "512w", "1024w"]
+    assert [entry.split(" ")[1] for entry in jpeg] == ["256w", "512w", "1024w"]
+
+    urls = [item["item_photos"]] + [entry.split(" ")[0] for entry in webp + jpeg]
+    for url in urls:
+        with Image.open(media_root / url[len("/media/"):]) as stored:
+            assert not stored.getexif()
+    with Image.open(media_root / webp[0].split(" ")[0][len("/media/"):]) as smallest:
+        assert smallest.format == "WEBP"
+        assert smallest.size == (256, 171)
@@ -0,0 +1,167 @@
+"""Functional tests for the versioned schema migrations."""
+
+import sqlalchemy as sa
+
+from website import db
+from website import migrations
+from website.migrations import MIGRATIONS, upgrade
+
+
+def _schema(engine):
+    """Helper returning {table: (columns, indexes)} for every table in engine's database."""
+    inspector = sa.inspect(engine)
+    return {
+        name: (
+            sorted(c["name"] for c in inspector.get_columns(name)),
+            sorted(i["name"] for i in inspector.get_indexes(name)),
+        )
+        for name in inspector.get_table_names()
+    }
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    """
+    GIVEN two empty SQLite databases
+    WHEN one is migrated and the other is built with db.metadata.create_all()
+    THEN both end up with the same tables, columns and indexes
+    """
+    migrated = sa.create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    created = sa.create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+
+    applied = upgrade(migrated, log=lambda message: None)
+    db.metadata.create_all(created)
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert _schema(migrated) == _schema(created)
+
+    # Nothing left to do the second time
+    assert upgrade(migrated, log=lambda message: None) == []
+
+
+def test_bookmark_migration_moves_json_lists(tmp_path):
+    """
+    GIVEN a database at the baseline schema with bookmarks in user.bookmark_items
+    WHEN the remaining migrations run
+    THEN bookmarks of existing items are copied into the bookmark table and the JSON is cleared
+    """
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    upgrade(engine, target=1, log=lambda message: None)
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO user (id, email, password_hash, first_name, last_name, "
+            "bookmark_items, date_created) VALUES "
+            "(1, 'old@colby.edu', 'x', 'Old', 'User', '[\"5\", 999999, \"junk\"]', "
+            "'2024-01-01 00:00:00')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO item (id, seller_id, name, item_photos, price, payment_options, "
+            "live_on_market, date_created) VALUES (5, 1, 'Old bookmark', 'x.png', 1.0, "
+            "'[\"Cash\", \"Venmo\", \"Cash\"]', 1, '2024-01-01 00:00:00')"
+        )
+
+    upgrade(engine, log=lambda message: None)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT user_id, item_id FROM bookmark").all() == [(1, 5)]
+        assert connection.exec_driver_sql(
+            "SELECT bookmark_items FROM user").scalar() is None
+        # Rows from before updated_at existed count as last changed when created
+        assert connection.exec_driver_sql(
+            "SELECT updated_at FROM item").scalar().startswith("2024-01-01 00:00:00")
+        # Items from before the search index existed are searchable
+        assert connection.exec_driver_sql(
+            "SELECT rowid FROM item_fts WHERE item_fts MATCH 'bookmark'").all() == [(5,)]
+        # Payment options are copied into rows, once each
+        assert connection.exec_driver_sql(
+            "SELECT item_id, method FROM item_payment_option ORDER BY method").all() == [
+                (5, "Cash"), (5, "Venmo")]
+
+
+def test_updated_at_backfill_runs_in_id_batches(tmp_path, monkeypatch):
+    """
+    GIVEN a baseline database with more items than one backfill batch, with gaps in their ids
+    WHEN the updated_at migration runs
+    THEN each batch is its own UPDATE and every item gets its creation time
+    """
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    upgrade(engine, target=7, log=lambda message: None)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO user (id, email, password_hash, first_name, last_name, date_created) "
+            "VALUES (1, 'old@colby.edu', 'x', 'Old', 'User', '2024-01-01 00:00:00')"
+        )
+        for item_id in (1, 2, 5, 9):
+            connection.exec_driver_sql(
+                "INSERT INTO item (id, seller_id, name, item_photos, price, live_on_market, "
+                f"date_created) VALUES ({item_id}, 1, 'Old', 'x.png', 1.0, 1, "
+                f"'2024-01-0{item_id} 00:00:00')"
+            )
+
+    monkeypatch.setattr(migrations, "UPDATED_AT_BACKFILL_BATCH", 2)
+    updates = []
+    sa.event.listen(engine, "before_cursor_execute",
+                    lambda conn, cursor, statement, *args: updates.append(statement)
+                    if statement.startswith('UPDATE item SET updated_at') else None)
+    upgrade(engine, target=8, log=lambda message: None)
+
+    assert len(updates) == 5  # ids 1-2, 3-4, 5-6, 7-8, 9
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT count(*) FROM item WHERE updated_at = date_created").scalar() == 4
+
+
+def test_payment_migration_normalizes_legacy_values(tmp_path):
+    """
+    GIVEN items whose payment options are free-form text, in the JSON and in rows
+    WHEN the payment methods are normalized
+    THEN each item has one Cash/Venmo/Zelle row per method it named and no JSON left
+    """
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    upgrade(engine, target=12, log=lambda message: None)
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO user (id, email, password_hash, first_name, last_name, date_created) "
+            "VALUES (1, 'old@colby.edu', 'x', 'Old', 'User', '2024-01-01 00:00:00')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO item (id, seller_id, name, item_photos, price, payment_options, "
+            "live_on_market, date_created) VALUES "
+            "(1, 1, 'Lamp', 'x.png', 1.0, '[\"venmo @old\", \"CASH only\", \"Bitcoin\"]', 1, "
+            "'2024-01-01 00:00:00'), "
+            "(2, 1, 'Desk', 'x.png', 1.0, NULL, 1, '2024-01-01 00:00:00')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO item_payment_option (item_id, method) VALUES "
+            "(1, 'Venmo'), (2, 'Zelle me'), (2, 'Paypal')"
+        )
+
+    upgrade(engine, log=lambda message: None)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT item_id, method FROM item_payment_option ORDER BY item_id, method").all() == [
+                (1, "Cash"), (1, "Venmo"), (2, "Zelle")]
+        assert connection.exec_driver_sql(
+            "SELECT count(*) FROM item WHERE payment_options IS NOT NULL").scalar() == 0
+
+
+def test_migrate_cli_status_and_upgrade(app):
+    """
+    GIVEN the app's database
+    WHEN `flask migrate upgrade` and then `flask migrate status` run
+    THEN every migration is listed as applied and a second upgrade does nothing
+    """
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["migrate", "upgrade"])
+    assert result.exit_code == 0
+    result = runner.invoke(args=["migrate", "upgrade"])
+    assert "0 migration(s) applied." in result.output
+
+    result = runner.invoke(args=["migrate", "status"])
+    assert result.exit_code == 0
+    for m in MIGRATIONS:
+        assert f"[x] {m.version:04d} {m.name}" in result.output
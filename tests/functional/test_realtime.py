@@ -0,0 +1,76 @@
+"""Functional tests for relaying Socket.IO emits between processes."""
+
+import socketio
+
+from website.realtime import LocalBroker, LocalBrokerManager, socketio_options
+
+
+class Node:
+    """
+    Helper: one Socket.IO server attached to a broker, standing in for a
+    web process. Flask-SocketIO's test client refuses message queues, so
+    clients are registered with the server's manager directly and the
+    packets sent to them are recorded.
+    """
+
+    def __init__(self, broker):
+        self.server = socketio.Server(client_manager=LocalBrokerManager(broker=broker))
+        self.sent = []
+        self.server._send_eio_packet = (  # pylint: disable=protected-access
+            lambda eio_sid, pkt: self.sent.append(
+                (eio_sid, socketio.packet.Packet(encoded_packet=pkt.data).data)))
+        self.server.manager.initialize()
+
+    def connect(self, eio_sid, room):
+        """Registers a client connected to this node and puts it in room."""
+        sid = self.server.manager.connect(eio_sid, "/")
+        self.server.manager.enter_room(sid, "/", room)
+
+    def received(self, eio_sid):
+        """Events sent to a client of this node, as [event, args...] lists."""
+        return [data for to, data in self.sent if to == eio_sid]
+
+
+def test_room_messages_reach_clients_on_other_nodes():
+    """
+    GIVEN two Socket.IO servers sharing a message queue, with a room's
+    members on both and a client of another room
+    WHEN one server emits to the room
+    THEN the room's members on both servers receive it, and no one else does
+    """
+    broker = LocalBroker()
+    node_a, node_b = Node(broker), Node(broker)
+    node_a.connect("buyer", "chat:1:2")
+    node_b.connect("seller", "chat:1:2")
+    node_b.connect("other", "chat:1:3")
+
+    node_b.server.emit("message", "hello", to="chat:1:2")
+    # node A's listener picks the emit up from the queue in the background
+    for _ in range(100):
+        if node_a.sent:
+            break
+        node_a.server.sleep(0.01)
+
+    assert node_a.received("buyer") == [["message", "hello"]]
+    assert node_b.received("seller") == [["message", "hello"]]
+    assert node_b.received("other") == []
+
+
+def test_socketio_options_follow_the_configured_queue(monkeypatch):
+    """
+    GIVEN SOCKETIO_MESSAGE_QUEUE or REDIS_URL set, or neither
+    WHEN the socketio options are built
+    THEN they name that queue, a local broker, or nothing
+    """
+    monkeypatch.delenv("SOCKETIO_MESSAGE_QUEUE", raising=False)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert socketio_options() == {}
+
+    monkeypatch.setenv("REDIS_URL", "redis://cache:6379/0")
+    assert socketio_options()["message_queue"] == "redis://cache:6379/0"
+
+    monkeypatch.setenv("SOCKETIO_MESSAGE_QUEUE", "amqp://broker//")
+    assert socketio_options()["message_queue"] == "amqp://broker//"
+
+    monkeypatch.setenv("SOCKETIO_MESSAGE_QUEUE", "local://")
+    assert isinstance(socketio_options()["client_manager"], LocalBrokerManager)
@@ -0,0 +1,210 @@
+"""Functional tests for streaming photo uploads."""
+
+import io
+import os
+
+from PIL import Image
+from website import db, views, uploads
+from website.extensions import socketio
+from website.jobs import run_pending
+from website.models import Item, Job
+
+
+def _png_bytes(size=(10, 10)):
+    """Helper returning a small PNG file's bytes."""
+    out = io.BytesIO()
+    Image.new("RGB", size, color="blue").save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_request_over_max_content_length_is_rejected(authed_client, app, monkeypatch):
+    """
+    GIVEN a request body bigger than MAX_CONTENT_LENGTH
+    WHEN it is posted
+    THEN the app answers 413 with a JSON error before the view runs
+    """
+    client, _ = authed_client
+    monkeypatch.setitem(app.config, "MAX_CONTENT_LENGTH", 1024)
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Big", "price": "1", "image_file": (io.BytesIO(b"\0" * 4096), "big.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 413
+    assert resp.get_json() == {"error": "Upload is too large"}
+
+
+def test_photo_over_upload_limit_is_rejected_and_not_kept(authed_client, app, monkeypatch):
+    """
+    GIVEN a valid PNG larger than the per-photo limit
+    WHEN it is uploaded
+    THEN the app answers 413 and nothing is left in the spool directory
+    """
+    client, _ = authed_client
+    png = _png_bytes((400, 400))
+    monkeypatch.setattr(views, "MAX_PHOTO_BYTES", len(png) - 1)
+    before = set(os.listdir(app.config["UPLOAD_SPOOL_DIR"]))
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Big", "price": "1", "image_file": (io.BytesIO(png), "big.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 413
+    assert set(os.listdir(app.config["UPLOAD_SPOOL_DIR"])) == before
+
+
+def test_huge_image_dimensions_are_rejected(authed_client, monkeypatch):
+    """
+    GIVEN an image whose header promises more pixels than MAX_PIXELS
+    WHEN it is uploaded
+    THEN it is refused before anything is decoded
+    """
+    client, _ = authed_client
+    monkeypatch.setattr(uploads, "MAX_PIXELS", 50)
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Bomb", "price": "1", "image_file": (io.BytesIO(_png_bytes()), "b.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "Image dimensions are too large"}
+
+
+def test_spool_upload_reads_in_bounded_chunks(app):
+    """
+    GIVEN an upload stream
+    WHEN it is spooled
+    THEN it is read CHUNK_SIZE bytes at a time, never all at once,
+    and the spooled copy is byte-for-byte the upload
+    """
+    png = _png_bytes((600, 600)) + b"\0" * (3 * uploads.CHUNK_SIZE)
+    reads = []
+
+    class Stream(io.BytesIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    class Upload:
+        stream = Stream(png)
+
+    with app.app_context():
+        path = uploads.spool_upload(Upload(), max_bytes=len(png))
+    try:
+        with open(path, "rb") as spooled:
+            assert spooled.read() == png
+    finally:
+        os.remove(path)
+    assert reads and all(0 < size <= uploads.CHUNK_SIZE for size in reads)
+
+
+def test_queued_photo_does_not_depend_on_the_spool_dir(authed_client, app, media_root):
+    """
+    GIVEN a photo upload the request has queued
+    WHEN the worker runs it with the web process's spool dir gone (another dyno, or a restart)
+    THEN the job carries only the upload's storage key, the spool file is
+    already deleted, and the upload is deleted once processed and never served
+    """
+    client, _ = authed_client
+    png = _png_bytes((40, 40))
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Lamp", "price": "1", "image_file": (io.BytesIO(png), "lamp.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 202
+    assert os.listdir(app.config["UPLOAD_SPOOL_DIR"]) == []
+
+    with app.app_context():
+        job = db.session.execute(db.select(Job)).scalar_one()
+        key = job.payload["upload_key"]
+        assert "path" not in job.payload
+    assert (media_root / key).read_bytes() == png
+    assert client.get(f"/media/{key}").status_code == 404
+
+    with app.app_context():
+        assert run_pending() == 1
+        assert not (media_root / key).exists()
+        item = db.session.get(Item, resp.get_json()["item"]["id"])
+        assert item.photo_status is None
+        assert item.item_photos.startswith("/media/uploads/")
+
+
+def test_processed_photos_are_pushed_to_the_feed(authed_client, app, media_root):
+    """
+    GIVEN a browse page subscribed to the feed and two queued item photos, one unreadable
+    WHEN the worker processes them
+    THEN the page gets each item's new photo, or its failed status, once it is saved
+    """
+    client, _ = authed_client
+    feed = socketio.test_client(app, flask_test_client=client)
+    try:
+        feed.emit("join_feed")
+        ids = []
+        for name in ("Lamp", "Desk"):
+            resp = client.post(
+                "/api/items",
+                data={"name": name, "price": "1",
+                      "image_file": (io.BytesIO(_png_bytes((40, 40))), f"{name}.png")},
+                content_type="multipart/form-data",
+            )
+            ids.append(resp.get_json()["item"]["id"])
+        feed.get_received()
+
+        with app.app_context():
+            broken = db.session.execute(db.select(Job).order_by(Job.id.desc())).scalars().first()
+            (media_root / broken.payload["upload_key"]).write_bytes(b"not an image")
+            assert run_pending() == 2
+            items = {item_id: db.session.get(Item, item_id).to_dict() for item_id in ids}
+
+        events = [(e["name"], e["args"][0]) for e in feed.get_received()]
+        assert [name for name, _ in events] == ["item_updated", "item_updated"]
+        ready, failed = (data for _, data in events)
+        assert ready == {"id": ids[0], "item_photos": items[ids[0]]["item_photos"],
+                         "photo_srcset": items[ids[0]]["photo_srcset"], "photo_status": None}
+        assert ready["item_photos"].startswith("/media/uploads/")
+        assert failed["id"] == ids[1] and failed["photo_status"] == "failed"
+    finally:
+        feed.disconnect()
+
+
+def test_identical_photos_are_stored_once_and_served_immutable(authed_client, app, monkeypatch,
+                                                                 media_root):
+    """
+    GIVEN the same photo uploaded for two items
+    WHEN their jobs have run
+    THEN both items point at one stored file, served with an immutable Cache-Control
+    """
+    client, _ = authed_client
+    monkeypatch.setattr(views, "asset_folder", "local_marketplace")
+    png = _png_bytes((300, 200))
+
+    item_ids = []
+    for name in ("Left", "Right"):
+        resp = client.post(
+            "/api/items",
+            data={"name": name, "price": "1", "image_file": (io.BytesIO(png), "same.png")},
+            content_type="multipart/form-data",
+        )
+        item_ids.append(resp.get_json()["item"]["id"])
+
+    with app.app_context():
+        run_pending()
+        items = [db.session.get(Item, item_id) for item_id in item_ids]
+        photos = [item.item_photos for item in items]
+        variants = [item.photo_variants for item in items]
+
+    assert photos[0] == photos[1]
+    assert variants[0] == variants[1]
+    # The photo plus one WebP and one JPEG thumbnail, each stored once
+    assert len([p for p in (media_root / "uploads").rglob("*") if p.is_file()]) == 3
+
+    resp = client.get(photos[0])
+    assert resp.status_code == 200
+    assert resp.mimetype == "image/jpeg"
+    assert "immutable" in resp.headers["Cache-Control"]
+    resp.close()
@@ -1,11 +1,23 @@
 """Functional tests for views and API endpoints."""
 
+import importlib.util
 import io
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
 from PIL import Image
+from sqlalchemy import event, update
+from sqlalchemy.exc import OperationalError
 from website import db
-from website.models import User, Item
+from website.models import User, Item, Bookmark, Chat, ListingVersion, Message
+from website import chat as chat_module
+from website.chat import message_buffer
 from website import views
+from website.extensions import socketio
+from website.jobs import run_pending
+from website.cache import feed_cache
 import cloudinary.uploader
+import cloudinary.utils
 
 
 def test_join(test_socketio_client, test_data_socketio):
@@ -18,23 +30,22 @@ def test_join(test_socketio_client, test_data_socketio):
     socketio = test_socketio_client['socketio']
     socketio_test_client = test_socketio_client['socketio_test_client']
 
-    user1 = test_data_socketio['user1']
     item = test_data_socketio['item']
 
-    socketio_test_client.emit("join", item.to_dict(), user1.to_dict())
+    socketio_test_client.emit("join", {"item_id": item.id})
 
     received = socketio_test_client.get_received()
 
     assert len(received) > 0
 
     room_state = socketio.server.manager.rooms.get('/', {})
-    all_sids = list(room_state.values())  # list of dicts
-    user1_sid = list(all_sids[0].keys())[0]
+    # user1 sells the item, so they join its inbox rather than one conversation
+    inbox = views.inbox_room(item.id)
 
     # Checking to see that the room was created
-    assert item.id in room_state
+    assert inbox in room_state
     # Checking to see that user1 joined the room
-    assert user1_sid in room_state[item.id]
+    assert socketio_test_client.eio_sid in room_state[inbox].values()
 
     event = received[0]
     assert event["name"] == "message"
@@ -48,11 +59,10 @@ def test_message(test_socketio_client, test_data_socketio):
     THEN the message is received by the server
     """
     socketio_test_client = test_socketio_client['socketio_test_client']
-    user1 = test_data_socketio['user1']
     item = test_data_socketio['item']
 
-    socketio_test_client.emit("join", item.to_dict(), user1.to_dict())
-    socketio_test_client.emit("message", "Hello there!", user1.to_dict())
+    socketio_test_client.emit("join", {"item_id": item.id})
+    socketio_test_client.emit("message", {"item_id": item.id, "text": "Hello there!"})
 
     received = socketio_test_client.get_received()
     assert len(received) > 0
@@ -69,12 +79,11 @@ def test_disconnect(test_socketio_client, test_data_socketio):
     THEN a leave message is sent and the user leaves the room
     """
     socketio_test_client = test_socketio_client['socketio_test_client']
-    user1 = test_data_socketio['user1']
     item = test_data_socketio['item']
 
-    socketio_test_client.emit("join", item.to_dict(), user1.to_dict())
-    socketio_test_client.emit("message", "Hello there!", user1.to_dict())
-    socketio_test_client.emit("leave", item.to_dict(), user1.to_dict())
+    socketio_test_client.emit("join", {"item_id": item.id})
+    socketio_test_client.emit("message", {"item_id": item.id, "text": "Hello there!"})
+    socketio_test_client.emit("leave", {"item_id": item.id})
 
     received = socketio_test_client.get_received()
     assert len(received) > 0
@@ -84,6 +93,318 @@ def test_disconnect(test_socketio_client, test_data_socketio):
     assert event["args"] == "John Smith left the chat"
 
 
+def _socket_as(app, user_id, client=None):
+    """Helper opening a Socket.IO test client logged in as user_id."""
+    client = client or app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def test_chat_messages_stay_in_their_conversation(app, test_data_socketio):
+    """
+    GIVEN the seller in an item's inbox, two buyers chatting about it and a
+    user on another item's chat
+    WHEN one buyer sends a message and the seller answers them
+    THEN only that buyer and the seller receive it
+    """
+    seller = test_data_socketio['user1']
+    item = test_data_socketio['item']
+    with app.app_context():
+        other_item = Item(seller_id=seller.id, name='other', item_photos='placeholder.svg',
+                          price=1.0)
+        buyers = {name: User(email=f"{name}@colby.edu", first_name=name.title(),
+                             last_name=name[0].upper(), password_hash="x")
+                  for name in ("alice", "bob", "carol")}
+        db.session.add_all([other_item, *buyers.values()])
+        db.session.commit()
+        other_item_id = other_item.id
+        ids = {name: user.id for name, user in buyers.items()}
+        ids["seller"] = seller.id
+    item_id = item.id
+
+    clients = {name: _socket_as(app, user_id) for name, user_id in ids.items()}
+    try:
+        clients["seller"].emit("join", {"item_id": item_id})
+        clients["alice"].emit("join", {"item_id": item_id})
+        clients["bob"].emit("join", {"item_id": item_id})
+        clients["carol"].emit("join", {"item_id": other_item_id})
+        for client in clients.values():
+            client.get_received()
+
+        clients["alice"].emit("message", {"item_id": item_id, "text": "Is it available?"})
+        clients["seller"].emit("message", {"item_id": item_id, "text": "Yes!",
+                                           "buyer_id": ids["alice"]})
+
+        def received(name):
+            return [(e["name"], e["args"]) for e in clients[name].get_received()]
+
+        assert received("alice") == [("message", "Alice A: Is it available?"),
+                                     ("message", "John Smith: Yes!")]
+        assert received("seller") == [
+            ("inbox_message", [{"buyer_id": ids["alice"], "text": "Alice A: Is it available?"}]),
+            ("inbox_message", [{"buyer_id": ids["alice"], "text": "John Smith: Yes!"}]),
+        ]
+        assert received("bob") == []
+        assert received("carol") == []
+    finally:
+        for client in clients.values():
+            client.disconnect()
+
+
+def test_chat_sender_comes_from_the_session(app, test_data_socketio):
+    """
+    GIVEN an anonymous visitor and a logged-in buyer
+    WHEN they open a chat socket and the buyer sends a message claiming to be someone else
+    THEN the visitor's socket is refused and the line is sent under the buyer's own name
+    """
+    item = test_data_socketio['item']
+    assert not socketio.test_client(app, flask_test_client=app.test_client()).is_connected()
+
+    with app.app_context():
+        buyer = User(email="dave@colby.edu", first_name="Dave", last_name="D", password_hash="x")
+        db.session.add(buyer)
+        db.session.commit()
+        buyer_id = buyer.id
+
+    sock = _socket_as(app, buyer_id)
+    try:
+        sock.emit("join", {"item_id": item.id})
+        sock.get_received()
+        sock.emit("message", {"item_id": item.id, "text": "hi", "user": {"id": 1, "first_name": "X"}})
+        assert [e["args"] for e in sock.get_received()] == ["Dave D: hi"]
+    finally:
+        sock.disconnect()
+
+    with app.app_context():
+        assert [m.sender_id for m in Message.query.all()] == [buyer_id]
+
+
+def test_seller_cannot_open_chats_buyers_never_started(app, test_data_socketio):
+    """
+    GIVEN a seller in their item's inbox and a user who never wrote about the item
+    WHEN the seller joins or messages a conversation with that user
+    THEN no chat is created and nothing is sent
+    """
+    seller = test_data_socketio['user1']
+    item_id = test_data_socketio['item'].id
+    with app.app_context():
+        stranger = User(email="erin@colby.edu", first_name="Erin", last_name="E", password_hash="x")
+        db.session.add(stranger)
+        db.session.commit()
+        stranger_id = stranger.id
+
+    sock = _socket_as(app, seller.id)
+    try:
+        sock.emit("join", {"item_id": item_id, "buyer_id": stranger_id})
+        assert sock.get_received() == []
+        sock.emit("join", {"item_id": item_id})
+        sock.get_received()
+        sock.emit("message", {"item_id": item_id, "text": "Want it?", "buyer_id": stranger_id})
+        assert sock.get_received() == []
+    finally:
+        sock.disconnect()
+
+    with app.app_context():
+        assert Chat.find(item_id, stranger_id) is None
+    assert message_buffer._rows == []  # pylint: disable=protected-access
+
+
+def test_chat_lines_are_written_when_the_socket_closes(app, test_data_socketio):
+    """
+    GIVEN a buyer who sent chat lines that are still buffered
+    WHEN they leave the chat, or close the socket without leaving
+    THEN their lines are written without waiting for the next flush
+    """
+    item_id = test_data_socketio['item'].id
+    with app.app_context():
+        buyers = [User(email=f"{name}@colby.edu", first_name=name.title(), last_name="G",
+                       password_hash="x") for name in ("gina", "hugo")]
+        db.session.add_all(buyers)
+        db.session.commit()
+        buyer_ids = [buyer.id for buyer in buyers]
+
+    for buyer_id, leave in zip(buyer_ids, (True, False)):
+        sock = _socket_as(app, buyer_id)
+        sock.emit("join", {"item_id": item_id})
+        sock.emit("message", {"item_id": item_id, "text": "Still for sale?"})
+        assert len(message_buffer) == 1
+        if leave:
+            sock.emit("leave", {"item_id": item_id})
+        sock.disconnect()
+        assert len(message_buffer) == 0
+
+    with app.app_context():
+        assert sorted(m.sender_id for m in Message.query.all()) == sorted(buyer_ids)
+
+
+def test_chat_lines_are_written_when_a_gunicorn_worker_exits(authed_client, app):
+    """
+    GIVEN lines still in the chat buffer
+    WHEN a gunicorn worker serving the app exits
+    THEN its worker_exit hook writes them
+    """
+    _, user = authed_client
+    spec = importlib.util.spec_from_file_location(
+        "gunicorn_conf", Path(__file__).parents[2] / "gunicorn.conf.py")
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+
+    item = _seller_and_item(app)
+    with app.app_context():
+        chat_id = Chat.for_conversation(item["id"], item["seller_id"], user.id).id
+        message_buffer.add(chat_id, user.id, "Is it still available?")
+
+    gunicorn_conf.worker_exit(None, SimpleNamespace(wsgi=app))
+    assert len(message_buffer) == 0
+    with app.app_context():
+        assert Message.query.filter_by(chat_id=chat_id).count() == 1
+
+
+def test_full_chat_batch_survives_a_database_error(authed_client, app, monkeypatch):
+    """
+    GIVEN the database failing while a full batch of chat lines is written
+    WHEN the line that fills the batch is added
+    THEN the error is logged instead of raised and the lines stay queued for the next flush
+    """
+    _, user = authed_client
+    item = _seller_and_item(app)
+    monkeypatch.setattr(chat_module, "BATCH_SIZE", 2)
+    with app.app_context():
+        chat_id = Chat.for_conversation(item["id"], item["seller_id"], user.id).id
+        message_buffer.add(chat_id, user.id, "one")
+
+        def down(*args, **kwargs):
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        monkeypatch.setattr(db.session, "execute", down)
+        message_buffer.add(chat_id, user.id, "two")
+        assert len(message_buffer) == 2
+
+        monkeypatch.undo()
+        assert message_buffer.flush() == 2
+        assert Message.query.filter_by(chat_id=chat_id).count() == 2
+
+
+def test_chat_events_ignore_data_that_is_not_an_object(authed_client, app):
+    """
+    GIVEN a connected socket
+    WHEN it sends join and message events whose data is not an object
+    THEN they are ignored instead of raising
+    """
+    client, user = authed_client
+    sock = _socket_as(app, user.id, client)
+    try:
+        for data in ("7", ["item_id"], None):
+            sock.emit("join", data)
+            sock.emit("message", data)
+        assert sock.is_connected()
+        assert not sock.get_received()
+    finally:
+        sock.disconnect()
+
+
+def _seller_and_item(app):
+    """Helper creating another user with an item; returns the item's dict."""
+    with app.app_context():
+        seller = User(email="chatseller@colby.edu", first_name="Chat", last_name="Seller")
+        seller.set_password("pass")
+        db.session.add(seller)
+        db.session.flush()
+        item = Item(seller_id=seller.id, name="Desk", item_photos="placeholder.svg", price=20.0)
+        db.session.add(item)
+        db.session.commit()
+        return item.to_dict()
+
+
+def test_chat_messages_are_stored_in_batches_and_paged(authed_client, app, monkeypatch):
+    """
+    GIVEN a buyer chatting about an item
+    WHEN they send messages and then load the history page by page
+    THEN the messages are buffered, written in one batch, and paged newest first
+    """
+    client, user = authed_client
+    item = _seller_and_item(app)
+    sock = _socket_as(app, user.id, client)
+    try:
+        sock.emit("join", {"item_id": item["id"]})
+        joined = [e for e in sock.get_received() if e["name"] == "chat_joined"]
+        chat_id = joined[0]["args"][0]["chat_id"]
+
+        for text in ("one", "two", "three"):
+            sock.emit("message", {"item_id": item["id"], "text": text})
+
+        assert len(message_buffer) == 3
+        with app.app_context():
+            assert Message.query.count() == 0
+
+        page = client.get(f"/api/chats/{chat_id}/messages?limit=2").get_json()
+    finally:
+        sock.disconnect()
+
+    assert [m["body"] for m in page["messages"]] == ["two", "three"]
+    assert all(m["sender_id"] == user.id for m in page["messages"])
+    assert len(message_buffer) == 0
+
+    older = client.get(
+        f"/api/chats/{chat_id}/messages?limit=2&before={page['next_before']}").get_json()
+    assert [m["body"] for m in older["messages"]] == ["one"]
+    assert older["next_before"] is None
+
+    # A full batch is written right away
+    monkeypatch.setattr(chat_module, "BATCH_SIZE", 2)
+    with app.app_context():
+        message_buffer.add(chat_id, user.id, "four")
+        message_buffer.add(chat_id, user.id, "five")
+        assert len(message_buffer) == 0
+        assert Message.query.filter_by(chat_id=chat_id).count() == 5
+
+
+def test_chat_history_only_for_members(authed_client, app):
+    """
+    GIVEN a chat between a seller and another buyer
+    WHEN the current user asks for its messages
+    THEN they get a 403, and a missing chat is a 404
+    """
+    client, _ = authed_client
+    item = _seller_and_item(app)
+    with app.app_context():
+        chat = Chat.for_conversation(item["id"], item["seller_id"], 999999)
+        chat_id = chat.id
+
+    assert client.get(f"/api/chats/{chat_id}/messages").status_code == 403
+    assert client.get("/api/chats/123456/messages").status_code == 404
+
+
+def test_seller_inbox_lists_each_buyers_conversation(authed_client, app):
+    """
+    GIVEN an item of the current user that two buyers wrote about
+    WHEN the seller lists the item's chats and opens one's history
+    THEN each buyer's conversation is listed by name, its lines name their
+    sender like live lines do, and other users can't list the chats
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user)
+    with app.app_context():
+        buyers = [User(email=f"{name}@colby.edu", first_name=name.title(), last_name="B",
+                       password_hash="x") for name in ("ivy", "jack")]
+        db.session.add_all(buyers)
+        db.session.commit()
+        chats = [Chat.for_conversation(item_id, user.id, buyer.id) for buyer in buyers]
+        expected = [{"id": chat.id, "buyer_id": buyer.id, "buyer_name": f"{buyer.first_name} B"}
+                    for chat, buyer in zip(chats, buyers)]
+        message_buffer.add(chats[0].id, buyers[0].id, "Is it free?")
+        message_buffer.add(chats[0].id, user.id, "Yes")
+
+    assert client.get(f"/api/items/{item_id}/chats").get_json() == {"chats": expected}
+    history = client.get(f"/api/chats/{expected[0]['id']}/messages").get_json()["messages"]
+    assert [f"{m['sender_name']}: {m['body']}" for m in history] == [
+        "Ivy B: Is it free?", "Test User: Yes"]
+
+    other = _seller_and_item(app)
+    assert client.get(f"/api/items/{other['id']}/chats").status_code == 403
+    assert client.get("/api/items/123456/chats").status_code == 404
+
+
 ########################################
 #     BASIC HTML PAGE SHELL ROUTES     #
 ########################################
@@ -264,6 +585,44 @@ def test_api_list_items_filter_by_seller(authed_client, app):
     assert data["items"][0]["seller_id"] == user.id
 
 
+def test_api_list_items_mine_and_bookmarked_filters(authed_client, app):
+    """
+    GIVEN the user's own items and bookmarks among other sellers' items
+    WHEN /api/items is asked for ?mine=1, ?bookmarked=1, both, or with a search
+    THEN only the matching items come back, paged like any other listing
+    """
+    client, user = authed_client
+    with app.app_context():
+        other = User(email="filters@colby.edu", first_name="Other", last_name="Seller")
+        other.set_password("pass")
+        db.session.add(other)
+        db.session.commit()
+        other_ids = []
+        for name in ("Desk", "Desk lamp", "Chair"):
+            item = Item(seller_id=other.id, name=name, price=1.0, item_photos="placeholder.svg")
+            db.session.add(item)
+            db.session.commit()
+            other_ids.append(item.id)
+    mine_id = _create_item_for_user(app, user, name="Desk chair")
+    with app.app_context():
+        Bookmark.add(user.id, other_ids[0], other_ids[1], mine_id)
+        db.session.commit()
+
+    def names(url):
+        data = client.get(url).get_json()
+        return sorted(i["name"] for i in data["items"]), data
+
+    assert names("/api/items?mine=1")[0] == ["Desk chair"]
+    assert names("/api/items?bookmarked=1")[0] == ["Desk", "Desk chair", "Desk lamp"]
+    assert names("/api/items?bookmarked=1&mine=1")[0] == ["Desk chair"]
+    assert names("/api/items?bookmarked=true&q=lamp")[0] == ["Desk lamp"]
+
+    found, page = names("/api/items?bookmarked=1&limit=2")
+    assert all(i["bookmarked"] for i in page["items"]) and len(found) == 2
+    rest, _ = names(f"/api/items?bookmarked=1&limit=2&after={page['next_cursor']}")
+    assert sorted(found + rest) == ["Desk", "Desk chair", "Desk lamp"]
+
+
 def test_api_list_items_search_query(authed_client, app):
     """Ensure /api/items search query filters items by name/description."""
     client, user = authed_client
@@ -297,6 +656,298 @@ def test_api_list_items_search_query(authed_client, app):
     assert "Desk" in data["items"][0]["name"]
 
 
+def test_api_list_items_search_prefix_and_rank(authed_client, app):
+    """Ensure search matches word prefixes and ranks name matches above description matches."""
+    client, user = authed_client
+
+    with app.app_context():
+        db.session.add_all([
+            Item(seller_id=user.id, name="Floor rug", description="goes under a lamp",
+                 price=15.0, item_photos="/static/assets/item_placeholder.svg"),
+            Item(seller_id=user.id, name="Lamp", description="bright",
+                 price=10.0, item_photos="/static/assets/item_placeholder.svg"),
+            Item(seller_id=user.id, name="Toaster", description="two slots",
+                 price=5.0, item_photos="/static/assets/item_placeholder.svg"),
+        ])
+        db.session.commit()
+
+    resp = client.get("/api/items?q=lam")
+    assert resp.status_code == 200
+    names = [item["name"] for item in resp.get_json()["items"]]
+    assert names == ["Lamp", "Floor rug"]
+
+    # Every word has to match
+    resp = client.get("/api/items?q=floor%20lam")
+    assert [item["name"] for item in resp.get_json()["items"]] == ["Floor rug"]
+
+
+def test_api_list_items_search_index_follows_edits(authed_client, app):
+    """Ensure the search index picks up renamed and deleted items."""
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Kettle")
+
+    assert len(client.get("/api/items?q=kettle").get_json()["items"]) == 1
+
+    resp = client.put(
+        f"/api/items/{item_id}",
+        data={"name": "Teapot", "price": "5"},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 200
+    assert client.get("/api/items?q=kettle").get_json()["items"] == []
+    assert len(client.get("/api/items?q=teapot").get_json()["items"]) == 1
+
+    client.delete(f"/api/items/{item_id}")
+    assert client.get("/api/items?q=teapot").get_json()["items"] == []
+
+
+def test_api_suggest_items_returns_light_name_matches(authed_client, app):
+    """Ensure /api/items/suggest returns only id/name/thumbnail for name prefix matches."""
+    client, user = authed_client
+    lamp_id = _create_item_for_user(app, user, name="Lamp", item_photos="/static/uploads/lamp.jpeg")
+    _create_item_for_user(app, user, name="Rug", description="lamp not included")
+
+    resp = client.get("/api/items/suggest?q=la")
+    assert resp.status_code == 200
+    assert resp.get_json()["suggestions"] == [
+        {"id": lamp_id, "name": "Lamp", "thumbnail": "/static/uploads/lamp.jpeg"}
+    ]
+
+    # Empty queries don't touch the database
+    assert client.get("/api/items/suggest?q=").get_json()["suggestions"] == []
+
+
+def test_api_suggest_items_cache_cleared_on_create(authed_client):
+    """Ensure a cached prefix picks up a newly created item."""
+    client, _ = authed_client
+
+    assert client.get("/api/items/suggest?q=kay").get_json()["suggestions"] == []
+    assert len(views.suggest_cache) == 1
+
+    resp = client.post(
+        "/api/items",
+        data={"name": "Kayak", "price": "80"},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 201
+
+    names = [s["name"] for s in client.get("/api/items/suggest?q=kay").get_json()["suggestions"]]
+    assert names == ["Kayak"]
+
+
+def test_api_list_items_paginates_with_cursor(authed_client, app):
+    """Ensure /api/items pages through every item exactly once via next_cursor."""
+    client, user = authed_client
+
+    with app.app_context():
+        for i in range(5):
+            db.session.add(Item(
+                seller_id=user.id,
+                name=f"Paged {i}",
+                price=float(i),
+                item_photos="/static/assets/item_placeholder.svg",
+            ))
+        db.session.commit()
+
+    seen = []
+    resp = client.get("/api/items?limit=2")
+    while True:
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert len(data["items"]) <= 2
+        seen.extend(item["id"] for item in data["items"])
+        if data["next_cursor"] is None:
+            break
+        resp = client.get(f"/api/items?limit=2&after={data['next_cursor']}")
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+def test_api_list_items_page_size_is_capped(authed_client):
+    """Ensure asking for a huge page is clamped to the server-side maximum."""
+    client, _ = authed_client
+    resp = client.get("/api/items?limit=100000")
+    assert resp.status_code == 200
+    assert resp.get_json()["next_cursor"] is None
+    assert views.MAX_PAGE_SIZE <= 100
+
+
+def test_api_list_items_invalid_cursor(authed_client):
+    """Ensure a malformed cursor returns a 400 error."""
+    client, _ = authed_client
+    resp = client.get("/api/items?after=not-a-cursor")
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Invalid cursor"
+
+
+def _create_facet_items(app, user):
+    """Helper that lists four items spread over every facet; returns their ids by name."""
+    now = datetime.utcnow()
+    rows = [
+        ("Lamp", 5.0, "New", ["Cash"], now),
+        ("Desk", 40.0, "Good", ["Cash", "Venmo"], now - timedelta(days=3)),
+        ("Chair", 15.0, "Good", ["Zelle"], now - timedelta(days=20)),
+        ("Rug", 25.0, "Fair", ["Venmo"], now - timedelta(days=60)),
+    ]
+    with app.app_context():
+        items = {name: Item(seller_id=user.id, name=name, price=price, condition=condition,
+                            payment_options=payments, date_created=created,
+                            item_photos="/static/assets/item_placeholder.svg")
+                 for name, price, condition, payments, created in rows}
+        db.session.add_all(items.values())
+        db.session.commit()
+        return {name: item.id for name, item in items.items()}
+
+
+def test_api_list_items_facet_filters(authed_client, app):
+    """
+    GIVEN items with different prices, conditions, payment options and ages
+    WHEN /api/items is filtered by each facet, alone and together
+    THEN only the items matching every filter come back
+    """
+    client, user = authed_client
+    _create_facet_items(app, user)
+
+    def names(query):
+        resp = client.get(f"/api/items?{query}")
+        assert resp.status_code == 200
+        return sorted(i["name"] for i in resp.get_json()["items"])
+
+    assert names("min_price=10&max_price=30") == ["Chair", "Rug"]
+    assert names("condition=Good&condition=Fair") == ["Chair", "Desk", "Rug"]
+    assert names("payment=Venmo") == ["Desk", "Rug"]
+    assert names("payment=Cash&payment=Venmo") == ["Desk", "Lamp", "Rug"]
+    assert names("days=7") == ["Desk", "Lamp"]
+    assert names("condition=Good&payment=Cash&days=30") == ["Desk"]
+    assert names("min_price=abc&payment=Bitcoin") == ["Chair", "Desk", "Lamp", "Rug"]
+
+
+def test_api_list_items_facet_counts(authed_client, app):
+    """
+    GIVEN items spread over every facet
+    WHEN the first page of /api/items is filtered by condition and asks for facets
+    THEN the facet counts apply every other filter, but not the facet's own
+    """
+    client, user = authed_client
+    _create_facet_items(app, user)
+
+    facets = client.get("/api/items?condition=Good&facets=1").get_json()["facets"]
+    assert facets["condition"] == {"New": 1, "Good": 2, "Fair": 1}
+    assert facets["payment"] == {"Cash": 1, "Venmo": 1, "Zelle": 1}
+    assert facets["price"] == {"min": 15.0, "max": 40.0}
+    assert facets["posted"] == {"1": 0, "7": 1, "30": 2}
+
+    assert "facets" not in client.get("/api/items?limit=1").get_json()
+    page = client.get("/api/items?limit=1&facets=1").get_json()
+    assert "facets" in page
+    assert "facets" not in client.get(
+        f"/api/items?limit=1&facets=1&after={page['next_cursor']}").get_json()
+
+
+def test_api_list_items_facet_etag_changes_with_the_day(authed_client, app, monkeypatch):
+    """
+    GIVEN a first page with facet counts and its ETag
+    WHEN it is asked for again two days later with nothing else changed
+    THEN the ETag no longer matches and the posted counts are recomputed
+    """
+    client, user = authed_client
+    _create_facet_items(app, user)
+
+    first = client.get("/api/items?facets=1")
+    assert client.get("/api/items?facets=1",
+                      headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    class Later(datetime):
+        """datetime, two days on."""
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(days=2)
+
+    monkeypatch.setattr(views, "datetime", Later)
+    later = client.get("/api/items?facets=1", headers={"If-None-Match": first.headers["ETag"]})
+    assert later.status_code == 200
+    assert later.get_json()["facets"]["posted"] != first.get_json()["facets"]["posted"]
+
+
+def test_api_list_items_sorts_and_pages(authed_client, app):
+    """
+    GIVEN items at different prices and dates
+    WHEN /api/items is sorted by price or date and read a page at a time
+    THEN every item comes back once, in that order
+    """
+    client, user = authed_client
+    _create_facet_items(app, user)
+
+    def read_all(sort):
+        seen, url = [], f"/api/items?sort={sort}&limit=1"
+        while url:
+            data = client.get(url).get_json()
+            seen.extend(i["name"] for i in data["items"])
+            cursor = data["next_cursor"]
+            url = cursor and f"/api/items?sort={sort}&limit=1&after={cursor}"
+        return seen
+
+    assert read_all("price_asc") == ["Lamp", "Chair", "Rug", "Desk"]
+    assert read_all("price_desc") == ["Desk", "Rug", "Chair", "Lamp"]
+    assert read_all("newest") == ["Lamp", "Desk", "Chair", "Rug"]
+
+    resp = client.get("/api/items?sort=cheapest")
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Invalid sort"
+
+
+def _count_list_queries(app, client):
+    """Helper that returns (items returned, SQL statements run) for GET /api/items."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        resp = client.get("/api/items")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert resp.status_code == 200
+    return len(resp.get_json()["items"]), len(statements)
+
+
+def test_api_list_items_query_count_is_constant(authed_client, app):
+    """Ensure listing items does not issue one seller or payment lookup per item (no N+1)."""
+    client, _ = authed_client
+
+    def add_items_from_new_sellers(start, count):
+        with app.app_context():
+            for i in range(start, start + count):
+                seller = User(email=f"seller{i}@colby.edu", first_name="S", last_name=str(i))
+                seller.set_password("pass")
+                db.session.add(seller)
+                db.session.flush()
+                db.session.add(Item(
+                    seller_id=seller.id,
+                    name=f"Item {i}",
+                    price=1.0,
+                    payment_options=["Cash"],
+                    item_photos="/static/assets/item_placeholder.svg",
+                ))
+            db.session.commit()
+
+    # Warm the session's identity so login costs no query in either count
+    client.get("/api/profile/me")
+    add_items_from_new_sellers(0, 2)
+    few_items, few_queries = _count_list_queries(app, client)
+
+    add_items_from_new_sellers(2, 6)
+    many_items, many_queries = _count_list_queries(app, client)
+
+    assert (few_items, many_items) == (2, 8)
+    assert many_queries == few_queries
+
+
 def test_api_get_item(authed_client, app):
     """Ensure /api/items/<id> returns a single item."""
     client, user = authed_client
@@ -319,6 +970,261 @@ def test_api_get_item(authed_client, app):
     assert resp.status_code == 200
     assert resp.get_json()["item"]["id"] == item_id
 
+def test_api_list_items_conditional_get(authed_client, app):
+    """
+    GIVEN a listing the client has already fetched
+    WHEN it is requested again with its ETag
+    THEN the answer is an empty 304 until an item or the viewer's bookmarks change
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Lamp")
+
+    first = client.get("/api/items")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert first.headers["Last-Modified"]
+    assert "Cookie" in first.headers["Vary"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/api/items", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    client.post("/api/bookmark", json={"item_id": item_id, "bookmarked": True})
+    bookmarked = client.get("/api/items", headers={"If-None-Match": etag})
+    assert bookmarked.status_code == 200
+    assert bookmarked.get_json()["items"][0]["bookmarked"] is True
+
+    etag = bookmarked.headers["ETag"]
+    with app.app_context():
+        db.session.get(Item, item_id).price = 9.0
+        db.session.commit()
+    edited = client.get("/api/items", headers={"If-None-Match": etag})
+    assert edited.status_code == 200
+    assert edited.get_json()["items"][0]["price"] == 9.0
+
+
+def test_api_list_items_version_is_not_a_catalogue_scan(authed_client, app):
+    """
+    GIVEN listed items
+    WHEN the list is requested, then an item is edited in one transaction and rolled back in another
+    THEN no statement aggregates over item, and only the committed edit bumps
+    the listings version, after the edit's own transaction
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Lamp")
+    _create_item_for_user(app, user, name="Desk")
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+        start, _ = ListingVersion.current()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement.lower())
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert client.get("/api/items?limit=1").status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert not any("max(item.updated_at)" in sql or "count(item.id)" in sql for sql in statements)
+
+    writes = []
+
+    def note_write(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE"):
+            writes.append((statement.split()[1], conn.connection.dbapi_connection))
+
+    with app.app_context():
+        event.listen(engine, "before_cursor_execute", note_write)
+        try:
+            item = db.session.get(Item, item_id)
+            item.price = 7.0
+            db.session.flush()
+            item.name = "Desk lamp"
+            db.session.commit()
+        finally:
+            event.remove(engine, "before_cursor_execute", note_write)
+        assert ListingVersion.current()[0] == start + 1
+        assert [table for table, _ in writes] == ["item", "item", "listing_version"]
+        assert writes[-1][1] is not writes[0][1]
+
+        db.session.get(Item, item_id).price = 8.0
+        db.session.flush()
+        db.session.rollback()
+        assert ListingVersion.current()[0] == start + 1
+
+
+def test_api_get_item_not_modified_skips_serializing(authed_client, app, monkeypatch):
+    """
+    GIVEN an item the client has already fetched
+    WHEN it is requested with If-None-Match or If-Modified-Since
+    THEN it answers 304 without serializing the item
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Lamp")
+
+    first = client.get(f"/api/items/{item_id}")
+    assert first.status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a 304 must not serialize the item")
+    monkeypatch.setattr(Item, "to_dict", fail)
+
+    by_etag = client.get(f"/api/items/{item_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert by_etag.status_code == 304
+    by_date = client.get(f"/api/items/{item_id}",
+                         headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert by_date.status_code == 304
+
+
+def test_api_profile_conditional_get(authed_client, app):
+    """
+    GIVEN the current user's profile, already fetched
+    WHEN it is requested again with its ETag before and after the user changes
+    THEN it answers 304, then 200 with the new data
+    """
+    client, user = authed_client
+
+    first = client.get("/api/profile/me")
+    etag = first.headers["ETag"]
+    assert client.get("/api/profile/me", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/api/profile/{user.id}",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+    with app.app_context():
+        db.session.get(User, user.id).profile_description = "New bio"
+        db.session.commit()
+    changed = client.get("/api/profile/me", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["user"]["profile_description"] == "New bio"
+
+
+def _feed_key(app):
+    """Helper returning the feed cache key of the first default-size page right now."""
+    with app.app_context():
+        return f"{ListingVersion.current()[0]}:{views.DEFAULT_PAGE_SIZE}:"
+
+
+def test_api_list_items_feed_cache_overlays_viewer_flags(authed_client, app):
+    """
+    GIVEN a feed page cached without viewer-specific fields
+    WHEN the viewer asks for it
+    THEN bookmarked and is_owner are filled in for that viewer
+    """
+    client, user = authed_client
+    with app.app_context():
+        seller = User(email="feedseller@colby.edu", first_name="Feed", last_name="Seller")
+        seller.set_password("pass")
+        db.session.add(seller)
+        db.session.commit()
+        theirs = _create_item_for_user(app, seller, name="Theirs")
+    mine = _create_item_for_user(app, user, name="Mine")
+    client.post("/api/bookmark", json={"item_id": theirs, "bookmarked": True})
+
+    items = {i["id"]: i for i in client.get("/api/items").get_json()["items"]}
+    assert (items[theirs]["bookmarked"], items[theirs]["is_owner"]) == (True, False)
+    assert (items[mine]["bookmarked"], items[mine]["is_owner"]) == (False, True)
+
+    cached = feed_cache.get(_feed_key(app))
+    assert [i["id"] for i in cached["items"]] == [mine, theirs]
+    assert all("bookmarked" not in i and "is_owner" not in i for i in cached["items"])
+
+    # Bookmarks are overlaid, so toggling one keeps the cached page
+    client.post("/api/bookmark", json={"item_id": theirs, "bookmarked": False})
+    assert feed_cache.get(_feed_key(app)) is not None
+    items = {i["id"]: i for i in client.get("/api/items").get_json()["items"]}
+    assert items[theirs]["bookmarked"] is False
+
+
+def test_api_list_items_feed_cache_invalidated_by_listing_writes(authed_client, app):
+    """
+    GIVEN a cached feed page
+    WHEN an item changes, or a seller's name changes, or only a bio changes
+    THEN the first two drop the cached page and the last keeps it
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Lamp")
+
+    client.get("/api/items")
+    key = _feed_key(app)
+    assert feed_cache.get(key) is not None
+    with app.app_context():
+        db.session.get(Item, item_id).price = 9.0
+        db.session.commit()
+    assert feed_cache.get(key) is None
+    assert client.get("/api/items").get_json()["items"][0]["price"] == 9.0
+
+    key = _feed_key(app)
+    with app.app_context():
+        db.session.get(User, user.id).profile_description = "Only the bio"
+        db.session.commit()
+    assert _feed_key(app) == key
+    assert feed_cache.get(key) is not None
+
+    with app.app_context():
+        db.session.get(User, user.id).first_name = "Renamed"
+        db.session.commit()
+    assert feed_cache.get(key) is None
+    assert client.get("/api/items").get_json()["items"][0]["seller"]["first_name"] == "Renamed"
+
+
+def test_api_list_items_feed_cache_ignores_pages_from_before_another_process_wrote(
+        authed_client, app):
+    """
+    GIVEN a feed page cached in this process
+    WHEN another process edits an item (so this process's cache is never cleared)
+    THEN the next request doesn't serve the cached page, and its ETag changes
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Lamp", price=5.0)
+    first = client.get("/api/items")
+    assert feed_cache.get(_feed_key(app)) is not None
+
+    # What the other process's commit leaves in the database; no hooks run here
+    with app.app_context():
+        db.session.execute(update(Item).where(Item.id == item_id).values(price=9.0))
+        db.session.execute(update(ListingVersion).values(version=ListingVersion.version + 1))
+        db.session.commit()
+
+    resp = client.get("/api/items", headers={"If-None-Match": first.headers["ETag"]})
+    assert resp.status_code == 200
+    assert resp.get_json()["items"][0]["price"] == 9.0
+
+
+def test_listing_changes_are_pushed_to_the_feed_room(authed_client, app):
+    """
+    GIVEN a browse page subscribed to the feed and one that isn't
+    WHEN an item is created, edited and deleted
+    THEN the subscriber gets one delta per change, an edit carrying only
+    the changed fields, and the other page gets nothing
+    """
+    client, user = authed_client
+    feed = _socket_as(app, user.id, client)
+    other = _socket_as(app, user.id)
+    try:
+        feed.emit("join_feed")
+
+        created = client.post("/api/items", data={"name": "Lamp", "price": "5"},
+                              content_type="multipart/form-data").get_json()["item"]
+        client.put(f"/api/items/{created['id']}", data={"name": "Lamp", "price": "7"},
+                   content_type="multipart/form-data")
+        client.delete(f"/api/items/{created['id']}")
+
+        events = [(e["name"], e["args"][0]) for e in feed.get_received()]
+        assert [name for name, _ in events] == ["item_created", "item_updated", "item_deleted"]
+        assert events[0][1]["name"] == "Lamp"
+        assert events[0][1]["seller"]["id"] == user.id
+        assert not set(views.VIEWER_FIELDS) & set(events[0][1])
+        assert events[1][1] == {"id": created["id"], "price": 7.0}
+        assert events[2][1] == {"id": created["id"]}
+        assert other.get_received() == []
+    finally:
+        feed.disconnect()
+        other.disconnect()
+
+
 #########################
 #     ITEM CREATION     #
 #########################
@@ -362,6 +1268,52 @@ def test_api_create_item_negative_price(authed_client):
     assert resp.get_json()["error"] == "Price cannot be negative"
 
 
+def test_api_create_item_invalid_payment_option(authed_client, app):
+    """Ensure creating or editing an item with an unknown payment method returns a 400 error."""
+    client, user = authed_client
+    resp = client.post(
+        "/api/items",
+        data={"name": "Book", "price": "5", "payment_options": ["Cash", "Bitcoin"]},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Invalid payment option"
+
+    item_id = _create_item_for_user(app, user, payment_options=["Venmo"])
+    resp = client.put(
+        f"/api/items/{item_id}",
+        data={"name": "Book", "price": "5", "payment_options": ["venmo"]},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 400
+    assert client.get(f"/api/items/{item_id}").get_json()["item"]["payment_options"] == ["Venmo"]
+
+
+def test_api_update_item_payment_options(authed_client, app):
+    """
+    GIVEN an item the user listed
+    WHEN only its payment options are edited
+    THEN the item's response reflects them under a new ETag
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user, name="Book", price=5.0,
+                                    payment_options=["Cash"])
+    etag = client.get(f"/api/items/{item_id}").headers["ETag"]
+
+    resp = client.put(
+        f"/api/items/{item_id}",
+        data={"name": "Book", "description": "desc", "price": "5", "condition": "Good",
+              "payment_options": ["Zelle", "Cash"]},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 200
+    assert resp.get_json()["item"]["payment_options"] == ["Cash", "Zelle"]
+
+    resp = client.get(f"/api/items/{item_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
 def test_api_create_item_success_default(authed_client, app):
     """
     Ensure a valid item creation request succeeds and persists using an
@@ -416,20 +1368,45 @@ def test_api_create_item_local_success(authed_client, app):
         },
         content_type="multipart/form-data",
     )
-    assert resp.status_code == 201
+    # The item exists right away; its photo is processed in the background
+    assert resp.status_code == 202
 
     item = resp.get_json()["item"]
     assert item["name"] == "Chair"
     assert item["price"] == 25.0
-    assert item["item_photos"].startswith("/static/uploads/")
+    assert item["photo_status"] == "pending"
+    assert item["item_photos"] == "/static/assets/item_placeholder.svg"
 
     with app.app_context():
+        assert run_pending() == 1
         db_item = Item.query.get(item["id"])
         assert db_item is not None
         # Ensure the item is associated with the current user
         assert db_item.seller_id == user.id
+        assert db_item.item_photos.startswith("/media/uploads/")
+        assert db_item.photo_status is None
+
+def _fake_cloudinary_raw_assets(monkeypatch, root):
+    """
+    Helper standing in for Cloudinary's private raw assets (where queued
+    uploads wait) with files under root; returns the dict of stored ids.
+    """
+    stored = {}
+
+    def upload_large(fileobj, public_id, **kwargs):
+        path = root / public_id.replace("/", "_")
+        path.write_bytes(fileobj.read())
+        stored[public_id] = path
 
-def test_api_create_item_cloudinary_success(monkeypatch, authed_client, app):
+    monkeypatch.setattr(cloudinary.uploader, "upload_large", upload_large)
+    monkeypatch.setattr(cloudinary.utils, "private_download_url",
+                        lambda public_id, fmt, **kwargs: stored[public_id].as_uri())
+    monkeypatch.setattr(cloudinary.uploader, "destroy",
+                        lambda public_id, **kwargs: stored.pop(public_id).unlink())
+    return stored
+
+
+def test_api_create_item_cloudinary_success(monkeypatch, authed_client, app, tmp_path):
     """
     Given that if uri is set, it ensures a valid item creation request succeeds 
     and persists.
@@ -443,6 +1420,7 @@ def test_api_create_item_cloudinary_success(monkeypatch, authed_client, app):
         return {"secure_url": "https://res.cloudinary.com/fake/image.jpg"}
 
     monkeypatch.setattr("cloudinary.uploader.upload", fake_upload)
+    raw_assets = _fake_cloudinary_raw_assets(monkeypatch, tmp_path)
 
     img = io.BytesIO()
     image = Image.new("RGB", (10, 10), color="blue")
@@ -463,18 +1441,22 @@ def test_api_create_item_cloudinary_success(monkeypatch, authed_client, app):
             follow_redirects=True
         )
 
-    assert response.status_code == 201
+    assert response.status_code == 202
 
     item = response.get_json()["item"]
     assert item["name"] == "Test Item"
     assert item["price"] == 10
-    assert item["item_photos"] == "https://res.cloudinary.com/fake/image.jpg"
+    assert item["photo_status"] == "pending"
 
     with app.app_context():
+        run_pending()
         db_item = Item.query.get(item["id"])
         assert db_item is not None
         # Ensure the item is associated with the current user
         assert db_item.seller_id == user.id
+        assert db_item.item_photos == "https://res.cloudinary.com/fake/image.jpg"
+    # The queued upload is deleted once processed
+    assert raw_assets == {}
 
 
 def test_api_create_item_success_invalid_image_file(authed_client, app, monkeypatch):
@@ -702,7 +1684,7 @@ def test_api_update_item_keeps_existing_photo_when_no_new_file(authed_client, ap
 def test_api_update_item_replaces_photo_when_new_file_uploaded(authed_client, app, monkeypatch):
     """Ensure uploading a new image when editing replaces the item photo path."""
     # Force the view code into "local" mode so it saves files locally
-    # and does not call Cloudinary / Pillow validation.
+    # and does not call Cloudinary.
     monkeypatch.setattr("website.views.asset_folder", "local_marketplace", raising=False)
 
     client, user = authed_client
@@ -717,9 +1699,10 @@ def test_api_update_item_replaces_photo_when_new_file_uploaded(authed_client, ap
         item_photos=original_photo,
     )
 
-    # Fake "image" file in memory
-    file_bytes = io.BytesIO(b"fake image data")
-    file_bytes.name = "new_image.png"  # helps Werkzeug name it
+    # Small real PNG in memory
+    file_bytes = io.BytesIO()
+    Image.new("RGB", (10, 10), color="green").save(file_bytes, format="PNG")
+    file_bytes.seek(0)
 
     data = {
         "name": "New name",
@@ -736,19 +1719,22 @@ def test_api_update_item_replaces_photo_when_new_file_uploaded(authed_client, ap
         data=data,
         content_type="multipart/form-data",
     )
-    assert resp.status_code == 200
+    assert resp.status_code == 202
     updated = resp.get_json()["item"]
 
-    # Photo should have changed from the original
-    assert updated["item_photos"] != original_photo
-    assert updated["item_photos"].startswith("/static/uploads/")
+    # The old photo stays up until the new one has been processed
+    assert updated["item_photos"] == original_photo
+    assert updated["photo_status"] == "pending"
 
     with app.app_context():
+        run_pending()
         refreshed = Item.query.get(item_id)
-        assert refreshed.item_photos == updated["item_photos"]
+        assert refreshed.item_photos != original_photo
+        assert refreshed.item_photos.startswith("/media/uploads/")
+        assert refreshed.photo_status is None
 
 
-def test_api_update_item_success_cloudinary(authed_client, app, monkeypatch):
+def test_api_update_item_success_cloudinary(authed_client, app, monkeypatch, tmp_path):
     """
     Ensure a valid item update request  succeeds when the uri is not set, i.e using Cloudinary.
     """
@@ -761,6 +1747,7 @@ def test_api_update_item_success_cloudinary(authed_client, app, monkeypatch):
         return {"secure_url": "https://res.cloudinary.com/fake/new_image.jpg"}
     
     monkeypatch.setattr("cloudinary.uploader.upload", fake_upload)
+    _fake_cloudinary_raw_assets(monkeypatch, tmp_path)
 
     item_id = _create_item_for_user(app, user, name="Old", price=5.0)
 
@@ -783,12 +1770,15 @@ def test_api_update_item_success_cloudinary(authed_client, app, monkeypatch):
             content_type="multipart/form-data",
         )
 
-    assert response.status_code == 200
+    assert response.status_code == 202
 
     item = response.get_json()["item"]
     assert item["name"] == "New name"
     assert item["price"] == 10
-    assert item["item_photos"] == "https://res.cloudinary.com/fake/new_image.jpg"
+
+    with app.app_context():
+        run_pending()
+        assert Item.query.get(item_id).item_photos == "https://res.cloudinary.com/fake/new_image.jpg"
 
 
 def test_api_update_item_invalid_image_file_cloudinary(authed_client, app, monkeypatch):
@@ -976,6 +1966,117 @@ def test_api_bookmark_toggle(authed_client, app):
     assert resp_remove.status_code == 200
     assert item_id not in resp_remove.get_json()["bookmarks"]
 
+def test_api_bookmark_is_idempotent(authed_client, app):
+    """Ensure bookmarking twice stores one row and unbookmarking twice is harmless."""
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user)
+
+    for _ in range(2):
+        resp = client.post("/api/bookmark", json={"item_id": item_id, "bookmarked": True})
+        assert resp.status_code == 200
+        assert resp.get_json()["bookmarks"] == [item_id]
+
+    with app.app_context():
+        assert Bookmark.query.filter_by(user_id=user.id).count() == 1
+
+    for _ in range(2):
+        resp = client.post("/api/bookmark", json={"item_id": item_id, "bookmarked": False})
+        assert resp.status_code == 200
+        assert resp.get_json()["bookmarks"] == []
+
+
+def test_api_bookmark_flags_are_per_user(authed_client, app):
+    """Ensure another user's bookmark doesn't mark the item as bookmarked for us."""
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user)
+
+    with app.app_context():
+        other = User(email="bookmarker@colby.edu", first_name="B", last_name="M")
+        other.set_password("pass")
+        db.session.add(other)
+        db.session.flush()
+        Bookmark.add(other.id, item_id)
+        db.session.commit()
+
+    items = client.get("/api/items").get_json()["items"]
+    assert items[0]["bookmarked"] is False
+    assert client.get(f"/api/items/{item_id}").get_json()["item"]["bookmarked"] is False
+
+
+def test_api_delete_item_removes_bookmarks(authed_client, app):
+    """Ensure deleting an item also deletes bookmarks pointing at it."""
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user)
+    client.post("/api/bookmark", json={"item_id": item_id, "bookmarked": True})
+
+    resp = client.delete(f"/api/items/{item_id}")
+    assert resp.status_code == 200
+
+    with app.app_context():
+        assert Bookmark.query.filter_by(item_id=item_id).count() == 0
+
+
+def test_api_delete_item_removes_its_chats(authed_client, app):
+    """
+    GIVEN an item with a chat history, one line of which is still buffered
+    WHEN the seller deletes the item
+    THEN the item, its chats and their messages are gone and the buffer drops the line
+    """
+    client, user = authed_client
+    item_id = _create_item_for_user(app, user)
+    with app.app_context():
+        buyer = User(email="frank@colby.edu", first_name="Frank", last_name="F", password_hash="x")
+        db.session.add(buyer)
+        db.session.commit()
+        chat_id = Chat.for_conversation(item_id, user.id, buyer.id).id
+        message_buffer.add(chat_id, buyer.id, "Still for sale?")
+        message_buffer.flush()
+        message_buffer.add(chat_id, user.id, "Yes")
+
+    resp = client.delete(f"/api/items/{item_id}")
+    assert resp.status_code == 200
+
+    with app.app_context():
+        assert db.session.get(Item, item_id) is None
+        assert Chat.query.filter_by(item_id=item_id).count() == 0
+        assert Message.query.filter_by(chat_id=chat_id).count() == 0
+    assert len(message_buffer) == 0
+
+
+def test_api_bookmark_batch_applies_final_state(authed_client, app):
+    """Ensure a batch applies the last operation per item and reports missing items."""
+    client, user = authed_client
+    keep_id = _create_item_for_user(app, user, name="Keep")
+    drop_id = _create_item_for_user(app, user, name="Drop")
+    client.post("/api/bookmark", json={"item_id": drop_id, "bookmarked": True})
+
+    resp = client.post("/api/bookmarks/batch", json={"operations": [
+        {"item_id": keep_id, "bookmarked": True},
+        {"item_id": keep_id, "bookmarked": False},
+        {"item_id": keep_id, "bookmarked": True},
+        {"item_id": drop_id, "bookmarked": False},
+        {"item_id": 999999, "bookmarked": True},
+    ]})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["bookmarks"] == [keep_id]
+    assert data["missing"] == [999999]
+
+
+def test_api_bookmark_batch_invalid_payload(authed_client):
+    """Ensure malformed batches are rejected without applying anything."""
+    client, _ = authed_client
+
+    assert client.post("/api/bookmarks/batch", json={}).status_code == 400
+    resp = client.post("/api/bookmarks/batch", json={"operations": [{"item_id": "x",
+                                                                     "bookmarked": True}]})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "item_id must be an integer"
+
+    too_many = [{"item_id": i, "bookmarked": True} for i in range(views.MAX_BOOKMARK_BATCH + 1)]
+    assert client.post("/api/bookmarks/batch", json={"operations": too_many}).status_code == 400
+
+
 #########################
 #      DATABASE_URL     #
 #########################
@@ -1034,14 +2135,17 @@ def test_avatar_upload_local(monkeypatch, authed_client, app):
             content_type="multipart/form-data",
             follow_redirects=True
         )
+        assert User.query.get(user.id).profile_image_status == "pending"
+        run_pending()
         refreshed = User.query.get(user.id)
 
     assert response.status_code == 200
-    # Ensure user's profile_image was set to /static/uploads/...
-    assert refreshed.profile_image.startswith("/static/uploads/")
+    # Ensure user's profile_image was set to /media/avatars/...
+    assert refreshed.profile_image.startswith("/media/avatars/")
+    assert refreshed.profile_image_status is None
 
 
-def test_avatar_upload_cloudinary(monkeypatch, authed_client, app):
+def test_avatar_upload_cloudinary(monkeypatch, authed_client, app, tmp_path):
     """
     Given that if uri is not set, when a user tries to upload an avatar,
     the avatar is saved.
@@ -1055,6 +2159,7 @@ def test_avatar_upload_cloudinary(monkeypatch, authed_client, app):
         return {"secure_url": "https://res.cloudinary.com/fake/image.jpg"}
 
     monkeypatch.setattr("cloudinary.uploader.upload", fake_upload)
+    _fake_cloudinary_raw_assets(monkeypatch, tmp_path)
 
     img = io.BytesIO()
     image = Image.new("RGB", (10, 10), color="blue")
@@ -1073,6 +2178,7 @@ def test_avatar_upload_cloudinary(monkeypatch, authed_client, app):
             content_type="multipart/form-data",
             follow_redirects=True
         )
+        run_pending()
         refreshed = User.query.get(user.id)
 
     assert response.status_code == 200
@@ -1180,8 +2286,13 @@ def test_avatar_cloudinary_unidentified_image_error(authed_client, monkeypatch):
         content_type="multipart/form-data",
         follow_redirects=True
     )
-    assert response.status_code == 400
-    assert response.get_json()["error"] == "Invalid image file"
+    # Same as the local branch: back to the edit page with a flash
+    assert response.status_code == 200
+
+    with client.session_transaction() as sess:
+        flashes = sess.get("_flashes", [])
+
+    assert ("error", "Invalid image file.") in flashes
 
     # Assert user image NOT updated
     assert not user.profile_image 
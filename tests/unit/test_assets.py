@@ -0,0 +1,22 @@
+from website.assets import build_manifest
+
+
+def test_build_manifest_hashes_content_and_skips_uploads(tmp_path):
+    """
+    GIVEN a static directory with assets, uploads and seed data
+    WHEN the manifest is built
+    THEN only the assets are listed, keyed by relative path, and the hash follows the content
+    """
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "data").mkdir()
+    (tmp_path / "styles.css").write_text("body {}")
+    (tmp_path / "assets" / "logo.svg").write_text("<svg/>")
+    (tmp_path / "uploads" / "photo.jpeg").write_bytes(b"jpeg")
+    (tmp_path / "data" / "Items.csv").write_text("id")
+
+    manifest = build_manifest(str(tmp_path))
+    assert set(manifest) == {"styles.css", "assets/logo.svg"}
+
+    (tmp_path / "styles.css").write_text("body { color: red }")
+    assert build_manifest(str(tmp_path))["styles.css"] != manifest["styles.css"]
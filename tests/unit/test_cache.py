@@ -0,0 +1,84 @@
+from website import cache as cache_module
+from website.cache import RedisCache, TTLCache, build_cache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """
+    GIVEN a full cache
+    WHEN another key is stored
+    THEN the least recently used key is the one evicted
+    """
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    """
+    GIVEN a cached value
+    WHEN its ttl has passed
+    THEN the cache no longer returns it
+    """
+    now = [100.0]
+    monkeypatch.setattr("website.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    now[0] += 29
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a", "gone") == "gone"
+
+
+class FakeRedis:
+    """Stands in for a Redis client: the get/set/incr subset RedisCache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):  # pylint: disable=unused-argument
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def test_redis_cache_round_trips_json_and_clears_by_generation():
+    """
+    GIVEN a RedisCache on a Redis stand-in
+    WHEN values are stored, read back and the cache cleared
+    THEN reads return the stored JSON until clear() moves to a new generation
+    """
+    client = FakeRedis()
+    cache = RedisCache(client, "feed", ttl=60)
+    cache.set("24:", {"items": [{"id": 1}], "next_cursor": None})
+    assert cache.get("24:") == {"items": [{"id": 1}], "next_cursor": None}
+
+    cache.clear()
+    assert cache.get("24:", "gone") == "gone"
+    cache.set("24:", {"items": []})
+    assert cache.get("24:") == {"items": []}
+
+
+def test_build_cache_uses_redis_when_configured(monkeypatch):
+    """
+    GIVEN REDIS_URL set or not
+    WHEN a cache is built
+    THEN it is a RedisCache on that server, else an in-process TTLCache
+    """
+    monkeypatch.setattr(cache_module, "redis_client", lambda url: FakeRedis())
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert isinstance(build_cache("feed", maxsize=4, ttl=5), TTLCache)
+
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    cache = build_cache("feed", maxsize=4, ttl=5)
+    assert isinstance(cache, RedisCache)
+    assert (cache.namespace, cache.ttl) == ("feed", 5)
@@ -1,3 +1,5 @@
+import pytest
+from sqlalchemy import inspect
 from website.models import User, Item
 # Currently need to figure out what to do with Chat in the models
 
@@ -39,7 +41,7 @@ def test_user_to_dict():
     assert user_dict['last_name'] == 'Smith'
     assert user_dict['profile_image'] is None
     assert user_dict['profile_description'] is None
-    assert user_dict['bookmark_items'] is None
+    assert user_dict['bookmark_items'] == []
     assert user_dict['selling_items'] is None
     assert user_dict['date_created'] is None
 
@@ -63,6 +65,23 @@ def test_item_to_dict():
     assert item_dict['live_on_market'] is None
     assert item_dict['date_created'] is None
 
+def test_item_payment_options():
+    """
+    GIVEN an item
+    WHEN its payment options are set
+    THEN they are kept once each in PAYMENT_METHODS order, and unknown methods are refused
+    """
+    item = Item(name='item', payment_options=['Venmo', 'Cash', 'Venmo'])
+    assert item.payment_options == ['Cash', 'Venmo']
+    assert item.to_dict()['payment_options'] == ['Cash', 'Venmo']
+
+    item.payment_options = ['Zelle']
+    assert [row.method for row in item.payment_methods] == ['Zelle']
+
+    with pytest.raises(ValueError):
+        item.payment_options = ['Bitcoin']
+    assert item.payment_options == ['Zelle']
+
 def test_item_user():
     """
     GIVEN a user
@@ -73,3 +92,15 @@ def test_item_user():
     item = Item(name='random item', seller=user)
     assert item.seller == user
     assert item.seller_id == user.id
+
+
+def test_user_json_columns_are_deferred():
+    """
+    GIVEN the User mapping
+    WHEN its columns are inspected
+    THEN the bookmark_items/selling_items JSON columns load only when read
+    """
+    attrs = inspect(User).column_attrs
+    assert attrs["selling_items"].deferred
+    assert attrs["bookmark_items"].deferred
+    assert not attrs["first_name"].deferred
@@ -0,0 +1,188 @@
+import io
+
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import pytest
+
+from website import storage
+
+
+class FakeS3Client:
+    """Stands in for a boto3 S3 client: keeps objects in a dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys):  # pylint: disable=invalid-name
+        keys = sorted(k for (bucket, k) in self.objects if bucket == Bucket and k.startswith(Prefix))
+        return {"Contents": [{"Key": k} for k in keys[:MaxKeys]]} if keys else {}
+
+    def put_object(self, **kwargs):
+        self.puts.append(kwargs)
+        self.objects[(kwargs["Bucket"], kwargs["Key"])] = kwargs["Body"]
+
+
+def test_content_key_depends_only_on_bytes():
+    """
+    GIVEN two byte strings
+    WHEN their content keys are computed
+    THEN equal bytes share a key under the kind's sharded directory, different bytes don't
+    """
+    key = storage.content_key(b"photo", "uploads", "jpeg")
+    assert key == storage.content_key(b"photo", "uploads", "jpeg")
+    assert key != storage.content_key(b"other", "uploads", "jpeg")
+    kind, shard, name = key.split("/")
+    assert kind == "uploads"
+    assert name.startswith(shard) and name.endswith(".jpeg")
+
+
+def test_local_storage_saves_identical_files_once(tmp_path):
+    """
+    GIVEN the local backend
+    WHEN the same bytes are saved twice
+    THEN both saves return the same /media URL and one file exists
+    """
+    backend = storage.LocalStorage(str(tmp_path))
+    first = backend.save(b"photo", "uploads", "jpeg")
+    second = backend.save(b"photo", "uploads", "jpeg")
+
+    assert first == second
+    assert first.startswith("/media/uploads/")
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert len(files) == 1
+    assert files[0].read_bytes() == b"photo"
+
+
+class ChunkedReader:
+    """A file-like object recording the size of every read."""
+
+    def __init__(self, data):
+        self.source = io.BytesIO(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return self.source.read(size)
+
+
+def test_local_storage_streams_uploads_in_and_out(tmp_path):
+    """
+    GIVEN the local backend and an upload bigger than one copy chunk
+    WHEN it is saved as a stream, read back and deleted
+    THEN it is read in bounded chunks, comes back intact and is gone afterwards
+    """
+    backend = storage.LocalStorage(str(tmp_path))
+    data = b"x" * (storage.STREAM_CHUNK_SIZE * 3 + 1)
+    reader = ChunkedReader(data)
+    key = storage.incoming_key()
+
+    backend.save_stream(reader, key)
+    assert reader.reads and all(0 < size <= storage.STREAM_CHUNK_SIZE for size in reader.reads)
+    with backend.open_stream(key) as stored:
+        assert stored.read() == data
+
+    backend.delete(key)
+    backend.delete(key)  # deleting twice is fine
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_s3_storage_uploads_once_with_immutable_headers():
+    """
+    GIVEN the S3 backend with a fake client
+    WHEN the same bytes are saved twice
+    THEN one object is put, with its content type and immutable Cache-Control
+    """
+    client = FakeS3Client()
+    backend = storage.S3Storage("photos", client=client, public_url="https://cdn.example.com/")
+
+    url = backend.save(b"thumb", "uploads", "webp")
+    assert backend.save(b"thumb", "uploads", "webp") == url
+
+    assert len(client.puts) == 1
+    put = client.puts[0]
+    assert put["ContentType"] == "image/webp"
+    assert put["CacheControl"] == storage.IMMUTABLE_CACHE_CONTROL
+    assert url == f"https://cdn.example.com/{put['Key']}"
+
+
+def test_get_storage_picks_backend_by_name(monkeypatch):
+    """
+    GIVEN backend names
+    WHEN get_storage is asked for them
+    THEN Cloudinary, S3 or the local store is returned
+    """
+    monkeypatch.setenv("S3_BUCKET", "photos")
+    monkeypatch.setattr(storage, "BACKENDS", {})
+
+    assert isinstance(storage.get_storage("marketplace"), storage.CloudinaryStorage)
+    s3 = storage.get_storage("s3")
+    assert isinstance(s3, storage.S3Storage)
+    assert s3.public_url == "https://photos.s3.amazonaws.com"
+    assert storage.get_storage("s3") is s3
+    assert isinstance(storage.get_storage("local_marketplace"), storage.LocalStorage)
+
+
+def test_get_storage_refuses_unknown_backends():
+    """
+    GIVEN a backend name that isn't one of BACKEND_NAMES (e.g. a typo in STORAGE_BACKEND)
+    WHEN get_storage is asked for it
+    THEN it raises instead of quietly writing to local disk
+    """
+    with pytest.raises(storage.UnknownStorageBackend):
+        storage.get_storage("s4")
+
+
+def test_local_storage_removes_its_temp_file_when_a_write_fails(tmp_path):
+    """
+    GIVEN the local backend and an upload stream that breaks halfway
+    WHEN it is saved
+    THEN the error propagates and no temp file or partial file is left behind
+    """
+    class Broken(ChunkedReader):
+        """Fails on its second read."""
+        def read(self, size=-1):
+            if self.reads:
+                raise OSError("connection reset")
+            return super().read(size)
+
+    backend = storage.LocalStorage(str(tmp_path))
+    with pytest.raises(OSError):
+        backend.save_stream(Broken(b"x" * (storage.STREAM_CHUNK_SIZE * 2)), "incoming/broken")
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_cloudinary_storage_implements_the_base_api(monkeypatch):
+    """
+    GIVEN the Cloudinary backend with a fake API
+    WHEN it is used through exists(), write() and url()
+    THEN they check, upload and address the hash-named asset in the kind's folder
+    """
+    assets = {}
+
+    def resource(public_id):
+        if public_id not in assets:
+            raise cloudinary.exceptions.NotFound(public_id)
+        return assets[public_id]
+
+    def upload(file, public_id, **kwargs):
+        assets[public_id] = {"data": file.read(), **kwargs}
+        return {"secure_url": f"https://res.cloudinary.com/demo/{public_id}"}
+
+    monkeypatch.setattr(cloudinary.api, "resource", resource)
+    monkeypatch.setattr(cloudinary.uploader, "upload", upload)
+    monkeypatch.setattr(cloudinary.config(), "cloud_name", "demo")
+
+    backend = storage.CloudinaryStorage("marketplace")
+    key = storage.content_key(b"photo", "uploads", "jpeg")
+    public_id = key.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+    assert not backend.exists(key)
+    backend.write(key, b"photo", "image/jpeg")
+    assert backend.exists(key)
+    assert assets[public_id]["data"] == b"photo"
+    assert assets[public_id]["asset_folder"] == "marketplace_uploads"
+    assert backend.url(key).startswith("https://res.cloudinary.com/demo/image/upload/")
+    assert backend.url(key).endswith(f"/{public_id}.jpeg")
+
@@ -0,0 +1,33 @@
+import pytest
+
+from website.images import InvalidImage
+from website.uploads import sniff_magic
+
+
+@pytest.mark.parametrize("head", [
+    b"\x89PNG\r\n\x1a\n" + b"\x00" * 8,
+    b"\xff\xd8\xff\xe0" + b"\x00" * 8,
+])
+def test_sniff_magic_accepts_png_and_jpeg(head):
+    """
+    GIVEN the first bytes of a PNG or JPEG
+    WHEN they are sniffed
+    THEN nothing is raised
+    """
+    sniff_magic(head)
+
+
+@pytest.mark.parametrize("head, error", [
+    (b"GIF89a" + b"\x00" * 8, "Invalid image format"),
+    (b"\x00\x00\x00\x18ftypheic", "Invalid image format"),
+    (b"this-is-not-an-image", "Invalid image file"),
+    (b"", "Invalid image file"),
+])
+def test_sniff_magic_rejects_other_files(head, error):
+    """
+    GIVEN the first bytes of another image format or of a non-image
+    WHEN they are sniffed
+    THEN InvalidImage carries the matching user-facing error
+    """
+    with pytest.raises(InvalidImage, match=error):
+        sniff_magic(head)
@@ -6,6 +6,7 @@ import eventlet
 eventlet.monkey_patch()
 
 from flask import Flask
+from werkzeug.exceptions import RequestEntityTooLarge
 
 #Auth Libraries
 from flask_login import LoginManager
@@ -16,17 +17,20 @@ from authlib.integrations.flask_client import OAuth
 import cloudinary
 
 from .extensions import db, socketio
+from .realtime import socketio_options
 
 def create_app():
     """
     This function creates the Flask app and configures it as well.
     """
     app = Flask(__name__)
-    socketio.init_app(app)
+    # Relays emits between processes when SOCKETIO_MESSAGE_QUEUE/REDIS_URL is set
+    socketio.init_app(app, **socketio_options())
 
     from .views import main_blueprint, item_blueprint, profile_blueprint
-    from .models import User
-    from .auth import auth_blueprint
+    from .auth import auth_blueprint, load_principal
+    from .migrations import migrate_cli, upgrade
+    from . import assets, jobs
 
     uri = os.getenv("DATABASE_URL")  # Heroku sets this automatically
 
@@ -42,6 +46,16 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret-key")
 
+    # Uploads: Werkzeug rejects bigger requests before reading them (413);
+    # photos are checked in the spool dir before being queued
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 12 * 1024 * 1024))
+    app.config["UPLOAD_SPOOL_DIR"] = os.environ.get(
+        "UPLOAD_SPOOL_DIR", os.path.join(app.instance_path, "upload_spool")
+    )
+
+    # Chat lines are written in batches at least this often (seconds); 0 = only when full
+    app.config["CHAT_FLUSH_INTERVAL"] = float(os.environ.get("CHAT_FLUSH_INTERVAL", 1))
+
     #Client for Google Clode
     app.config["GOOGLE_CLIENT_ID"] = os.environ.get("GOOGLE_CLIENT_ID")
     app.config["GOOGLE_SECRET_KEY"] = os.environ.get("GOOGLE_SECRET_KEY")
@@ -79,9 +93,8 @@ def create_app():
     login_man.login_view = 'auth.signup'
     login_man.login_message = None
 
-    @login_man.user_loader
-    def load_user(id):
-        return db.session.get(User, int(id))
+    # Identity comes from the signed session; the User row only loads if a view needs it
+    login_man.user_loader(load_principal)
 
     #Blueprint Register Section
     app.register_blueprint(main_blueprint)
@@ -89,10 +102,21 @@ def create_app():
     app.register_blueprint(profile_blueprint)
     app.register_blueprint(auth_blueprint)
 
-    # auto create tables in local dev only
-    if uri.startswith("sqlite:///"):
+    app.cli.add_command(migrate_cli)
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_too_large(error):  # pylint: disable=unused-argument
+        return {"error": "Upload is too large"}, 413
+    jobs.init_app(app)
+    assets.init_app(app)
+
+    # Local SQLite databases migrate on startup. Heroku runs
+    # `flask migrate upgrade` in the release phase instead (see Procfile),
+    # so web dynos never race each other on schema changes.
+    default_auto = "1" if uri.startswith("sqlite:///") else "0"
+    if os.environ.get("AUTO_MIGRATE", default_auto) == "1":
         with app.app_context():
-            db.create_all()
+            upgrade(db.engine)
     return app
 
 if __name__ == '__main__':
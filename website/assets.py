@@ -0,0 +1,84 @@
+"""
+assets.py - Fingerprinted URLs and cache headers for static files.
+
+At startup every file under static/ (except uploads/ and data/) is hashed
+into a manifest. Templates link static files with asset_url(filename),
+which takes the same filename as url_for("static", ...) and adds the
+file's hash: /static/styles.css?v=<hash>. A request carrying the current
+hash can only ever get those bytes, so it is served with
+IMMUTABLE_CACHE_CONTROL and the browser doesn't ask again until the file
+(and so its URL) changes. Anything else is served with no-cache and a
+content-hash ETag, so revalidating costs a 304.
+
+script.js gets the manifest as window.ASSET_URLS (see the templates).
+"""
+
+import hashlib
+import os
+
+from flask import current_app, request, send_from_directory, url_for
+
+from .storage import IMMUTABLE_CACHE_CONTROL, IMMUTABLE_MAX_AGE
+
+# Not fingerprinted: user files and seed data
+SKIP_DIRS = ("uploads", "data")
+HASH_LENGTH = 12
+
+
+def build_manifest(static_dir):
+    """Maps each static file's path (relative, "/"-separated) to a hash of its content."""
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        if dirpath == static_dir:
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+            manifest[os.path.relpath(path, static_dir).replace(os.sep, "/")] = digest
+    return manifest
+
+
+def get_manifest():
+    """
+    The app's manifest. In debug mode it is rebuilt on every call, so
+    edited files get new URLs without a restart.
+    """
+    app = current_app
+    if app.debug:
+        return build_manifest(app.static_folder)
+    return app.extensions["asset_manifest"]
+
+
+def asset_url(filename):
+    """URL of a static file, fingerprinted if it is in the manifest."""
+    digest = get_manifest().get(filename)
+    if digest is None:
+        return url_for("static", filename=filename)
+    return url_for("static", filename=filename, v=digest)
+
+
+def asset_urls(prefix="assets/"):
+    """Fingerprinted URLs of the static files under prefix, for script.js."""
+    return {name: asset_url(name) for name in sorted(get_manifest()) if name.startswith(prefix)}
+
+
+def serve_static(filename):
+    """Replaces Flask's static view to add the cache headers described above."""
+    digest = get_manifest().get(filename)
+    fingerprinted = digest is not None and request.args.get("v") == digest
+    response = send_from_directory(
+        current_app.static_folder, filename,
+        etag=digest or True,
+        max_age=IMMUTABLE_MAX_AGE if fingerprinted else None,
+    )
+    if fingerprinted:
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def init_app(app):
+    """Builds the manifest and installs asset_url and the static view."""
+    app.extensions["asset_manifest"] = build_manifest(app.static_folder)
+    app.view_functions["static"] = serve_static
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
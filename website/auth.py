@@ -4,11 +4,12 @@ signup, login, logout, and Google OAuth.
 """
 
 import os
+import time
 
 from authlib.integrations.base_client.errors import OAuthError
-from flask import (Blueprint, current_app, flash, redirect, render_template,
-                   request, url_for)
-from flask_login import login_required, login_user, logout_user
+from flask import (Blueprint, abort, current_app, flash, redirect,
+                   render_template, request, session, url_for)
+from flask_login import UserMixin, login_required, login_user, logout_user
 
 from website.extensions import db
 
@@ -17,6 +18,82 @@ from .models import User
 #Auth Blueprint
 auth_blueprint = Blueprint('auth', __name__)
 
+# How long the identity kept in the session is trusted before it is checked
+# against the database again (so deleted or renamed users catch up)
+PRINCIPAL_TTL = 300
+
+
+# ==================
+# SESSION PRINCIPAL
+# ==================
+
+class SessionUser(UserMixin):
+    """
+    The logged-in user as the signed session knows them: id, email and
+    name, no database query needed. Anything else (current_user.to_dict(),
+    setting profile_description, ...) loads the User row on first use and
+    is passed through to it. If the row is gone by then, the user is logged
+    out and the request is refused, as if load_principal had returned None.
+    """
+
+    def __init__(self, identity):
+        object.__setattr__(self, "_identity", identity)
+        object.__setattr__(self, "_user", None)
+
+    @property
+    def user(self):
+        """The full User row, loaded on first use."""
+        if self._user is None:
+            user = db.session.get(User, self._identity["id"])
+            if user is None:
+                # Deleted while the session identity was still trusted
+                session.pop("principal", None)
+                logout_user()
+                abort(current_app.login_manager.unauthorized())
+            object.__setattr__(self, "_user", user)
+        return self._user
+
+    def __getattr__(self, name):
+        identity = object.__getattribute__(self, "_identity")
+        if name in identity:
+            return identity[name]
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+
+def remember_principal(user):
+    """Stores the user's identity in the session for load_principal."""
+    session["principal"] = {
+        "id": user.id,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "checked": time.time(),
+    }
+
+
+def load_principal(user_id):
+    """
+    Flask-Login's user loader. Answers from the session while its identity
+    is fresh, otherwise reads just the identity columns and refreshes it.
+    """
+    user_id = int(user_id)
+    principal = session.get("principal")
+    if (principal is None or principal["id"] != user_id
+            or time.time() - principal["checked"] > PRINCIPAL_TTL):
+        row = db.session.execute(
+            db.select(User.id, User.email, User.first_name, User.last_name)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            session.pop("principal", None)
+            return None
+        remember_principal(row)
+        principal = session["principal"]
+    return SessionUser({k: v for k, v in principal.items() if k != "checked"})
+
 
 @auth_blueprint.route('/signup', methods = ['GET', 'POST'])
 def signup():
@@ -39,6 +116,7 @@ def logout():
     This function handles when a user logs out.
     """
     logout_user()
+    session.pop("principal", None)
     return redirect(url_for('auth.login'))
 
 # ===========
@@ -102,6 +180,7 @@ def authorize_google():
     # 6. Log user in
     try:
         login_user(user)
+        remember_principal(user)
     except Exception:
         return redirect(url_for("auth.login", error="Login failed"))
 
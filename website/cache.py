@@ -0,0 +1,202 @@
+"""
+cache.py - Small caches for hot, user-independent reads.
+
+Each cache is a TTLCache in this process, or a RedisCache shared by every
+worker when REDIS_URL is set. Both have the same get/set/clear interface.
+Cached item listings are dropped as soon as a commit touches an item or a
+seller's name (see the session hooks at the bottom). That only reaches
+this process's TTLCache, so after the commit models.ListingVersion is
+bumped too, and listing cache keys start with it: a page cached before a
+write in any process is never looked up again.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries also expire after ttl seconds.
+    Safe to share between the greenlets/threads of one worker process.
+    """
+
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Stores value under key, evicting the least recently used entry when full.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every entry, e.g. after a write made them stale.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    A cache in Redis (or anything speaking its get/set/incr commands),
+    shared by every worker. Values must be JSON serializable.
+
+    clear() bumps a generation number that is part of every key, so it is a
+    single INCR however many entries there are; the old ones expire by TTL.
+    """
+
+    def __init__(self, client, namespace, ttl=30):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key):
+        generation = int(self.client.get(f"{self.namespace}:generation") or 0)
+        return f"{self.namespace}:{generation}:{key}"
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if missing or expired.
+        """
+        raw = self.client.get(self._key(key))
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        """
+        Stores value under key for ttl seconds.
+        """
+        self.client.set(self._key(key), json.dumps(value), ex=self.ttl)
+
+    def clear(self):
+        """
+        Drops every entry, e.g. after a write made them stale.
+        """
+        self.client.incr(f"{self.namespace}:generation")
+
+
+def redis_client(url):
+    """A Redis client for url. redis is only needed when REDIS_URL is set."""
+    import redis  # pylint: disable=import-outside-toplevel
+    return redis.Redis.from_url(url)
+
+
+def build_cache(namespace, maxsize, ttl):
+    """
+    A RedisCache under namespace if REDIS_URL is set, else a TTLCache.
+    """
+    url = os.environ.get("REDIS_URL")
+    if url:
+        return RedisCache(redis_client(url), namespace, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+# Search bar typeahead results, keyed by listings version and normalized prefix
+suggest_cache = build_cache("suggest", maxsize=512, ttl=30)
+
+# Pages of the browse feed, keyed by listings version, page size and cursor.
+# Entries hold the viewer-independent item payloads; views overlays
+# bookmarked/is_owner per request.
+feed_cache = build_cache("feed", maxsize=64, ttl=60)
+
+LISTING_CACHES = (suggest_cache, feed_cache)
+
+
+# =========================
+# Invalidation
+# =========================
+# Seller fields that appear in item listings
+LISTED_SELLER_FIELDS = ("first_name", "last_name")
+
+
+def invalidate_item_listings():
+    """Drops every cached item listing."""
+    for cache in LISTING_CACHES:
+        cache.clear()
+
+
+def _changes_listings(session, obj):
+    # Imported here: models doesn't need the caches, but they need models
+    from .models import Item, User  # pylint: disable=import-outside-toplevel
+    if isinstance(obj, Item):
+        return obj in session.new or obj in session.deleted or session.is_modified(obj)
+    if isinstance(obj, User) and obj not in session.new:
+        state = inspect(obj)
+        return any(state.attrs[name].history.has_changes() for name in LISTED_SELLER_FIELDS)
+    return False
+
+
+def bump_listing_version(engine):
+    """
+    Bumps models.ListingVersion in its own short transaction. Writers only
+    hold its row lock for this one UPDATE, not for their whole transaction,
+    so item writes (requests, photo jobs) don't queue up behind each other.
+    """
+    from .models import ListingVersion  # pylint: disable=import-outside-toplevel
+    with engine.begin() as connection:
+        connection.execute(
+            update(ListingVersion)
+            .values(version=ListingVersion.version + 1, changed_at=datetime.utcnow())
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _note_listing_writes(session, flush_context):  # pylint: disable=unused-argument
+    if session.info.get("item_listings_changed"):
+        return
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(_changes_listings(session, obj) for obj in changed):
+        session.info["item_listings_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("item_listings_changed", False):
+        invalidate_item_listings()
+        # After the commit, never before: a page built from the old rows
+        # can only be cached under the old version
+        try:
+            bump_listing_version(session.get_bind())
+        except Exception:  # pylint: disable=broad-exception-caught
+            # The write itself is committed; caches still expire by TTL
+            log.exception("Could not bump the listings version")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_writes(session):
+    session.info.pop("item_listings_changed", None)
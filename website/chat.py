@@ -0,0 +1,117 @@
+"""
+chat.py - Persisting chat messages without a write per message.
+
+Socket handlers add() each line to the process-wide message_buffer and
+return. The buffer is written with one multi-row INSERT when it reaches
+BATCH_SIZE lines, or by a background task every CHAT_FLUSH_INTERVAL
+seconds (0 turns the task off; tests call flush() themselves). Reading a
+chat's history flushes first, so a sender always sees their own lines.
+Closing a socket flushes too, and so does the server shutting down
+(gunicorn's worker_exit hook in gunicorn.conf.py, or leaving
+socketio.run in app.py), so lines are not lost between two flushes.
+"""
+
+from datetime import datetime
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import insert
+
+from website.extensions import db, socketio
+
+from .models import Message
+
+BATCH_SIZE = 50
+# If the database is down, keep at most this many lines waiting for it
+MAX_PENDING = 5000
+
+
+class MessageBuffer:
+    """Chat lines waiting to be written, oldest first."""
+
+    def __init__(self):
+        self._rows = []
+        self._lock = Lock()
+        self._flusher_started = False
+
+    def add(self, chat_id, sender_id, body):
+        """
+        Queues one line for writing; writes the batch if it is full. If the
+        database is down the batch stays queued and the error is only logged,
+        so the sender's message still goes out.
+        """
+        with self._lock:
+            self._rows.append({"chat_id": chat_id, "sender_id": sender_id,
+                               "body": body, "created_at": datetime.utcnow()})
+            full = len(self._rows) >= BATCH_SIZE
+        self._start_flusher()
+        if full:
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                current_app.logger.exception("Could not write chat messages")
+
+    def flush(self):
+        """
+        Writes every queued line in one INSERT. Returns how many were written.
+        On failure the lines stay queued for the next flush.
+        """
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            db.session.execute(insert(Message), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._rows = (rows + self._rows)[-MAX_PENDING:]
+            raise
+        return len(rows)
+
+    def discard(self, chat_ids):
+        """Drops the queued lines of chats that are being deleted."""
+        chat_ids = set(chat_ids)
+        with self._lock:
+            self._rows = [row for row in self._rows if row["chat_id"] not in chat_ids]
+
+    def clear(self):
+        """Drops every queued line without writing it."""
+        with self._lock:
+            self._rows = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _start_flusher(self):
+        interval = current_app.config.get("CHAT_FLUSH_INTERVAL")
+        if self._flusher_started or not interval:
+            return
+        self._flusher_started = True
+        socketio.start_background_task(self._flush_forever,
+                                       current_app._get_current_object(),  # pylint: disable=protected-access
+                                       interval)
+
+    def _flush_forever(self, app, interval):
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    app.logger.exception("Could not write chat messages")
+
+
+message_buffer = MessageBuffer()
+
+
+def flush_quietly(app):
+    """Flushes message_buffer, logging instead of raising if the database is down."""
+    with app.app_context():
+        try:
+            return message_buffer.flush()
+        except Exception:  # pylint: disable=broad-exception-caught
+            app.logger.exception("Could not write chat messages")
+            return 0
+
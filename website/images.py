@@ -0,0 +1,225 @@
+"""
+images.py - Background processing of uploaded item photos and avatars.
+
+A request only streams the upload into a spool file and checks its header
+(see uploads.py), then streams it on into the storage backend and queues
+a job carrying its key, and answers 202. Spool files are local to one dyno
+and gone after a restart; the backend is shared. The job reads the upload
+back as a stream, decodes the image, normalizes it to a reasonably sized
+JPEG, stores it through the same backend (see storage.py), points the item
+or user at the result and deletes the upload.
+
+Item photos also get thumbnails (THUMBNAIL_WIDTHS, in WebP with a JPEG
+fallback) so the browse grid can pick the smallest one that fills a card.
+Every file we write is re-encoded from pixels, so no EXIF (GPS etc.) survives.
+"""
+
+import io
+import os
+
+from eventlet import tpool
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from website.extensions import db
+
+from .jobs import enqueue, handler
+from .models import Item, User
+from .realtime import publish_feed
+from .storage import get_storage, incoming_key
+
+ALLOWED_FORMATS = ("PNG", "JPEG")
+# Longest side we keep; phone photos are several times larger than any page shows
+MAX_DIMENSION = 2048
+JPEG_QUALITY = 85
+
+# Thumbnail sizes for item cards (longest side, px) and their encodings, best first.
+# AVIF would beat WebP but our Pillow build can't encode it.
+THUMBNAIL_WIDTHS = (256, 512, 1024)
+THUMBNAIL_FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 6}),
+                     "jpeg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True})}
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image we accept. str(exc) is the user-facing error."""
+
+
+def _encode(img, image_format, **options):
+    out = io.BytesIO()
+    img.save(out, format=image_format, **options)
+    return out.getvalue()
+
+
+def transcode(source, thumbnails=False):
+    """
+    Decodes the upload (a path or file object) and re-encodes it as a JPEG no larger than
+    MAX_DIMENSION, upright and without metadata. Raises InvalidImage if the
+    file turns out to be corrupt.
+
+    Returns (jpeg, variants). With thumbnails=True, variants is a list of
+    (fmt, width, bytes) for every THUMBNAIL_WIDTHS size smaller than the
+    photo (or just the photo's own size, if it is smaller than all of them).
+    """
+    try:
+        with Image.open(source) as img:
+            if img.format not in ALLOWED_FORMATS:
+                raise InvalidImage("Invalid image format")
+            # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, so a 48 MP
+            # photo never needs its full-size bitmap in memory
+            img.draft("RGB", (MAX_DIMENSION, MAX_DIMENSION))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            jpeg = _encode(img, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+            variants = []
+            if thumbnails:
+                longest = max(img.size)
+                sizes = [w for w in THUMBNAIL_WIDTHS if w < longest] or [longest]
+                for size in sizes:
+                    thumb = img.copy()
+                    thumb.thumbnail((size, size), Image.LANCZOS)
+                    for fmt, (image_format, options) in THUMBNAIL_FORMATS.items():
+                        variants.append((fmt, thumb.width, _encode(thumb, image_format, **options)))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise InvalidImage("Invalid image file") from exc
+    return jpeg, variants
+
+
+# =========================
+# Enqueueing (called from views)
+# =========================
+def store_spooled(path, asset_folder):
+    """
+    Streams a spooled upload into the storage backend, deletes the spool
+    file and returns the upload's key.
+    """
+    key = incoming_key()
+    try:
+        with open(path, "rb") as f:
+            get_storage(asset_folder).save_stream(f, key)
+    finally:
+        discard(path)
+    return key
+
+
+def queue_item_photo(item, path, asset_folder):
+    """
+    Marks the item's photo as pending and queues the spooled upload at path
+    for processing. The caller commits.
+    """
+    item.photo_status = "pending"
+    enqueue("item_photo", upload_key=store_spooled(path, asset_folder), item_id=item.id,
+            asset_folder=asset_folder)
+
+
+def queue_avatar(user, path, asset_folder):
+    """
+    Marks the user's avatar as pending and queues the spooled upload at path
+    for processing. The caller commits.
+    """
+    user.profile_image_status = "pending"
+    enqueue("avatar", upload_key=store_spooled(path, asset_folder), user_id=user.id,
+            asset_folder=asset_folder)
+
+
+def discard(path):
+    """Deletes a spooled upload."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# =========================
+# Job handlers
+# =========================
+def _publish_photo(item):
+    """Tells open browse pages the item's photo is ready (or failed)."""
+    data = item.to_dict(include_seller=False)
+    publish_feed("item_updated", {"id": item.id, "item_photos": data["item_photos"],
+                                  "photo_srcset": data["photo_srcset"],
+                                  "photo_status": data["photo_status"]})
+
+
+def _transcode_upload(job, thumbnails=False):
+    """Reads the job's upload back from storage as a stream and transcodes it."""
+    storage = get_storage(job.payload["asset_folder"])
+    with storage.open_stream(job.payload["upload_key"]) as source:
+        # Decoding is CPU-bound; a native thread keeps it off the eventlet hub
+        return tpool.execute(transcode, source, thumbnails=thumbnails)
+
+
+def _drop_upload(job):
+    """Deletes the job's upload once nothing will read it again."""
+    get_storage(job.payload["asset_folder"]).delete(job.payload["upload_key"])
+
+
+def _item_photo_failed(job):
+    item = db.session.get(Item, job.payload["item_id"])
+    if item is not None:
+        item.photo_status = "failed"
+        db.session.commit()
+        _publish_photo(item)
+    _drop_upload(job)
+
+
+@handler("item_photo", on_failure=_item_photo_failed)
+def process_item_photo(job):
+    """Transcodes and stores an item photo, then swaps it in."""
+    item = db.session.get(Item, job.payload["item_id"])
+    if item is None:
+        _drop_upload(job)
+        return  # deleted while the photo was queued
+
+    try:
+        jpeg, thumbnails = _transcode_upload(job, thumbnails=True)
+    except InvalidImage:
+        item.photo_status = "failed"
+        db.session.commit()
+        _drop_upload(job)
+        _publish_photo(item)
+        return
+
+    storage = get_storage(job.payload["asset_folder"])
+    variants = {}
+    for fmt, width, data in thumbnails:
+        variants.setdefault(fmt, []).append([width, storage.save(data, "uploads", fmt)])
+
+    item.item_photos = storage.save(jpeg, "uploads", "jpeg")
+    item.photo_variants = variants
+    item.photo_status = None
+    db.session.commit()
+    _drop_upload(job)
+    _publish_photo(item)
+
+
+def _avatar_failed(job):
+    user = db.session.get(User, job.payload["user_id"])
+    if user is not None:
+        user.profile_image_status = "failed"
+        db.session.commit()  # the profile page polls for this
+    _drop_upload(job)
+
+
+@handler("avatar", on_failure=_avatar_failed)
+def process_avatar(job):
+    """Transcodes and stores an avatar, then swaps it in."""
+    user = db.session.get(User, job.payload["user_id"])
+    if user is None:
+        _drop_upload(job)
+        return
+
+    try:
+        jpeg, _ = _transcode_upload(job)
+    except InvalidImage:
+        user.profile_image_status = "failed"
+        db.session.commit()
+        _drop_upload(job)
+        return
+
+    storage = get_storage(job.payload["asset_folder"])
+    user.profile_image = storage.save(jpeg, "avatars", "jpeg")
+    user.profile_image_status = None
+    db.session.commit()
+    _drop_upload(job)
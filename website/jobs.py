@@ -0,0 +1,199 @@
+"""
+jobs.py - A small database-backed background job queue.
+
+Requests enqueue() work as Job rows and return right away; a worker claims
+and runs them. By default the worker is a background task inside the web
+process (JOBS_IN_PROCESS=1), which is all our single dyno needs. Set
+JOBS_IN_PROCESS=0 and run `flask --app app jobs work` to move it into a
+separate worker process instead. Tests turn the worker off and call
+run_pending() themselves.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_, update
+
+from website.extensions import db, socketio
+
+from .models import Job
+
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 1
+# How long a worker may hold a job before another worker assumes it died
+LEASE = timedelta(minutes=5)
+RETRY_DELAY = timedelta(seconds=30)
+
+HANDLERS = {}
+
+
+def handler(kind, on_failure=None):
+    """
+    Decorator registering func(job) as the handler for jobs of this kind.
+    A handler that raises is retried; on_failure(job) runs once the job has
+    failed MAX_ATTEMPTS times.
+    """
+    def register(func):
+        HANDLERS[kind] = (func, on_failure)
+        return func
+    return register
+
+
+def enqueue(kind, **payload):
+    """
+    Adds a job to the session; it becomes visible to workers once the
+    caller commits, together with whatever the job refers to.
+    """
+    job = Job(kind=kind, payload=payload)
+    db.session.add(job)
+    return job
+
+
+def claim_next():
+    """
+    Marks the next runnable job as ours and returns it, or None if there is none.
+    The conditional UPDATE guarantees two workers never claim the same job.
+    A job whose lease ran out MAX_ATTEMPTS times (it keeps killing its
+    worker) is marked failed instead of being retried forever.
+    """
+    while True:
+        now = datetime.utcnow()
+        candidate = db.session.execute(
+            db.select(Job.id, Job.run_after, Job.status, Job.attempts)
+            .where(Job.status.in_(("queued", "running")), Job.run_after <= now)
+            .order_by(Job.id)
+            .limit(1)
+        ).first()
+        if candidate is None:
+            db.session.commit()
+            return None
+
+        if candidate.status == "running" and candidate.attempts >= MAX_ATTEMPTS:
+            _fail_abandoned(candidate)
+            continue
+
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == candidate.id, Job.run_after == candidate.run_after,
+                   or_(Job.status == "queued", Job.status == "running"))
+            .values(status="running", attempts=Job.attempts + 1, run_after=now + LEASE)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, candidate.id)
+
+
+def _fail_abandoned(candidate):
+    """Marks a job that died with its worker on its last attempt as failed."""
+    failed = db.session.execute(
+        update(Job)
+        .where(Job.id == candidate.id, Job.run_after == candidate.run_after,
+               Job.status == "running")
+        .values(status="failed", error="Lease expired on the last attempt")
+    ).rowcount
+    db.session.commit()
+    if not failed:
+        return  # another worker got to it first
+    job = db.session.get(Job, candidate.id)
+    _, on_failure = HANDLERS[job.kind]
+    if on_failure:
+        on_failure(job)
+        db.session.commit()
+
+
+def run_job(job):
+    """
+    Runs one claimed job and records the outcome. Returns True on success.
+    """
+    func, on_failure = HANDLERS[job.kind]
+    job_id = job.id
+    try:
+        func(job)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error = f"{type(exc).__name__}: {exc}"[:500]
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "failed"
+            if on_failure:
+                on_failure(job)
+        else:
+            job.status = "queued"
+            job.run_after = datetime.utcnow() + RETRY_DELAY * job.attempts
+        db.session.commit()
+        return False
+
+    job.status = "done"
+    job.error = None
+    db.session.commit()
+    return True
+
+
+def run_pending(limit=None):
+    """
+    Runs runnable jobs until there are none left (or limit were run).
+    Returns how many jobs ran.
+    """
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def work(app):
+    """Worker loop: run whatever is runnable, then sleep briefly."""
+    while True:
+        with app.app_context():
+            try:
+                ran = run_pending(limit=10)
+            except Exception:  # pylint: disable=broad-exception-caught
+                app.logger.exception("Background job worker error")
+                db.session.rollback()
+                ran = 0
+        if not ran:
+            socketio.sleep(POLL_SECONDS)
+
+
+def init_app(app):
+    """
+    Registers the jobs CLI and, unless JOBS_IN_PROCESS=0, starts the
+    in-process worker with the first request (so CLI commands such as
+    `flask migrate` never start one).
+    """
+    app.cli.add_command(jobs_cli)
+
+    if os.environ.get("JOBS_IN_PROCESS", "1") != "1":
+        return
+
+    started = []
+
+    @app.before_request
+    def start_worker():
+        if not started:
+            started.append(True)
+            socketio.start_background_task(work, app)
+
+
+# =========================
+# CLI: flask --app app jobs ...
+# =========================
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+
+@jobs_cli.command("work")
+def work_command():
+    """Run a worker until interrupted."""
+    work(current_app._get_current_object())  # pylint: disable=protected-access
+
+
+@jobs_cli.command("run")
+def run_command():
+    """Run every job that is due now, then exit."""
+    click.echo(f"Ran {run_pending()} job(s).")
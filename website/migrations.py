@@ -0,0 +1,600 @@
+"""
+migrations.py - Versioned schema migrations.
+
+Every schema change ships as a numbered migration below. Applied versions
+are recorded in the schema_migrations table, so `flask migrate upgrade`
+only runs what a database is missing. Production runs it in Heroku's
+release phase (see Procfile); local SQLite databases migrate at startup.
+
+Migrations describe the schema as it was at their version (frozen Table
+definitions or plain SQL), never through the current models, so old
+migrations keep meaning the same thing as the models evolve. They are
+also written to be safe on a database that already has some of the
+changes, e.g. one created by db.create_all() before migrations existed.
+
+Index builds are "online" migrations: they run outside a transaction so
+Postgres can use CREATE INDEX CONCURRENTLY and never lock writes to item.
+"""
+
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+from website.extensions import db
+
+# Serializes concurrent `migrate upgrade` runs on Postgres (any constant works)
+ADVISORY_LOCK_KEY = 7_246_001
+
+# Lives in the app metadata so db.drop_all() forgets applied versions too
+schema_migrations = sa.Table(
+    "schema_migrations", db.metadata,
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("name", sa.String(120), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+class Migration:
+    """
+    One schema change. upgrade(connection) does the work; transactional=False
+    runs it on an autocommit connection (needed for CONCURRENTLY).
+    """
+
+    def __init__(self, version, name, upgrade, transactional=True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+def migration(version, transactional=True):
+    """
+    Decorator registering a function as the migration with this version.
+    The function's docstring is the migration's description.
+    """
+    def register(func):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        name = (func.__doc__ or func.__name__).strip().splitlines()[0]
+        MIGRATIONS.append(Migration(version, name, func, transactional))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return register
+
+
+# =========================
+# Helpers for migrations
+# =========================
+def create_index(connection, name, table, columns, unique=False, using=None):
+    """
+    Creates an index unless it already exists. On Postgres it is built
+    CONCURRENTLY, which only works inside a transactional=False migration.
+    columns is SQL, e.g. "seller_id, date_created DESC".
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    target = f"{table} USING {using} ({columns})" if using else f"{table} ({columns})"
+
+    if connection.dialect.name == "postgresql":
+        # A failed concurrent build leaves an INVALID index behind; IF NOT EXISTS
+        # would then skip it forever, so clear it out before retrying.
+        invalid = connection.exec_driver_sql(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            f"WHERE c.relname = '{name}' AND NOT i.indisvalid"
+        ).first()
+        if invalid:
+            connection.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        connection.exec_driver_sql(
+            f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}"
+        )
+    else:
+        connection.exec_driver_sql(
+            f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {target}"
+        )
+
+
+def add_column(connection, table, column):
+    """
+    Adds a column (an sa.Column) to an existing table unless it's already there.
+    """
+    existing = {c["name"] for c in sa.inspect(connection).get_columns(table)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(dialect=connection.dialect)
+    # "user" is a reserved word on Postgres
+    quoted = connection.dialect.identifier_preparer.quote(table)
+    ddl = f"ALTER TABLE {quoted} ADD COLUMN {column.name} {column_type}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    connection.exec_driver_sql(ddl)
+
+
+def drop_column(connection, table, name):
+    """
+    Drops a column from a table if it's there. Postgres only marks it
+    dropped (no table rewrite); SQLite needs 3.35 or later.
+    """
+    existing = {c["name"] for c in sa.inspect(connection).get_columns(table)}
+    if name not in existing:
+        return
+    quoted = connection.dialect.identifier_preparer.quote(table)
+    connection.exec_driver_sql(f"ALTER TABLE {quoted} DROP COLUMN {name}")
+
+
+# =========================
+# The migrations
+# =========================
+baseline = sa.MetaData()
+
+sa.Table(
+    "user", baseline,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("email", sa.String(80), unique=True, nullable=False),
+    sa.Column("password_hash", sa.String(255), nullable=False),
+    sa.Column("first_name", sa.String(40), nullable=False),
+    sa.Column("last_name", sa.String(40), nullable=False),
+    sa.Column("profile_image", sa.String(255)),
+    sa.Column("profile_description", sa.String(2000)),
+    sa.Column("bookmark_items", sa.JSON),
+    sa.Column("selling_items", sa.JSON),
+    sa.Column("date_created", sa.DateTime, nullable=False),
+)
+sa.Table(
+    "item", baseline,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("seller_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+    sa.Column("name", sa.String(80), nullable=False),
+    sa.Column("description", sa.String(2000)),
+    sa.Column("item_photos", sa.String(255), nullable=False),
+    sa.Column("price", sa.Float, nullable=False),
+    sa.Column("condition", sa.String(50)),
+    sa.Column("payment_options", sa.JSON),
+    sa.Column("bookmarked", sa.Boolean),
+    sa.Column("live_on_market", sa.Boolean, nullable=False),
+    sa.Column("date_created", sa.DateTime, nullable=False),
+)
+sa.Table(
+    "chat", baseline,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("item_id", sa.Integer, sa.ForeignKey("item.id"), nullable=False),
+    sa.Column("seller_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+    sa.Column("buyer_ids", sa.JSON),
+    sa.Column("messages", sa.JSON, nullable=False),
+)
+
+
+@migration(1)
+def create_baseline_tables(connection):
+    """Create the original user, item and chat tables"""
+    baseline.create_all(connection, checkfirst=True)
+
+
+bookmark = sa.Table(
+    "bookmark", sa.MetaData(),
+    sa.Column("user_id", sa.Integer, sa.ForeignKey(baseline.tables["user"].c.id,
+                                                   ondelete="CASCADE"), primary_key=True),
+    sa.Column("item_id", sa.Integer, sa.ForeignKey(baseline.tables["item"].c.id,
+                                                   ondelete="CASCADE"), primary_key=True),
+    sa.Column("created_at", sa.DateTime, nullable=False),
+    sa.Index("ix_bookmark_item_id", "item_id"),
+)
+
+
+@migration(2)
+def create_bookmark_table(connection):
+    """Move bookmarks from user.bookmark_items JSON into a bookmark table"""
+    bookmark.create(connection, checkfirst=True)
+
+    user, item = baseline.tables["user"], baseline.tables["item"]
+    rows = connection.execute(
+        sa.select(user.c.id, user.c.bookmark_items).where(user.c.bookmark_items.isnot(None))
+    ).all()
+    existing_items = {
+        item_id for (item_id,) in connection.execute(sa.select(item.c.id))
+    } if rows else set()
+
+    now = datetime.utcnow()
+    for user_id, item_ids in rows:
+        wanted = set()
+        for raw_id in item_ids or []:
+            try:
+                wanted.add(int(raw_id))
+            except (TypeError, ValueError):
+                continue
+        # Skip pairs already copied so re-running the migration is harmless
+        copied = {
+            item_id for (item_id,) in connection.execute(
+                sa.select(bookmark.c.item_id).where(bookmark.c.user_id == user_id)
+            )
+        }
+        new_rows = [
+            {"user_id": user_id, "item_id": item_id, "created_at": now}
+            for item_id in sorted((wanted & existing_items) - copied)
+        ]
+        if new_rows:
+            connection.execute(bookmark.insert(), new_rows)
+
+    connection.execute(
+        user.update().where(user.c.bookmark_items.isnot(None)).values(bookmark_items=sa.null())
+    )
+
+
+# The search schema as migrations 3 and 4 build it, copied from search.py
+# so later edits there can't change what they do.
+
+# SQLite: an FTS5 table over item, kept in step by triggers
+SEARCH_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS item_fts USING fts5(
+        name, description, condition,
+        content='item', content_rowid='id', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_insert AFTER INSERT ON item BEGIN
+        INSERT INTO item_fts(rowid, name, description, condition)
+        VALUES (new.id, new.name, new.description, new.condition);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_delete AFTER DELETE ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description, condition)
+        VALUES ('delete', old.id, old.name, old.description, old.condition);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_update
+    AFTER UPDATE OF name, description, condition ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description, condition)
+        VALUES ('delete', old.id, old.name, old.description, old.condition);
+        INSERT INTO item_fts(rowid, name, description, condition)
+        VALUES (new.id, new.name, new.description, new.condition);
+    END
+    """,
+]
+
+# Postgres: a tsvector column filled by a trigger. Not GENERATED ... STORED:
+# adding that to an existing item table rewrites every row under an ACCESS
+# EXCLUSIVE lock.
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}condition, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}description, '')), 'C')
+"""
+SEARCH_BACKFILL_BATCH = 1000
+
+
+def _search_vector_is_generated(connection):
+    """True if item.search_vector is a GENERATED column, as an older search.py made it."""
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'item' "
+        "AND column_name = 'search_vector' AND is_generated = 'ALWAYS'"
+    ).first() is not None
+
+
+@migration(3)
+def create_search_index(connection):
+    """Full-text search over item name/description/condition"""
+    if connection.dialect.name == "sqlite":
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'item_fts'").first()
+        for statement in SEARCH_SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql("INSERT INTO item_fts(item_fts) VALUES ('rebuild')")
+        return
+    if connection.dialect.name != "postgresql":
+        return
+    if _search_vector_is_generated(connection):
+        return  # already kept up to date by Postgres itself
+    # Nullable, no default: a catalog change, no table rewrite. Existing
+    # rows are backfilled in batches by the next migration.
+    connection.exec_driver_sql("ALTER TABLE item ADD COLUMN IF NOT EXISTS search_vector tsvector")
+    connection.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION item_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row="NEW.")};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS item_search_vector_update ON item")
+    connection.exec_driver_sql("""
+        CREATE TRIGGER item_search_vector_update
+        BEFORE INSERT OR UPDATE OF name, description, condition ON item
+        FOR EACH ROW EXECUTE FUNCTION item_search_vector_update()
+    """)
+
+
+@migration(4, transactional=False)
+def create_search_gin_indexes(connection):
+    """Backfill search vectors and build their GIN indexes on Postgres"""
+    if connection.dialect.name != "postgresql":
+        return
+    if not _search_vector_is_generated(connection):
+        # One short transaction per batch (autocommit), so no long-held row locks
+        while connection.exec_driver_sql(
+            f"UPDATE item SET search_vector = {SEARCH_VECTOR_SQL.format(row='')} "
+            "WHERE id IN (SELECT id FROM item WHERE search_vector IS NULL "
+            f"ORDER BY id LIMIT {SEARCH_BACKFILL_BATCH})"
+        ).rowcount:
+            pass
+    create_index(connection, "ix_item_search_vector", "item", "search_vector", using="GIN")
+    create_index(connection, "ix_item_name_search", "item",
+                 "to_tsvector('simple', coalesce(name, ''))", using="GIN")
+
+
+@migration(5, transactional=False)
+def create_item_and_chat_indexes(connection):
+    """Indexes for the browse feed, seller listings and chat lookups"""
+    create_index(connection, "ix_item_live_created", "item",
+                 "live_on_market, date_created DESC, id DESC")
+    create_index(connection, "ix_item_seller_created", "item",
+                 "seller_id, date_created DESC, id DESC")
+    create_index(connection, "ix_chat_item_id", "chat", "item_id")
+    create_index(connection, "ix_chat_seller_id", "chat", "seller_id")
+
+
+job = sa.Table(
+    "job", sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("kind", sa.String(40), nullable=False),
+    sa.Column("payload", sa.JSON, nullable=False),
+    sa.Column("data", sa.LargeBinary),
+    sa.Column("status", sa.String(20), nullable=False),
+    sa.Column("attempts", sa.Integer, nullable=False),
+    sa.Column("error", sa.String(500)),
+    sa.Column("run_after", sa.DateTime, nullable=False),
+    sa.Column("created_at", sa.DateTime, nullable=False),
+    sa.Index("ix_job_status_run_after", "status", "run_after"),
+)
+
+
+@migration(6)
+def create_job_queue(connection):
+    """Background job queue and pending photo states"""
+    job.create(connection, checkfirst=True)
+    add_column(connection, "item", sa.Column("photo_status", sa.String(20)))
+    add_column(connection, "user", sa.Column("profile_image_status", sa.String(20)))
+
+
+@migration(7)
+def add_photo_variants(connection):
+    """Thumbnail variants of item photos"""
+    add_column(connection, "item", sa.Column("photo_variants", sa.JSON))
+
+
+UPDATED_AT_BACKFILL_BATCH = 1000
+
+
+@migration(8, transactional=False)
+def add_updated_at(connection):
+    """Last-change timestamps on items and users"""
+    for table in ("item", "user"):
+        add_column(connection, table, sa.Column("updated_at", sa.DateTime))
+        quoted = connection.dialect.identifier_preparer.quote(table)
+        low, high = connection.exec_driver_sql(f"SELECT min(id), max(id) FROM {quoted}").one()
+        if low is None:
+            continue
+        # One short transaction per id range (autocommit), so the table is never locked whole
+        for start in range(low, high + 1, UPDATED_AT_BACKFILL_BATCH):
+            connection.exec_driver_sql(
+                f"UPDATE {quoted} SET updated_at = date_created WHERE updated_at IS NULL "
+                f"AND id >= {start} AND id < {start + UPDATED_AT_BACKFILL_BATCH}"
+            )
+
+
+message = sa.Table(
+    "message", sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("chat_id", sa.Integer, sa.ForeignKey(baseline.tables["chat"].c.id,
+                                                   ondelete="CASCADE"), nullable=False),
+    sa.Column("sender_id", sa.Integer, sa.ForeignKey(baseline.tables["user"].c.id),
+              nullable=False),
+    sa.Column("body", sa.String(2000), nullable=False),
+    sa.Column("created_at", sa.DateTime, nullable=False),
+    sa.Index("ix_message_chat_id", "chat_id", "id"),
+)
+
+
+@migration(9)
+def create_message_table(connection):
+    """Chat messages as rows, and one buyer per chat"""
+    message.create(connection, checkfirst=True)
+    add_column(connection, "chat", sa.Column("buyer_id", sa.Integer))
+
+
+@migration(10, transactional=False)
+def create_chat_buyer_index(connection):
+    """Unique (item_id, buyer_id) index on chats"""
+    create_index(connection, "ix_chat_item_buyer", "chat", "item_id, buyer_id", unique=True)
+
+
+item_payment_option = sa.Table(
+    "item_payment_option", sa.MetaData(),
+    sa.Column("item_id", sa.Integer, sa.ForeignKey(baseline.tables["item"].c.id,
+                                                   ondelete="CASCADE"), primary_key=True),
+    sa.Column("method", sa.String(40), primary_key=True),
+    sa.Index("ix_item_payment_option_method", "method", "item_id"),
+)
+
+
+@migration(11)
+def create_item_payment_option_table(connection):
+    """Copy item.payment_options into indexed item_payment_option rows"""
+    item_payment_option.create(connection, checkfirst=True)
+
+    item = baseline.tables["item"]
+    copied = {
+        (item_id, method) for item_id, method in connection.execute(
+            sa.select(item_payment_option.c.item_id, item_payment_option.c.method))
+    }
+    new_rows = []
+    for item_id, methods in connection.execute(
+            sa.select(item.c.id, item.c.payment_options)
+            .where(item.c.payment_options.isnot(None))):
+        for method in dict.fromkeys(str(m)[:40] for m in methods or []):
+            if (item_id, method) not in copied:
+                new_rows.append({"item_id": item_id, "method": method})
+    if new_rows:
+        connection.execute(item_payment_option.insert(), new_rows)
+
+
+@migration(12, transactional=False)
+def create_item_facet_indexes(connection):
+    """Indexes for sorting the feed by price and filtering by condition"""
+    create_index(connection, "ix_item_live_price", "item", "live_on_market, price, id")
+    create_index(connection, "ix_item_live_condition", "item", "live_on_market, condition")
+
+
+# Words naming each payment method in legacy free-form values, checked in
+# this order (as the browse grid's icons used to be)
+LEGACY_PAYMENT_WORDS = (("venmo", "Venmo"), ("zelle", "Zelle"), ("cash", "Cash"))
+
+
+def legacy_payment_method(value):
+    """The payment method a legacy value like "venmo @me" names, or None."""
+    text = str(value).lower()
+    return next((method for word, method in LEGACY_PAYMENT_WORDS if word in text), None)
+
+
+@migration(13)
+def normalize_payment_methods(connection):
+    """Normalize payment methods to Cash/Venmo/Zelle rows and clear item.payment_options"""
+    item = baseline.tables["item"]
+    values = {}  # item id -> every legacy value, from the JSON and the rows
+    for item_id, methods in connection.execute(
+            sa.select(item.c.id, item.c.payment_options)
+            .where(item.c.payment_options.isnot(None))):
+        values.setdefault(item_id, set()).update(
+            methods if isinstance(methods, list) else [methods])
+    for item_id, method in connection.execute(
+            sa.select(item_payment_option.c.item_id, item_payment_option.c.method)):
+        values.setdefault(item_id, set()).add(method)
+
+    rows = [
+        {"item_id": item_id, "method": method}
+        for item_id, legacy in values.items()
+        for method in sorted({legacy_payment_method(v) for v in legacy if v} - {None})
+    ]
+    connection.execute(item_payment_option.delete())
+    if rows:
+        connection.execute(item_payment_option.insert(), rows)
+    connection.execute(
+        item.update().where(item.c.payment_options.isnot(None)).values(payment_options=sa.null())
+    )
+
+
+listing_version = sa.Table(
+    "listing_version", sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("version", sa.Integer, nullable=False),
+    sa.Column("changed_at", sa.DateTime, nullable=False),
+)
+
+
+@migration(14)
+def create_listing_version(connection):
+    """Item listings version counter"""
+    listing_version.create(connection, checkfirst=True)
+    if connection.execute(sa.select(listing_version.c.id)).first() is None:
+        connection.execute(listing_version.insert().values(
+            id=1, version=0, changed_at=datetime.utcnow()))
+
+
+@migration(15)
+def drop_job_data(connection):
+    """Drop job.data: uploads wait in the storage backend instead"""
+    drop_column(connection, "job", "data")
+
+
+# =========================
+# Running migrations
+# =========================
+def applied_versions(connection):
+    """
+    Returns the set of migration versions already applied to this database.
+    """
+    if not sa.inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return {v for (v,) in connection.execute(sa.select(schema_migrations.c.version))}
+
+
+def pending_migrations(engine, target=None):
+    """
+    Returns the migrations this database still needs, oldest first.
+    """
+    with engine.connect() as connection:
+        done = applied_versions(connection)
+    return [
+        m for m in MIGRATIONS
+        if m.version not in done and (target is None or m.version <= target)
+    ]
+
+
+def _run(engine, pending, log):
+    """Applies the given migrations in order, recording each one."""
+    applied = []
+    for m in pending:
+        log(f"Applying migration {m.version:04d}: {m.name}")
+        if m.transactional:
+            with engine.begin() as connection:
+                m.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=m.version, name=m.name, applied_at=datetime.utcnow()))
+        else:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                m.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=m.version, name=m.name, applied_at=datetime.utcnow()))
+        applied.append(m)
+    return applied
+
+
+def upgrade(engine, target=None, log=print):
+    """
+    Applies every pending migration (up to target, if given).
+    Returns the migrations that were applied.
+    """
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+
+    if engine.dialect.name != "postgresql":
+        return _run(engine, pending_migrations(engine, target), log)
+
+    # Only one dyno at a time may migrate; the others wait, then find nothing to do
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+        lock.execute(sa.text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            return _run(engine, pending_migrations(engine, target), log)
+        finally:
+            lock.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+# =========================
+# CLI: flask --app app migrate ...
+# =========================
+migrate_cli = AppGroup("migrate", help="Versioned database schema migrations.")
+
+
+@migrate_cli.command("upgrade")
+@click.option("--to", "target", type=int, help="Stop after this migration version.")
+def upgrade_command(target):
+    """Apply pending migrations."""
+    applied = upgrade(db.engine, target, log=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied.")
+
+
+@migrate_cli.command("status")
+def status_command():
+    """List migrations and whether each is applied."""
+    with db.engine.connect() as connection:
+        done = applied_versions(connection)
+    for m in MIGRATIONS:
+        mark = "x" if m.version in done else " "
+        click.echo(f"[{mark}] {m.version:04d} {m.name}")
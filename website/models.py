@@ -1,10 +1,18 @@
 """models.py"""
 
+from contextlib import nullcontext
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash   # Password Libraries
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects import postgresql, sqlite
 from website.extensions import db
 
+# Payment methods a listing can accept (the checkboxes on the item forms)
+PAYMENT_METHODS = ("Cash", "Venmo", "Zelle")
+
 class User(db.Model, UserMixin): #Added UserMixin parameter
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(80), unique=True, nullable=False) #Acts like username
@@ -13,10 +21,17 @@ class User(db.Model, UserMixin): #Added UserMixin parameter
     first_name = db.Column(db.String(40), nullable=False)
     last_name = db.Column(db.String(40), nullable=False)
     profile_image = db.Column(db.String(255))   # String: path to image (static/assets..)
+    # None once profile_image is current; "pending"/"failed" while a new upload is processed
+    profile_image_status = db.Column(db.String(20))
     profile_description = db.Column(db.String(2000))
-    bookmark_items = db.Column(db.JSON, default=list)   # List of item_ids bookmarked by user
-    selling_items = db.Column(db.JSON, default=list)   # List of item_ids being sold by user
+    # LEGACY: bookmarks now live in the Bookmark table. Only read by
+    # migration 2, which sets it to NULL once copied over.
+    # Both JSON columns are deferred: loading a user doesn't fetch them until they're read.
+    bookmark_items = deferred(db.Column(db.JSON))
+    selling_items = deferred(db.Column(db.JSON, default=list))   # List of item_ids being sold by user
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Bumped on every change; versions the user's API responses (ETag/Last-Modified)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # NEW: Backref from Item.seller (set in Item model below)
     items = db.relationship("Item", back_populates="seller", lazy=True)
@@ -39,14 +54,17 @@ class User(db.Model, UserMixin): #Added UserMixin parameter
         """
         Returns a simple dictionary represenation of the User for REST API.
         """
+        # Users that were never saved can't have bookmark rows yet
+        saved = inspect(self).has_identity
         return {
             "id": self.id,
             "email": self.email,
             "first_name": self.first_name,
             "last_name": self.last_name,
             "profile_image": self.profile_image,
+            "profile_image_status": self.profile_image_status,
             "profile_description": self.profile_description,
-            "bookmark_items": self.bookmark_items,
+            "bookmark_items": Bookmark.item_ids(self.id) if saved else [],
             "selling_items": self.selling_items,
             "date_created": self.date_created.isoformat() if self.date_created else None,
         }
@@ -57,15 +75,85 @@ class Item(db.Model):
     name = db.Column(db.String(80), nullable=False)
     description = db.Column(db.String(2000))
     item_photos = db.Column(db.String(255), nullable=False)
+    # None once item_photos is current; "pending"/"failed" while a new upload is processed
+    photo_status = db.Column(db.String(20))
+    # Thumbnails of item_photos: {"webp": [[width, url], ...], "jpeg": [...]}, smallest first
+    photo_variants = db.Column(db.JSON)
     price = db.Column(db.Float, nullable=False)
     condition = db.Column(db.String(50))
-    payment_options = db.Column(db.JSON, default=list)  # List of payment options for transaction
+    # Before migration 13: the payment options as a free-form JSON list. Now
+    # always NULL; the options are payment_methods rows (see payment_options)
+    legacy_payment_options = deferred(db.Column("payment_options", db.JSON))
     bookmarked = db.Column(db.Boolean, default=False)
     live_on_market = db.Column(db.Boolean, default=True, nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Bumped on every change; versions the item's API responses (ETag/Last-Modified)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # NEW: define seller relationship so we can access item.seller
     seller = db.relationship("User", back_populates="items", lazy=True)
+    # Payment methods the seller accepts, one indexed row each
+    payment_methods = db.relationship("ItemPaymentOption", lazy=True,
+                                      cascade="all, delete-orphan")
+
+    # The feed indexes end in the keyset the item list pages on, in the
+    # same order, so pages are read straight off the index.
+    __table_args__ = (
+        # Browse feed: live items, newest first
+        db.Index("ix_item_live_created", live_on_market, date_created.desc(), id.desc()),
+        # Profile listings: one seller's items, newest first
+        db.Index("ix_item_seller_created", seller_id, date_created.desc(), id.desc()),
+        # Browse feed sorted by price (either way), and price range filters
+        db.Index("ix_item_live_price", live_on_market, price, id),
+        # Condition filter and facet counts
+        db.Index("ix_item_live_condition", live_on_market, condition),
+    )
+
+    @property
+    def payment_options(self):
+        """The accepted payment methods as a list, in PAYMENT_METHODS order."""
+        methods = {row.method for row in self.payment_methods}
+        return [m for m in PAYMENT_METHODS if m in methods]
+
+    @payment_options.setter
+    def payment_options(self, value):
+        """Replaces the accepted methods. Raises ValueError for an unknown method."""
+        methods = dict.fromkeys(value or [])
+        unknown = [m for m in methods if m not in PAYMENT_METHODS]
+        if unknown:
+            raise ValueError(f"Unknown payment method: {unknown[0]}")
+        # Keep the rows that stay: dropping and re-adding one would collide on its key.
+        # Loading them mustn't flush: a view may still reject the edit.
+        session = inspect(self).session  # None until the item is added to one
+        with session.no_autoflush if session is not None else nullcontext():
+            current = {row.method: row for row in self.payment_methods}
+        if current.keys() != methods.keys():
+            # Only the rows change, so the item's UPDATE (and onupdate) wouldn't run
+            self.updated_at = datetime.utcnow()
+        self.payment_methods = [current.get(m) or ItemPaymentOption(method=m) for m in methods]
+
+    def photo_srcset(self):
+        """
+        Returns the thumbnails as srcset strings per format, e.g.
+        {"webp": "a_256.webp 256w, a_512.webp 512w", "jpeg": "..."},
+        or None for photos uploaded before thumbnails existed.
+        """
+        if not self.photo_variants:
+            return None
+        return {
+            fmt: ", ".join(f"{url} {width}w" for width, url in entries)
+            for fmt, entries in self.photo_variants.items()
+        }
+
+    @staticmethod
+    def thumbnail_url(item_photos, photo_variants):
+        """
+        Smallest stored thumbnail (WebP if we have it), else the photo itself.
+        Static so column-only queries can use it too.
+        """
+        variants = photo_variants or {}
+        entries = variants.get("webp") or variants.get("jpeg")
+        return entries[0][1] if entries else item_photos
 
     # NEW: dict representation for REST API and current user id is added
     def to_dict(self, include_seller=True, bookmarked=False, current_user_id=None):
@@ -78,9 +166,11 @@ class Item(db.Model):
             "name": self.name,
             "description": self.description,
             "item_photos": self.item_photos,
+            "photo_status": self.photo_status,
+            "photo_srcset": self.photo_srcset(),
             "price": self.price,
             "condition": self.condition,
-            "payment_options": self.payment_options or [],
+            "payment_options": self.payment_options,
             "bookmarked": bool(bookmarked),
             "live_on_market": self.live_on_market,
             "date_created": self.date_created.isoformat() if self.date_created else None,
@@ -99,16 +189,204 @@ class Item(db.Model):
 
         return data
 
+class ItemPaymentOption(db.Model):
+    """
+    One payment method an item accepts, so items can be filtered and
+    counted by method off an index.
+    """
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id', ondelete="CASCADE"),
+                        primary_key=True)
+    # Stored as VARCHAR(40) (its size before it was an enum); SQLAlchemy
+    # refuses to write anything but a PAYMENT_METHODS value
+    method = db.Column(db.Enum(*PAYMENT_METHODS, name="payment_method", native_enum=False,
+                               length=40, validate_strings=True), primary_key=True)
+
+    __table_args__ = (
+        # Items accepting a method (filters), and counts per method (facets)
+        db.Index("ix_item_payment_option_method", method, item_id),
+    )
+
+
 # The seller and buyer can chat (message one another) ON ITEM PAGE about given item
 class Chat(db.Model):
+    """
+    One conversation: an item's seller and one buyer. Its lines are Message rows.
+    """
     id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
-    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    # List of user_ids who message the seller on item page
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False, index=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # LEGACY: from before conversations had one buyer and Message rows; never written
     buyer_ids = db.Column(db.JSON, default=list)
-
-    # Messages node data: (1) Message (str), (2) id (user_id), (3) next (next node in list)
     messages = db.Column(db.JSON, nullable=False,
                          default=lambda: {"head": None, "tail": None, "nodes": {}})
 
-    # (We’re not using Chat in the REST API yet, so no to_dict here for now.)
+    __table_args__ = (
+        # One conversation per (item, buyer)
+        db.Index("ix_chat_item_buyer", item_id, buyer_id, unique=True),
+    )
+
+    @classmethod
+    def find(cls, item_id, buyer_id):
+        """Returns the chat between buyer_id and the item's seller, or None if they never talked."""
+        return cls.query.filter_by(item_id=item_id, buyer_id=buyer_id).first()
+
+    @classmethod
+    def for_conversation(cls, item_id, seller_id, buyer_id):
+        """
+        Returns the chat between buyer_id and the item's seller, creating it
+        on first contact. Commits when it creates one. Only the buyer's side
+        may create a chat; the seller answers existing ones (see find).
+        """
+        chat = cls.find(item_id, buyer_id)
+        if chat is not None:
+            return chat
+        chat = cls(item_id=item_id, seller_id=seller_id, buyer_id=buyer_id)
+        db.session.add(chat)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The buyer's other tab created it first
+            db.session.rollback()
+            chat = cls.query.filter_by(item_id=item_id, buyer_id=buyer_id).one()
+        return chat
+
+    def has_member(self, user_id):
+        """Whether user_id is the seller or the buyer of this chat."""
+        return user_id in (self.seller_id, self.buyer_id)
+
+
+class Message(db.Model):
+    """
+    One line of a chat. Rows are only ever appended; a chat's history is
+    read a page at a time off the (chat_id, id) index.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id', ondelete="CASCADE"), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.String(2000), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_message_chat_id", chat_id, id),
+    )
+
+    def to_dict(self):
+        """
+        Returns a simple dictionary represenation of the Message for REST API.
+        """
+        return {
+            "id": self.id,
+            "chat_id": self.chat_id,
+            "sender_id": self.sender_id,
+            "body": self.body,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class Bookmark(db.Model):
+    """
+    One row per (user, item) bookmark.
+    The composite primary key makes toggling a single idempotent INSERT or DELETE.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"),
+                        primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id', ondelete="CASCADE"),
+                        primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def add(cls, user_id, *item_ids):
+        """
+        Bookmarks the given items for user_id in one INSERT. Items that are
+        already bookmarked are skipped, so two tabs racing to bookmark the
+        same item can't collide.
+        """
+        if not item_ids:
+            return
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(cls)
+            .values([
+                {"user_id": user_id, "item_id": item_id, "created_at": now}
+                for item_id in item_ids
+            ])
+            .on_conflict_do_nothing()
+        )
+
+    @classmethod
+    def remove(cls, user_id, *item_ids):
+        """
+        Removes the user's bookmarks on the given items, if there are any.
+        """
+        if not item_ids:
+            return
+        db.session.execute(
+            db.delete(cls).where(cls.user_id == user_id, cls.item_id.in_(item_ids))
+        )
+
+    @classmethod
+    def item_ids(cls, user_id):
+        """
+        Returns the ids of every item the user has bookmarked, oldest first.
+        """
+        return list(db.session.scalars(
+            db.select(cls.item_id).where(cls.user_id == user_id).order_by(cls.created_at)
+        ))
+
+    @classmethod
+    def version(cls, user_id):
+        """
+        Returns (count, newest created_at) of the user's bookmarks. Adding a
+        bookmark changes the latter, removing one the former.
+        """
+        return db.session.execute(
+            db.select(db.func.count(), db.func.max(cls.created_at)).where(cls.user_id == user_id)
+        ).one()
+
+
+class ListingVersion(db.Model):
+    """
+    One row counting changes to item listings: items, and the seller
+    names shown with them. The session hooks in cache.py bump it right
+    after each such commit, so item lists are versioned (ETags) by one
+    primary-key read instead of a scan of every listed item.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls):
+        """Returns (version, changed_at) of the item listings."""
+        row = db.session.execute(db.select(cls.version, cls.changed_at)).first()
+        return tuple(row) if row else (0, None)
+
+
+@event.listens_for(ListingVersion.__table__, "after_create")
+def _create_listing_version_row(target, connection, **kw):  # pylint: disable=unused-argument
+    """The counter's single row exists as soon as its table does."""
+    connection.execute(target.insert().values(id=1, version=0, changed_at=datetime.utcnow()))
+
+
+class Job(db.Model):
+    """
+    A unit of background work for the queue in jobs.py.
+    run_after doubles as the lease of a running job: a worker that dies
+    mid-job leaves it "running" past run_after, and another worker retries it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500))
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Workers poll for the next runnable job
+        db.Index("ix_job_status_run_after", status, run_after),
+    )
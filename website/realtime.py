@@ -0,0 +1,108 @@
+"""
+realtime.py - Socket.IO message queue configuration, and the listing feed.
+
+With one web process, socketio delivers room messages itself. To run
+several processes (gunicorn workers or dynos), every process must see
+every emit: set SOCKETIO_MESSAGE_QUEUE (default: REDIS_URL) and they
+relay emits to each other through it. Any URL Flask-SocketIO understands
+works (redis://, rediss://, amqp://, zmq+tcp://); the Redis and AMQP
+ones need the redis or kombu package.
+
+"local://" selects LocalBrokerManager: a broker inside this process, so
+several Socket.IO servers in one process (as in the tests) behave like
+separate nodes sharing a queue.
+
+Clients still need sticky sessions (see README): a long-polling client
+must keep talking to the process that holds its session.
+
+Browse pages join FEED_ROOM and get every listing change through
+publish_feed(), from views and background jobs alike.
+"""
+
+import os
+import queue
+from threading import Lock
+
+from socketio import PubSubManager
+
+from website.extensions import socketio
+
+CHANNEL = "marketplace-socketio"
+
+
+class LocalBroker:
+    """In-process publish/subscribe: every subscriber gets every message."""
+
+    def __init__(self):
+        self._subscribers = {}   # channel -> [queue.Queue]
+        self._lock = Lock()
+
+    def subscribe(self, channel):
+        """Returns a queue that receives everything published to channel from now on."""
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def publish(self, channel, message):
+        """Delivers message to every subscriber of channel."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for inbox in subscribers:
+            inbox.put(message)
+
+
+LOCAL_BROKER = LocalBroker()
+
+
+class LocalBrokerManager(PubSubManager):
+    """A Socket.IO client manager relaying emits through a LocalBroker."""
+
+    name = "local"
+
+    def __init__(self, broker=LOCAL_BROKER, channel=CHANNEL, write_only=False, logger=None):
+        self.broker = broker
+        self._inbox = None
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def initialize(self):
+        # Subscribe before the listener task first runs, or emits made
+        # in the meantime would be lost
+        if not self.write_only:
+            self._inbox = self.broker.subscribe(self.channel)
+        super().initialize()
+
+    def _publish(self, data):
+        self.broker.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def message_queue_url():
+    """The configured message queue URL, or None for a single process."""
+    return os.environ.get("SOCKETIO_MESSAGE_QUEUE") or os.environ.get("REDIS_URL") or None
+
+
+def socketio_options(url=None):
+    """Keyword arguments for socketio.init_app() that connect it to the queue at url."""
+    url = url or message_queue_url()
+    if url is None:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalBrokerManager()}
+    return {"message_queue": url, "channel": CHANNEL}
+
+
+# Socket.IO feed: open browse pages get listing changes as they happen
+FEED_ROOM = "feed"
+
+
+def publish_feed(event, data):
+    """
+    Sends a listing change to every browse page in the feed room:
+    "item_created" (the whole item), "item_updated" (its id and the fields
+    that changed) or "item_deleted" (its id).
+    """
+    socketio.emit(event, data, to=FEED_ROOM)
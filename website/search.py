@@ -0,0 +1,169 @@
+"""
+search.py - Full-text search over item listings.
+
+Postgres keeps a tsvector column on item, filled by a trigger, with a GIN index.
+The SQLite fallback keeps an FTS5 table (item_fts) that triggers update
+whenever an item is inserted, edited or deleted. Both match every search
+word as a prefix so the browse search bar works as a typeahead.
+"""
+
+import re
+
+from sqlalchemy import column, event, func, literal_column, or_, table
+
+from .models import Item
+
+# Only word characters reach the index, so user input can't inject query syntax
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 8
+
+# FTS5 "external content" table: the text itself stays in item, the index
+# only stores postings. prefix='2 3 4' keeps short prefix lookups indexed.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS item_fts USING fts5(
+        name, description, condition,
+        content='item', content_rowid='id', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_insert AFTER INSERT ON item BEGIN
+        INSERT INTO item_fts(rowid, name, description, condition)
+        VALUES (new.id, new.name, new.description, new.condition);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_delete AFTER DELETE ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description, condition)
+        VALUES ('delete', old.id, old.name, old.description, old.condition);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_fts_update
+    AFTER UPDATE OF name, description, condition ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description, condition)
+        VALUES ('delete', old.id, old.name, old.description, old.condition);
+        INSERT INTO item_fts(rowid, name, description, condition)
+        VALUES (new.id, new.name, new.description, new.condition);
+    END
+    """,
+]
+
+# A trigger fills the vector on every insert and every edit of the text
+# columns. (A GENERATED ... STORED column would rewrite the whole table
+# when added to an existing one.) Names weigh more than condition,
+# condition more than description.
+POSTGRES_DDL = [
+    "ALTER TABLE item ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION item_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.condition, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS item_search_vector_update ON item",
+    """
+    CREATE TRIGGER item_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, condition ON item
+    FOR EACH ROW EXECUTE FUNCTION item_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_item_search_vector ON item USING GIN (search_vector)",
+    # Name-only index for the typeahead suggestions
+    """
+    CREATE INDEX IF NOT EXISTS ix_item_name_search ON item
+    USING GIN (to_tsvector('simple', coalesce(name, '')))
+    """,
+]
+
+item_fts = table("item_fts", column("rowid"))
+
+
+def ensure_search_index(connection):
+    """
+    Creates the search index for this database if it is missing.
+    A freshly created SQLite index is backfilled from the existing items.
+    """
+    dialect = connection.dialect.name
+
+    if dialect == "sqlite":
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'item_fts'"
+        ).first()
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql("INSERT INTO item_fts(item_fts) VALUES ('rebuild')")
+
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Item.__table__, "after_create")
+def _create_search_index(target, connection, **kw):  # pylint: disable=unused-argument
+    """Builds the search index whenever the item table itself is created."""
+    ensure_search_index(connection)
+
+
+@event.listens_for(Item.__table__, "before_drop")
+def _drop_search_index(target, connection, **kw):  # pylint: disable=unused-argument
+    """The FTS5 table outlives item unless we drop it too, leaving stale rows."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS item_fts")
+
+
+def search_terms(q):
+    """Splits a search string into the lowercase words we look up."""
+    return TOKEN_RE.findall((q or "").lower())[:MAX_TERMS]
+
+
+def apply_search(query, q, name_only=False):
+    """
+    Narrows an Item query to listings matching every word of q as a prefix.
+    name_only restricts the match to item names (used by the typeahead).
+
+    Returns (query, rank_order): rank_order sorts the best matches first,
+    or is None when the database has no full-text support and we fell
+    back to substring matching.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query, None
+
+    dialect = query.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        if name_only:
+            match = f"name : ({match})"
+        query = query.join(item_fts, item_fts.c.rowid == Item.id).filter(
+            literal_column("item_fts").op("MATCH")(match)
+        )
+        # bm25 is lower-is-better; weights follow the column order name, description, condition
+        return query, func.bm25(literal_column("item_fts"), 10.0, 1.0, 2.0).asc()
+
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("item.search_vector")
+        if name_only:
+            vector = func.to_tsvector("simple", func.coalesce(Item.name, ""))
+        query = query.filter(vector.op("@@")(tsquery))
+        return query, func.ts_rank(vector, tsquery).desc()
+
+    # Anything else: the old substring scan
+    for term in terms:
+        like = f"%{term}%"
+        if name_only:
+            query = query.filter(Item.name.ilike(like))
+        else:
+            query = query.filter(or_(
+                Item.name.ilike(like),
+                Item.description.ilike(like),
+                Item.condition.ilike(like)
+            ))
+    return query, None
@@ -6,6 +6,37 @@
 let allItems = [];
 let currentFilter = "all"; // "all", "bookmarks", or "selling-items"
 let currentUserId = null;
+let currentQuery = ""; // search text the loaded pages belong to
+let nextCursor = null; // cursor for the next page of /api/items (null = no more)
+let loadingMore = false;
+let itemsController = null; // aborts an in-flight /api/items search
+let itemsStale = false; // the feed announced an item the loaded order can't place
+let suggestController = null; // aborts an in-flight /api/items/suggest
+
+const SEARCH_DEBOUNCE_MS = 300;
+const SUGGEST_DEBOUNCE_MS = 120;
+
+// Uploaded photos are processed in the background (status "pending")
+const PHOTO_POLL_MS = 2000;
+const PHOTO_POLL_LIMIT = 30;
+
+// ==============================
+// Helper: fingerprinted URL of a static file (the page sets ASSET_URLS)
+// ==============================
+function assetUrl(path) {
+  return (window.ASSET_URLS && window.ASSET_URLS[path]) || `/static/${path}`;
+}
+
+// Icon of each payment method the API can return (models.PAYMENT_METHODS)
+const PAYMENT_ICONS = {
+  Cash: "assets/cash.svg",
+  Venmo: "assets/venmo.svg",
+  Zelle: "assets/zelle.svg",
+};
+
+function paymentIconUrl(method) {
+  return PAYMENT_ICONS[method] ? assetUrl(PAYMENT_ICONS[method]) : null;
+}
 
 // ==============================
 // Helper: detect page
@@ -18,6 +49,18 @@ function getPageType() {
 // ==============================
 // REST helpers
 // ==============================
+
+// Delay calling fn until the user has stopped triggering it for `ms`
+function debounce(fn, ms) {
+  let timer = null;
+  return (...args) => {
+    clearTimeout(timer);
+    timer = setTimeout(() => fn(...args), ms);
+  };
+}
+
+// GET /api responses carry ETags: the browser cache revalidates them for us,
+// so refetching an unchanged item or profile costs an empty 304.
 async function fetchJSON(url, options = {}) {
   const resp = await fetch(url, options);
   if (!resp.ok) {
@@ -27,6 +70,24 @@ async function fetchJSON(url, options = {}) {
   return resp.json();
 }
 
+// Re-fetch url until read(data) reports the photo is no longer pending,
+// then pass the new photo URL to onReady. read returns { status, src }.
+function pollPendingPhoto(url, read, onReady, attempt = 0) {
+  if (attempt >= PHOTO_POLL_LIMIT) return;
+  setTimeout(async () => {
+    try {
+      const { status, src } = read(await fetchJSON(url));
+      if (status === "pending") {
+        pollPendingPhoto(url, read, onReady, attempt + 1);
+      } else if (!status) {
+        onReady(src);
+      }
+    } catch (err) {
+      console.error("Error checking photo status:", err);
+    }
+  }, PHOTO_POLL_MS);
+}
+
 // ==============================
 // Browse page – index.html (load current user from backend)
 // ==============================
@@ -44,10 +105,33 @@ async function loadCurrentUser() {
 // ==============================
 // Browse page – index.html (load items from backend)
 // ==============================
+// Server-side filters behind the filter menu's choices
+const FILTER_PARAMS = { bookmarks: "bookmarked", "selling-items": "mine" };
+// Sort and facet filters of /api/items, passed on from the page's own URL
+const LISTING_PARAMS = ["sort", "min_price", "max_price", "condition", "payment", "days"];
+const listingParams = new URLSearchParams(
+  [...new URLSearchParams(window.location.search)].filter(([key]) => LISTING_PARAMS.includes(key))
+);
+
+function itemsUrl(query, after) {
+  const params = new URLSearchParams(listingParams);
+  if (query) params.set("q", query);
+  if (FILTER_PARAMS[currentFilter]) params.set(FILTER_PARAMS[currentFilter], "1");
+  if (after) params.set("after", after);
+  const qs = params.toString();
+  return qs ? `/api/items?${qs}` : "/api/items";
+}
+
 async function loadItems(query = "") {
+  // Cancel the previous search so a slow, older response can't win the race
+  if (itemsController) itemsController.abort();
+  const controller = new AbortController();
+  itemsController = controller;
+
   try {
-    const params = query ? `?q=${encodeURIComponent(query)}` : "";
-    const res = await fetch(`/api/items${params}`);
+    currentQuery = query;
+    itemsStale = false;
+    const res = await fetch(itemsUrl(query), { signal: controller.signal });
 
     if (!res.ok) {
       console.error("Failed to load items", await res.text());
@@ -55,141 +139,446 @@ async function loadItems(query = "") {
     }
 
     const data = await res.json();
+    if (query !== currentQuery) return; // a newer search already started
 
     allItems = data.items || [];
+    nextCursor = data.next_cursor || null;
     applyFilterAndRender();
   } catch (err) {
+    if (err.name === "AbortError") return;
     console.error("Error loading items:", err);
+  } finally {
+    if (itemsController === controller) itemsController = null;
   }
 }
 
-// Apply currentFilter, then render
-function applyFilterAndRender() {
-  let itemsToShow = allItems;
+// ==============================
+// Browse page – search typeahead suggestions
+// ==============================
+function hideSuggestions() {
+  const list = document.getElementById("search-suggestions");
+  if (!list) return;
+  list.innerHTML = "";
+  list.hidden = true;
+}
+
+function renderSuggestions(suggestions) {
+  const list = document.getElementById("search-suggestions");
+  if (!list) return;
 
-  if (currentFilter === "bookmarks") {
-    itemsToShow = allItems.filter((item) => item.bookmarked);
-  } else if (currentFilter === "selling-items") {
-    itemsToShow = allItems.filter((item) => item.seller_id === currentUserId);
+  list.innerHTML = "";
+  if (!suggestions.length) {
+    list.hidden = true;
+    return;
   }
 
-  renderItemGrid(itemsToShow);
-}
+  suggestions.forEach((suggestion) => {
+    const li = document.createElement("li");
+    li.setAttribute("role", "option");
 
-function renderItemGrid(items) {
-  const grid = document.querySelector(".grid");
-  if (!grid) return;
+    const a = document.createElement("a");
+    a.href = `/item/${suggestion.id}`;
 
-  grid.innerHTML = ""; // clear old cards
+    const img = document.createElement("img");
+    img.src = suggestion.thumbnail || assetUrl("assets/item_placeholder.svg");
+    img.alt = "";
+    img.loading = "lazy";
 
-  if (!items.length) {
-    const p = document.createElement("p");
-    p.className = "empty-msg";
-    p.textContent = "No items yet – be the first to list something!";
-    grid.appendChild(p);
+    const span = document.createElement("span");
+    span.textContent = suggestion.name;
+
+    a.appendChild(img);
+    a.appendChild(span);
+    li.appendChild(a);
+    list.appendChild(li);
+  });
+  list.hidden = false;
+}
+
+async function loadSuggestions(query) {
+  if (suggestController) suggestController.abort();
+  if (!query) {
+    hideSuggestions();
     return;
   }
 
-  items.forEach((item) => {
-    const a = document.createElement("a");
-    a.className = "card";
-    a.href = `/item/${item.id}`;
-
-    const imgThumb = document.createElement("img");
-    imgThumb.className = "item-card__thumb";
-    imgThumb.src = item.item_photos || "/static/assets/item_placeholder.svg";
-    imgThumb.alt = item.name || "Item";
-
-    const bookmark = document.createElement("img");
-    bookmark.className = "item-card__bookmark";
-    bookmark.dataset.itemId = item.id;
-    bookmark.dataset.bookmarked = item.bookmarked ? "true" : "false";
-    if (item.bookmarked) {
-      bookmark.src = "/static/assets/bookmark-filled.svg";
-      bookmark.dataset.altSrc = "/static/assets/bookmark.svg";
-    } else {
-      bookmark.src = "/static/assets/bookmark.svg";
-      bookmark.dataset.altSrc = "/static/assets/bookmark-filled.svg";
+  const controller = new AbortController();
+  suggestController = controller;
+
+  try {
+    const data = await fetchJSON(
+      `/api/items/suggest?q=${encodeURIComponent(query)}`,
+      { signal: controller.signal }
+    );
+    renderSuggestions(data.suggestions || []);
+  } catch (err) {
+    if (err.name !== "AbortError") {
+      console.error("Error loading suggestions:", err);
+    }
+  } finally {
+    if (suggestController === controller) suggestController = null;
+  }
+}
+
+// Fetch the next page (if any) and append it to allItems
+async function loadMoreItems() {
+  if (!nextCursor || loadingMore) return;
+  loadingMore = true;
+  const query = currentQuery;
+  const filter = currentFilter;
+
+  try {
+    const data = await fetchJSON(itemsUrl(query, nextCursor));
+    // search or filter changed while we were loading
+    if (query !== currentQuery || filter !== currentFilter) return;
+
+    allItems = allItems.concat(data.items || []);
+    nextCursor = data.next_cursor || null;
+    applyFilterAndRender();
+  } catch (err) {
+    console.error("Error loading more items:", err);
+  } finally {
+    loadingMore = false;
+  }
+}
+
+// Load the next page whenever the sentinel under the grid scrolls into view
+function bindInfiniteScroll() {
+  const sentinel = document.getElementById("grid-sentinel");
+  if (!sentinel || !("IntersectionObserver" in window)) return;
+
+  const observer = new IntersectionObserver((entries) => {
+    if (entries.some((entry) => entry.isIntersecting)) {
+      loadMoreItems();
     }
-    bookmark.alt = "Bookmark";
+  }, { rootMargin: "400px" });
+  observer.observe(sentinel);
+}
+
+// Whether item still belongs in the loaded grid under currentFilter. The
+// server applies the filter to every page; this keeps local changes
+// (unbookmarking, feed deltas) in line with it until the next load.
+function passesFilter(item) {
+  if (currentFilter === "selling-items") return item.seller_id === currentUserId;
+  if (item.live_on_market === false) return false;
+  if (currentFilter === "bookmarks") return item.bookmarked;
+  return true;
+}
+
+// Apply currentFilter, then render
+function applyFilterAndRender() {
+  renderItemGrid(allItems.filter(passesFilter));
+}
+
+// Card widths at each grid breakpoint (see .grid in styles.css)
+const CARD_IMAGE_SIZES =
+  "(max-width: 480px) 100vw, (max-width: 720px) 50vw, (max-width: 1024px) 33vw, 25vw";
+
+// Card thumbnail: a <picture> that lets the browser pick the smallest
+// WebP (or JPEG) thumbnail that fills the card, else the photo itself.
+function buildItemThumb(item) {
+  const img = document.createElement("img");
+  img.className = "item-card__thumb";
+  img.src = item.item_photos || assetUrl("assets/item_placeholder.svg");
+  img.alt = item.name || "Item";
+  // Only cards near the viewport exist at all, and of those the browser
+  // fetches photos as they come into view
+  img.loading = "lazy";
+  img.decoding = "async";
+
+  const srcset = item.photo_srcset;
+  if (!srcset) return img;
+
+  const picture = document.createElement("picture");
+  if (srcset.webp) {
+    const source = document.createElement("source");
+    source.type = "image/webp";
+    source.srcset = srcset.webp;
+    source.sizes = CARD_IMAGE_SIZES;
+    picture.appendChild(source);
+  }
+  if (srcset.jpeg) {
+    img.srcset = srcset.jpeg;
+    img.sizes = CARD_IMAGE_SIZES;
+  }
+  picture.appendChild(img);
+  return picture;
+}
+
+// One grid card, built from scratch (see cardElement for the cached one)
+function buildItemCard(item) {
+  const a = document.createElement("a");
+  a.className = "card";
+  a.href = `/item/${item.id}`;
+
+  const imgThumb = buildItemThumb(item);
+
+  const bookmark = document.createElement("img");
+  bookmark.className = "item-card__bookmark";
+  bookmark.dataset.itemId = item.id;
+  setBookmarkIcon(bookmark, item.bookmarked);
+  bookmark.alt = "Bookmark";
+
+  const body = document.createElement("div");
+  body.className = "item-card__body";
 
-    const body = document.createElement("div");
-    body.className = "item-card__body";
+  const top = document.createElement("div");
+  top.className = "item-card__top";
 
-    const top = document.createElement("div");
-    top.className = "item-card__top";
+  const title = document.createElement("div");
+  title.className = "item-card__title";
+  title.textContent = item.name || "";
 
-    const title = document.createElement("div");
-    title.className = "item-card__title";
-    title.textContent = item.name || "";
+  const price = document.createElement("div");
+  price.className = "item-card__price";
+  const p = Number(item.price || 0).toFixed(2);
+  price.textContent = `$${p}`;
 
-    const price = document.createElement("div");
-    price.className = "item-card__price";
-    const p = Number(item.price || 0).toFixed(2);
-    price.textContent = `$${p}`;
+  top.appendChild(title);
+  top.appendChild(price);
 
-    top.appendChild(title);
-    top.appendChild(price);
+  const bottom = document.createElement("div");
+  bottom.className = "item-card__bottom";
+
+  const seller = document.createElement("div");
+  seller.className = "item-card__seller";
+  if (item.seller) {
+    seller.textContent = item.seller.first_name || "Seller";
+  } else {
+    seller.textContent = "Unknown Seller";
+  }
+
+  const paymentIcons = document.createElement("div");
+  paymentIcons.className = "item-card__payment-icons";
+
+  (item.payment_options || []).forEach((method) => {
+    const iconSrc = paymentIconUrl(method);
+
+    if (iconSrc) {
+      const icon = document.createElement("img");
+      icon.className = "icon";
+      icon.src = iconSrc;
+      icon.alt = method;
+      paymentIcons.appendChild(icon);
+    }
+  });
 
-    const bottom = document.createElement("div");
-    bottom.className = "item-card__bottom";
+  bottom.appendChild(seller);
+  bottom.appendChild(paymentIcons);
 
-    const seller = document.createElement("div");
-    seller.className = "item-card__seller";
-    if (item.seller) {
-      seller.textContent = item.seller.first_name || "Seller";
+  body.appendChild(top);
+  body.appendChild(bottom);
+
+  a.appendChild(imgThumb);
+  a.appendChild(bookmark);
+  a.appendChild(body);
+  return a;
+}
+
+// ==============================
+// Browse page – virtualized grid. Cards are all the same height, so only
+// the rows near the viewport are in the DOM; padding above and below the
+// grid stands in for the rest. Card nodes are cached by item id and reused
+// until the fields they show change.
+// ==============================
+const GRID_OVERSCAN_ROWS = 3; // rendered above and below the viewport
+const CARD_CACHE_LIMIT = 400; // cached card nodes kept for reuse
+
+const gridState = { el: null, items: [], columns: 1, gap: 0, stride: 0, scheduled: false };
+const cardCache = new Map(); // item id -> { key, el }, least recently used first
+
+// The fields a card shows (bookmark state is patched separately)
+function cardKey(item) {
+  return JSON.stringify([
+    item.name, item.price, item.item_photos, item.photo_srcset,
+    item.seller ? item.seller.first_name : null, item.payment_options,
+  ]);
+}
+
+function cardElement(item) {
+  const key = cardKey(item);
+  let entry = cardCache.get(item.id);
+  if (!entry || entry.key !== key) {
+    entry = { key, el: buildItemCard(item) };
+  }
+  cardCache.delete(item.id);
+  cardCache.set(item.id, entry);
+  setBookmarkIcon(entry.el.querySelector(".item-card__bookmark"), item.bookmarked);
+  return entry.el;
+}
+
+// Makes parent's children exactly nodes, moving only what is out of place
+function reconcileChildren(parent, nodes) {
+  const keep = new Set(nodes);
+  Array.from(parent.children).forEach((child) => {
+    if (!keep.has(child)) child.remove();
+  });
+  let cursor = parent.firstElementChild;
+  nodes.forEach((node) => {
+    if (node === cursor) {
+      cursor = cursor.nextElementSibling;
     } else {
-      seller.textContent = "Unknown Seller";
+      parent.insertBefore(node, cursor);
     }
+  });
+}
 
-    const paymentIcons = document.createElement("div");
-    paymentIcons.className = "item-card__payment-icons";
-
-    (item.payment_options || []).forEach((method) => {
-      let iconSrc = null;
-      if (method.includes("Venmo")) iconSrc = "/static/assets/venmo.svg";
-      else if (method.includes("Zelle")) iconSrc = "/static/assets/zelle.svg";
-      else if (method.includes("Cash")) iconSrc = "/static/assets/cash.svg";
-
-      if (iconSrc) {
-        const icon = document.createElement("img");
-        icon.className = "icon";
-        icon.src = iconSrc;
-        icon.alt = method;
-        paymentIcons.appendChild(icon);
-      }
-    });
+function measureGrid() {
+  const style = getComputedStyle(gridState.el);
+  gridState.columns = style.gridTemplateColumns.split(" ").filter(Boolean).length || 1;
+  gridState.gap = parseFloat(style.rowGap) || 0;
+  gridState.stride = 0; // row height, measured from the next rendered card
+}
 
-    bottom.appendChild(seller);
-    bottom.appendChild(paymentIcons);
+function renderVisibleCards() {
+  const { el: grid, items, columns } = gridState;
+  if (!grid || !items.length) return;
+
+  const rows = Math.ceil(items.length / columns);
+  const stride = gridState.stride;
+  let firstRow = 0;
+  let lastRow = Math.min(rows - 1, GRID_OVERSCAN_ROWS);
+  if (stride) {
+    const top = grid.getBoundingClientRect().top;
+    lastRow = Math.min(rows - 1, Math.floor((window.innerHeight - top) / stride) + GRID_OVERSCAN_ROWS);
+    lastRow = Math.max(lastRow, 0);
+    firstRow = Math.min(Math.max(0, Math.floor(-top / stride) - GRID_OVERSCAN_ROWS), lastRow);
+  }
 
-    body.appendChild(top);
-    body.appendChild(bottom);
+  const nodes = items.slice(firstRow * columns, (lastRow + 1) * columns).map(cardElement);
+  reconcileChildren(grid, nodes);
+  for (const id of cardCache.keys()) {
+    if (cardCache.size <= CARD_CACHE_LIMIT) break;
+    cardCache.delete(id);
+  }
 
-    a.appendChild(imgThumb);
-    a.appendChild(bookmark);
-    a.appendChild(body);
+  if (!stride) {
+    gridState.stride = nodes[0].offsetHeight + gridState.gap;
+    if (gridState.stride) renderVisibleCards(); // now we know which rows are visible
+    return;
+  }
+  grid.style.paddingTop = `${firstRow * stride}px`;
+  grid.style.paddingBottom = `${(rows - 1 - lastRow) * stride}px`;
+}
 
-    grid.appendChild(a);
+function scheduleGridRender() {
+  if (gridState.scheduled) return;
+  gridState.scheduled = true;
+  requestAnimationFrame(() => {
+    gridState.scheduled = false;
+    renderVisibleCards();
   });
+}
 
-  // Rebind bookmark toggle handlers
-  bindBookmarkIcons();
+function bindVirtualGrid() {
+  window.addEventListener("scroll", scheduleGridRender, { passive: true });
+  window.addEventListener("resize", () => {
+    if (!gridState.el) return;
+    measureGrid(); // the breakpoints change the column count
+    scheduleGridRender();
+  });
+}
+
+function renderItemGrid(items) {
+  const grid = document.querySelector(".grid");
+  if (!grid) return;
+  gridState.el = grid;
+  gridState.items = items;
+
+  if (!items.length) {
+    grid.style.paddingTop = "";
+    grid.style.paddingBottom = "";
+    const p = document.createElement("p");
+    p.className = "empty-msg";
+    p.textContent = "No items yet – be the first to list something!";
+    grid.replaceChildren(p);
+    return;
+  }
+
+  measureGrid();
+  renderVisibleCards();
 }
 
 // NEW: wires up search + initial fetch
 function initBrowsePage() {
   const searchInput = document.querySelector(".search input");
   if (searchInput) {
+    // Cheap suggestions while typing, the full grid once typing pauses
+    const suggestSoon = debounce(loadSuggestions, SUGGEST_DEBOUNCE_MS);
+    const searchSoon = debounce(loadItems, SEARCH_DEBOUNCE_MS);
+
     searchInput.addEventListener("input", () => {
       const query = searchInput.value.trim();
-      loadItems(query);
+      suggestSoon(query);
+      searchSoon(query);
+    });
+    searchInput.addEventListener("keydown", (e) => {
+      if (e.key === "Escape") hideSuggestions();
+    });
+    document.addEventListener("click", (e) => {
+      if (!e.target.closest(".search")) hideSuggestions();
     });
   }
 
   // Initial load
   loadCurrentUser();
   loadItems();
+  bindVirtualGrid();
+  bindBookmarkClicks(document.querySelector(".grid"));
+  bindInfiniteScroll();
+  subscribeToFeed();
+}
+
+// ==============================
+// Browse page – live listing changes from the Socket.IO "feed" room.
+// Deltas patch allItems and the affected card instead of reloading the grid.
+// ==============================
+function subscribeToFeed() {
+  if (typeof io === "undefined") return;
+  const feedSocket = io();
+  // (Re)join on every connect, so a reconnect doesn't leave the page deaf
+  feedSocket.on("connect", () => feedSocket.emit("join_feed"));
+  feedSocket.on("item_created", onItemCreated);
+  feedSocket.on("item_updated", onItemUpdated);
+  feedSocket.on("item_deleted", onItemDeleted);
+  // A list that missed new items reloads when the user comes back to it
+  document.addEventListener("visibilitychange", () => {
+    if (itemsStale && document.visibilityState === "visible") loadItems(currentQuery);
+  });
+}
+
+// Whether new items go first in the loaded list: newest first, with no
+// search or facet filter the new item might not match
+function showsNewestFirst() {
+  if (currentQuery) return false;
+  return [...listingParams].every(([key, value]) => key === "sort" && value === "newest");
+}
+
+// The grid re-renders only its visible cards, and reuses every one whose
+// fields didn't change, so a delta costs at most one new card
+function onItemCreated(data) {
+  if (allItems.some((i) => i.id === data.id)) return;
+  // Searches, other sorts and facets are the server's to order and match
+  if (!showsNewestFirst()) {
+    itemsStale = true;
+    return;
+  }
+  const item = { ...data, bookmarked: false, is_owner: data.seller_id === currentUserId };
+  allItems.unshift(item); // the feed is newest first
+  applyFilterAndRender();
+}
+
+function onItemUpdated(changes) {
+  const item = allItems.find((i) => i.id === changes.id);
+  if (!item) return;
+  Object.assign(item, changes);
+  applyFilterAndRender();
+}
+
+function onItemDeleted(data) {
+  allItems = allItems.filter((i) => i.id !== data.id);
+  cardCache.delete(data.id);
+  applyFilterAndRender();
 }
 
 // ==============================
@@ -218,17 +607,28 @@ async function initItemPage() {
       priceEl.textContent = `$${Number(item.price || 0).toFixed(2)}`;
     }
     if (imgEl) {
-      const src = item.item_photos || "/static/assets/item_placeholder.svg";
-      const alt = item.name || "Item image";
+      const showPhoto = (photo) => {
+        const src = photo || assetUrl("assets/item_placeholder.svg");
 
-      // Update the foreground image
-      imgEl.src = src;
-      imgEl.alt = alt;
+        // Update the foreground image
+        imgEl.src = src;
 
-      // Get the existing wrapper from the DOM
-      const wrapper = imgEl.closest(".item-image-wrapper");
-      if (wrapper) {
-        wrapper.style.setProperty("--bg-image", `url("${src}")`);
+        // Get the existing wrapper from the DOM
+        const wrapper = imgEl.closest(".item-image-wrapper");
+        if (wrapper) {
+          wrapper.style.setProperty("--bg-image", `url("${src}")`);
+        }
+      };
+      imgEl.alt = item.name || "Item image";
+      showPhoto(item.item_photos);
+
+      // A just-uploaded photo is still processing: swap it in once ready
+      if (item.photo_status === "pending") {
+        pollPendingPhoto(
+          `/api/items/${id}`,
+          (d) => ({ status: d.item.photo_status, src: d.item.item_photos }),
+          showPhoto
+        );
       }
     }
     if (conditionEl) conditionEl.textContent = item.condition || "—";
@@ -247,10 +647,7 @@ async function initItemPage() {
         const div = document.createElement("div");
         div.className = "payment-option";
 
-        let iconSrc = null;
-        if (option === "Cash") iconSrc = "/static/assets/cash.svg";
-        if (option === "Venmo") iconSrc = "/static/assets/venmo.svg";
-        if (option === "Zelle") iconSrc = "/static/assets/zelle.svg";
+        const iconSrc = paymentIconUrl(option);
 
         if (iconSrc) {
           const img = document.createElement("img");
@@ -397,7 +794,7 @@ async function initEditItemPage() {
     const imgPreview = document.getElementById("edit-image-preview");
     if (imgPreview) {
       imgPreview.src =
-        item.item_photos || "/static/assets/item_placeholder.svg";
+        item.item_photos || assetUrl("assets/item_placeholder.svg");
     }
   } catch (err) {
     console.error("Failed to load item for editing:", err);
@@ -518,7 +915,14 @@ async function loadProfileData() {
         "Hello Mules!";
     }
     if (avatarEl) {
-      avatarEl.src = user.profile_image || "/static/assets/avatar.svg";
+      avatarEl.src = user.profile_image || assetUrl("assets/avatar.svg");
+      if (isOwnProfile && user.profile_image_status === "pending") {
+        pollPendingPhoto(
+          "/api/profile/me",
+          (d) => ({ status: d.user.profile_image_status, src: d.user.profile_image }),
+          (src) => { avatarEl.src = src || assetUrl("assets/avatar.svg"); }
+        );
+      }
     }
 
     // Hide "Edit profile" link when viewing someone else's profile
@@ -548,7 +952,7 @@ async function loadProfileData() {
     }
     if (editAvatarPreview) {
       editAvatarPreview.src =
-        user.profile_image || "/static/assets/avatar.svg";
+        user.profile_image || assetUrl("assets/avatar.svg");
     }
 
     // Load seller listings if there's a listings grid
@@ -569,8 +973,16 @@ async function loadProfileListings(sellerId) {
   grid.innerHTML = "";
 
   try {
-    const data = await fetchJSON(`/api/items?seller_id=${sellerId}`);
-    const items = data.items || [];
+    // A seller's own listings are few, so just follow the pages through
+    let items = [];
+    let after = null;
+    do {
+      const params = new URLSearchParams({ seller_id: sellerId });
+      if (after) params.set("after", after);
+      const data = await fetchJSON(`/api/items?${params}`);
+      items = items.concat(data.items || []);
+      after = data.next_cursor;
+    } while (after);
 
     if (!items.length) {
       if (emptyState) emptyState.style.display = "block";
@@ -584,11 +996,7 @@ async function loadProfileListings(sellerId) {
       a.className = "card";
       a.href = `/item/${item.id}`;
 
-      const imgThumb = document.createElement("img");
-      imgThumb.className = "item-card__thumb";
-      imgThumb.src =
-        item.item_photos || "/static/assets/item_placeholder.svg";
-      imgThumb.alt = item.name || "Item";
+      const imgThumb = buildItemThumb(item);
 
       const body = document.createElement("div");
       body.className = "item-card__body";
@@ -623,10 +1031,7 @@ async function loadProfileListings(sellerId) {
       paymentIcons.className = "item-card__payment-icons";
 
       (item.payment_options || []).forEach((method) => {
-        let iconSrc = null;
-        if (method.includes("Venmo")) iconSrc = "/static/assets/venmo.svg";
-        else if (method.includes("Zelle")) iconSrc = "/static/assets/zelle.svg";
-        else if (method.includes("Cash")) iconSrc = "/static/assets/cash.svg";
+        const iconSrc = paymentIconUrl(method);
 
         if (iconSrc) {
           const icon = document.createElement("img");
@@ -819,7 +1224,8 @@ if (categoryMenu && categoryFilterBtn) {
         categoryFilterBtn.textContent = "All Items ▾";
       }
 
-      applyFilterAndRender();
+      // Only the matching items are fetched, not the whole market
+      loadItems(currentQuery);
     });
   });
 }
@@ -827,65 +1233,101 @@ if (categoryMenu && categoryFilterBtn) {
 // ==============================
 // Handles bookmark icon switch with REST
 // ==============================
-function bindBookmarkIcons() {
-  document.querySelectorAll(".item-card__bookmark").forEach((icon) => {
-    icon.addEventListener("click", (e) => {
-      e.preventDefault();
-      e.stopPropagation();
-
-      const current = icon.getAttribute("src");
-      const alt = icon.dataset.altSrc;
-      icon.setAttribute("src", alt);
-      icon.dataset.altSrc = current;
-
-      const wasBookmarked = icon.dataset.bookmarked === "true";
-      const isNowBookmarked = !wasBookmarked;
-      icon.dataset.bookmarked = isNowBookmarked ? "true" : "false";
-
-      const itemId = icon.dataset.itemId;
-      const itemIdNum = Number(itemId);
-      const itemObj = allItems.find((i) => i.id === itemIdNum);
-
-      if (itemObj) {
-        itemObj.bookmarked = isNowBookmarked;
-      }
+function setBookmarkIcon(icon, bookmarked) {
+  const state = bookmarked ? "true" : "false";
+  if (icon.dataset.bookmarked === state) return;
+  icon.dataset.bookmarked = state;
+  icon.src = assetUrl(bookmarked ? "assets/bookmark-filled.svg" : "assets/bookmark.svg");
+}
 
-      if (currentFilter === "bookmarks" && !isNowBookmarked) {
-        applyFilterAndRender();
-        return;
-      }
+// One click handler on the grid serves every card, present and future
+function bindBookmarkClicks(grid) {
+  if (!grid) return;
+  grid.addEventListener("click", (e) => {
+    const icon = e.target.closest(".item-card__bookmark");
+    if (!icon) return;
+    e.preventDefault();
+    e.stopPropagation();
 
-      updateBookmarkOnServer(itemId, isNowBookmarked);
-    });
+    const itemIdNum = Number(icon.dataset.itemId);
+    const isNowBookmarked = icon.dataset.bookmarked !== "true";
+    setBookmarkIcon(icon, isNowBookmarked);
+
+    const itemObj = allItems.find((i) => i.id === itemIdNum);
+    if (itemObj) {
+      itemObj.bookmarked = isNowBookmarked;
+    }
+
+    queueBookmarkUpdate(itemIdNum, isNowBookmarked);
+
+    if (currentFilter === "bookmarks" && !isNowBookmarked) {
+      applyFilterAndRender();
+    }
   });
 }
 
 // ==============================
-// Updates bookmark_items field in user table
+// Batched bookmark sync: clicks are queued and flushed together
 // ==============================
-async function updateBookmarkOnServer(itemId, isBookmarked) {
+const BOOKMARK_FLUSH_MS = 1000;
+const pendingBookmarks = new Map(); // itemId -> latest bookmarked state
+let bookmarkFlushTimer = null;
+
+// Remember the newest state per item; rapid toggles collapse into one operation
+function queueBookmarkUpdate(itemId, isBookmarked) {
+  pendingBookmarks.set(itemId, isBookmarked);
+  clearTimeout(bookmarkFlushTimer);
+  bookmarkFlushTimer = setTimeout(flushBookmarkUpdates, BOOKMARK_FLUSH_MS);
+}
+
+function takePendingBookmarks() {
+  clearTimeout(bookmarkFlushTimer);
+  const operations = Array.from(pendingBookmarks, ([item_id, bookmarked]) => ({
+    item_id,
+    bookmarked,
+  }));
+  pendingBookmarks.clear();
+  return operations;
+}
+
+async function flushBookmarkUpdates() {
+  const operations = takePendingBookmarks();
+  if (!operations.length) return;
+
   try {
-    const response = await fetch("/api/bookmark", {
+    const response = await fetch("/api/bookmarks/batch", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
         "X-Requested-With": "XMLHttpRequest",
       },
       credentials: "include",
-      body: JSON.stringify({
-        item_id: itemId,
-        bookmarked: isBookmarked,
-      }),
+      body: JSON.stringify({ operations }),
     });
 
     if (!response.ok) {
-      console.error("Failed to update bookmark", await response.text());
+      throw new Error(await response.text());
     }
   } catch (err) {
-    console.error("Error updating bookmark", err);
+    console.error("Error updating bookmarks", err);
+    // Put failed operations back unless the user has toggled them again since
+    operations.forEach(({ item_id, bookmarked }) => {
+      if (!pendingBookmarks.has(item_id)) pendingBookmarks.set(item_id, bookmarked);
+    });
+    bookmarkFlushTimer = setTimeout(flushBookmarkUpdates, BOOKMARK_FLUSH_MS * 5);
   }
 }
 
+// Leaving the page: hand whatever is queued to the browser to deliver
+window.addEventListener("pagehide", () => {
+  const operations = takePendingBookmarks();
+  if (!operations.length) return;
+  const body = new Blob([JSON.stringify({ operations })], {
+    type: "application/json",
+  });
+  navigator.sendBeacon("/api/bookmarks/batch", body);
+});
+
 // ==============================
 // Messaging 
 // ==============================
@@ -894,19 +1336,153 @@ let socketInitialized = false; // keeps track of the socket has been created
 let chatOpen = false; // keeps track if the chat popup is open
 let inRoom = false; // keeps track if the user is in the room
 
+// Seller only: every buyer's conversation (buyer id -> { chatId, name,
+// unread }), and the buyer whose conversation is open; replies go there
+let inbox = new Map();
+let openBuyer = null;
+
+// Chat history: loaded a page at a time, older pages as the user scrolls up
+let chatHistory = { chatId: null, nextBefore: null, loading: false };
+
+// History lines read like live ones: "First Last: text"
+function chatLine(message) {
+  const div = document.createElement("div");
+  div.classList.add("chat-message");
+  div.textContent = `${message.sender_name}: ${message.body}`;
+  return div;
+}
+
+async function loadChatHistory(older = false) {
+  const chatMessages = document.getElementById("chat-messages");
+  if (!chatMessages || chatHistory.chatId === null || chatHistory.loading) return;
+  if (older && chatHistory.nextBefore === null) return;
+
+  const { chatId } = chatHistory;
+  chatHistory.loading = true;
+  try {
+    const params = older ? `?before=${chatHistory.nextBefore}` : "";
+    const data = await fetchJSON(`/api/chats/${chatId}/messages${params}`);
+    if (chatId !== chatHistory.chatId) return; // the seller opened another conversation
+    chatHistory.nextBefore = data.next_before;
+
+    const lines = document.createDocumentFragment();
+    data.messages.forEach((m) => lines.appendChild(chatLine(m)));
+    if (older) {
+      // Keep the lines the user is looking at in place
+      const fromBottom = chatMessages.scrollHeight - chatMessages.scrollTop;
+      chatMessages.prepend(lines);
+      chatMessages.scrollTop = chatMessages.scrollHeight - fromBottom;
+    } else {
+      chatMessages.innerHTML = "";
+      chatMessages.appendChild(lines);
+      chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+  } catch (err) {
+    console.error("Error loading chat history:", err);
+  } finally {
+    if (chatId === chatHistory.chatId) chatHistory.loading = false;
+  }
+}
+
+function showChatHistory(chatId) {
+  chatHistory = { chatId, nextBefore: null, loading: false };
+  loadChatHistory();
+}
+
+// Seller's inbox: the conversation picker lists every buyer, marking the
+// ones with lines the seller hasn't opened yet
+function renderInbox() {
+  const picker = document.getElementById("chat-buyer");
+  if (!picker) return;
+  picker.hidden = inbox.size === 0;
+  picker.innerHTML = "";
+  inbox.forEach((conversation, buyerId) => {
+    const option = document.createElement("option");
+    option.value = String(buyerId);
+    option.textContent = conversation.unread ? `${conversation.name} (new)` : conversation.name;
+    option.selected = buyerId === openBuyer;
+    picker.appendChild(option);
+  });
+}
+
+async function refreshInbox(itemId) {
+  const data = await fetchJSON(`/api/items/${itemId}/chats`);
+  data.chats.forEach((chat) => {
+    if (!inbox.has(chat.buyer_id)) {
+      inbox.set(chat.buyer_id, { chatId: chat.id, name: chat.buyer_name, unread: true });
+    }
+  });
+  if (openBuyer === null && inbox.size) {
+    openConversation(inbox.keys().next().value);
+  } else {
+    renderInbox();
+  }
+}
+
+function openConversation(buyerId) {
+  const conversation = inbox.get(buyerId);
+  if (!conversation) return;
+  openBuyer = buyerId;
+  conversation.unread = false;
+  renderInbox();
+  showChatHistory(conversation.chatId);
+}
+
+async function onInboxMessage(data) {
+  if (!inbox.has(data.buyer_id)) {
+    // A buyer's first line: their chat exists now
+    await refreshInbox(itemIdFromPath());
+  }
+  if (data.buyer_id === openBuyer) {
+    appendChatMessage(data.text);
+  } else if (inbox.has(data.buyer_id)) {
+    inbox.get(data.buyer_id).unread = true;
+    renderInbox();
+  }
+}
+
+function appendChatMessage(text) {
+  const chatMessages = document.getElementById("chat-messages");
+  const div = document.createElement("div");
+  div.classList.add("chat-message");
+  div.textContent = text;
+  chatMessages.appendChild(div);
+
+  chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+// Who is chatting about which item, fetched once per page; the server
+// knows the sender from the session, so events only carry the item id
+let chatContext = null;
+
+function itemIdFromPath() {
+  const parts = window.location.pathname.split("/");
+  return Number(parts[parts.length - 1]);
+}
+
+async function getChatContext() {
+  if (!chatContext) {
+    const itemId = itemIdFromPath();
+    chatContext = Promise.all([
+      fetchJSON("/api/profile/me"),
+      fetchJSON(`/api/items/${itemId}`),
+    ]).then(([me, data]) => ({
+      itemId,
+      isSeller: data.item.seller_id === me.user.id,
+    }));
+    chatContext.catch(() => {
+      chatContext = null; // try again next time
+    });
+  }
+  return chatContext;
+}
+
 // Open chat box
 async function openForm() {
   const chat_form = document.getElementById("chatForm");
   chat_form.style.display = "block";
 
-  const parts = window.location.pathname.split("/");
-  const id = parts[parts.length - 1];
-
-  const data_user = await fetchJSON("/api/profile/me");
-  const user = data_user.user;
-
-  const data_item = await fetchJSON(`/api/items/${id}`);
-  const item = data_item.item;
+  const { itemId, isSeller } = await getChatContext();
 
   // Create socket if it hasn't
   if (!socket) {
@@ -914,14 +1490,17 @@ async function openForm() {
 
     // Bind message listener only if the socket has been created yet
     if (!socketInitialized) {
-      socket.on("message", function (data) {
-        const chatMessages = document.getElementById("chat-messages");
-        const div = document.createElement("div");
-        div.classList.add("chat-message");
-        div.textContent = data;
-        chatMessages.appendChild(div);
-
-        chatMessages.scrollTop = chatMessages.scrollHeight;
+      socket.on("message", appendChatMessage);
+      socket.on("chat_joined", (data) => showChatHistory(data.chat_id));
+      const chatMessages = document.getElementById("chat-messages");
+      chatMessages.addEventListener("scroll", () => {
+        if (chatMessages.scrollTop === 0) loadChatHistory(true);
+      });
+      // Sellers get every buyer's conversation about the item, but only
+      // see (and answer) the one open in the picker
+      socket.on("inbox_message", onInboxMessage);
+      document.getElementById("chat-buyer").addEventListener("change", (e) => {
+        openConversation(Number(e.target.value));
       });
 
       socketInitialized = true;
@@ -931,9 +1510,12 @@ async function openForm() {
   if(!chatOpen){
     chatOpen = true;
     if(!inRoom){
-      socket.emit("join", item, user);
+      socket.emit("join", { item_id: itemId });
       inRoom = true;
     }
+    if (isSeller) {
+      refreshInbox(itemId).catch((err) => console.error("Error loading conversations:", err));
+    }
   }
 
   chat_form.addEventListener("submit", async (e) => {
@@ -943,35 +1525,29 @@ async function openForm() {
 }
 
 // Close chat box
-async function closeForm() {
-  const parts = window.location.pathname.split("/");
-  const id = parts[parts.length - 1];
-
-  const data_user = await fetchJSON("/api/profile/me");
-  const user = data_user.user;
-
-  const data_item = await fetchJSON(`/api/items/${id}`);
-  const item = data_item.item;
-
+function closeForm() {
   if (socket) {
-    socket.emit("leave", item, user);
+    socket.emit("leave", { item_id: itemIdFromPath() });
     chatOpen = false;
     inRoom = false;
   }
   
   document.getElementById("chatForm").style.display = "none";
-  // await fetchJSON("/api/profile/me"); // no-op, but keeps pattern
 }
 
 // Function to send messages
 async function sendMessage() {
-  const data = await fetchJSON("/api/profile/me");
-  const user = data.user;
-
+  if (!socket) return;
   const msgInput = document.getElementById("msg");
-  const message = msgInput.value;
+  const message = { item_id: itemIdFromPath(), text: msgInput.value };
+  // The seller answers the conversation they have open, and nobody else
+  const { isSeller } = await getChatContext();
+  if (isSeller) {
+    if (openBuyer === null) return;
+    message.buyer_id = openBuyer;
+  }
 
-  socket.send(message, user);
+  socket.emit("message", message);
   msgInput.value = "";
 }
 
@@ -0,0 +1,325 @@
+"""
+storage.py - Where uploads and processed photos are kept.
+
+Requests stream accepted uploads into a StorageBackend under a private
+INCOMING_PREFIX key (save_stream) and queue only that key; the photo job
+reads it back as a stream (open_stream) and deletes it once done, so any
+worker that can reach the backend can process it.
+
+Photo jobs hand processed bytes to a StorageBackend and get back a public URL.
+Every backend files them under a content-addressed key,
+"<kind>/<first 2 hex of sha256>/<sha256>.<ext>": identical photos are
+stored once, and since a URL's content can never change it is served with
+IMMUTABLE_CACHE_CONTROL.
+
+Backends are picked by name (views.asset_folder, overridable with the
+STORAGE_BACKEND env var):
+    "local_marketplace"  files under MEDIA_ROOT, served at /media/<key>
+    "marketplace"        Cloudinary
+    "s3"                 any S3-compatible bucket (S3_BUCKET, S3_ENDPOINT_URL,
+                         S3_PUBLIC_URL); needs boto3
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import urllib.request
+import uuid
+
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+MEDIA_ROOT = os.path.join(HERE, "media")
+
+# A year, the longest max-age browsers and CDNs honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+
+# Raw uploads waiting for their job; never served (see views.media)
+INCOMING_PREFIX = "incoming"
+# Copy buffer for streams, and how much of a stream read back stays in memory
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MEMORY_LIMIT = 1024 * 1024
+
+CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+
+def content_key(data, kind, ext):
+    """The key data is stored under: same bytes, same key."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{kind}/{digest[:2]}/{digest}.{ext}"
+
+
+def incoming_key():
+    """A new, unguessable key for a raw upload."""
+    return f"{INCOMING_PREFIX}/{uuid.uuid4().hex}"
+
+
+def spooled_copy(source):
+    """
+    Copies a readable stream into a seekable file (Pillow needs to seek),
+    kept in memory up to STREAM_MEMORY_LIMIT and on disk past it.
+    """
+    copy = tempfile.SpooledTemporaryFile(max_size=STREAM_MEMORY_LIMIT)
+    shutil.copyfileobj(source, copy, STREAM_CHUNK_SIZE)
+    copy.seek(0)
+    return copy
+
+
+class StorageBackend:
+    """
+    Interface of a storage driver. Drivers implement exists(), write() and
+    url(); save() is what callers use. Raw uploads go through
+    save_stream(), open_stream() and delete().
+    """
+
+    def exists(self, key):
+        """Whether something is already stored under key."""
+        raise NotImplementedError
+
+    def write(self, key, data, content_type):
+        """Stores data under key."""
+        raise NotImplementedError
+
+    def url(self, key):
+        """Public URL of the file stored under key."""
+        raise NotImplementedError
+
+    def save(self, data, kind, ext):
+        """
+        Stores data (kind is e.g. "uploads" or "avatars", ext its file type)
+        unless an identical file is already stored. Returns its public URL.
+        """
+        key = content_key(data, kind, ext)
+        if not self.exists(key):
+            self.write(key, data, CONTENT_TYPES[ext])
+        return self.url(key)
+
+    def save_stream(self, fileobj, key):
+        """Stores what fileobj reads under key, a chunk at a time."""
+        raise NotImplementedError
+
+    def open_stream(self, key):
+        """A seekable binary file object reading what is stored under key."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Deletes what is stored under key, if anything."""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Files on local disk, for development. Served by the /media route in views."""
+
+    def __init__(self, root, base_url="/media"):
+        self.root = root
+        self.base_url = base_url
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def _write_file(self, key, write):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                write(out)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def write(self, key, data, content_type):
+        self._write_file(key, lambda out: out.write(data))
+
+    def url(self, key):
+        return f"{self.base_url}/{key}"
+
+    def save_stream(self, fileobj, key):
+        self._write_file(key, lambda out: shutil.copyfileobj(fileobj, out, STREAM_CHUNK_SIZE))
+
+    def open_stream(self, key):
+        return open(self._path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Cloudinary. Its URLs are already versioned and CDN-cached; uploading
+    with overwrite=False makes an existing public_id a no-op.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    @staticmethod
+    def _public_id(key):
+        # Cloudinary files assets by folder (see _upload), so the id is the hash alone
+        return key.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+    def _upload(self, key, data):
+        kind = key.split("/", 1)[0]
+        return cloudinary.uploader.upload(
+            io.BytesIO(data),
+            public_id=self._public_id(key),
+            unique_filename=False,
+            overwrite=False,
+            asset_folder=f"{self.folder}_{kind}"
+        )
+
+    def exists(self, key):
+        try:
+            cloudinary.api.resource(self._public_id(key))
+        except cloudinary.exceptions.NotFound:
+            return False
+        return True
+
+    def write(self, key, data, content_type):
+        self._upload(key, data)
+
+    def url(self, key):
+        ext = key.rsplit(".", 1)[-1]
+        return cloudinary.utils.cloudinary_url(self._public_id(key), format=ext, secure=True)[0]
+
+    def save(self, data, kind, ext):
+        # One API call instead of exists() + write() + url(): the upload
+        # is already a no-op for a stored public_id, and returns the URL
+        return self._upload(content_key(data, kind, ext), data).get("secure_url")
+
+    # Raw uploads are private "raw" assets: only a signed URL reads them back
+    def save_stream(self, fileobj, key):
+        cloudinary.uploader.upload_large(
+            fileobj,
+            public_id=key,
+            resource_type="raw",
+            type="private",
+            chunk_size=6 * 1024 * 1024,
+        )
+
+    def open_stream(self, key):
+        url = cloudinary.utils.private_download_url(key, None, resource_type="raw")
+        with urllib.request.urlopen(url) as response:
+            return spooled_copy(response)
+
+    def delete(self, key):
+        cloudinary.uploader.destroy(key, resource_type="raw", type="private")
+
+
+class S3Storage(StorageBackend):
+    """
+    An S3-compatible bucket (AWS, MinIO, R2, ...). client is any object
+    with boto3's put_object/list_objects_v2; by default a boto3 client is
+    created on first use.
+    """
+
+    def __init__(self, bucket, client=None, endpoint_url=None, public_url=None):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.public_url = (public_url or (
+            f"{endpoint_url}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com"
+        )).rstrip("/")
+        self._client = client
+
+    @classmethod
+    def from_env(cls):
+        """Builds the backend from S3_BUCKET, S3_ENDPOINT_URL and S3_PUBLIC_URL."""
+        return cls(
+            os.environ["S3_BUCKET"],
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+            public_url=os.environ.get("S3_PUBLIC_URL"),
+        )
+
+    @property
+    def client(self):
+        """The S3 client, created on first use."""
+        if self._client is None:
+            import boto3  # pylint: disable=import-outside-toplevel  # only needed for S3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def exists(self, key):
+        listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(obj["Key"] == key for obj in listing.get("Contents", []))
+
+    def write(self, key, data, content_type):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def url(self, key):
+        return f"{self.public_url}/{key}"
+
+    # Multipart uploads and ranged reads: boto3 never holds the whole file
+    def save_stream(self, fileobj, key):
+        self.client.upload_fileobj(fileobj, self.bucket, key)
+
+    def open_stream(self, key):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            return spooled_copy(body)
+        finally:
+            body.close()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+# Backends worth keeping around between jobs (an S3 client holds a connection pool)
+BACKENDS = {}
+
+
+BACKEND_NAMES = ("local_marketplace", "marketplace", "s3")
+
+
+class UnknownStorageBackend(ValueError):
+    """STORAGE_BACKEND (or a queued job) names a backend that doesn't exist."""
+
+
+def check_backend_name(name):
+    """Raises UnknownStorageBackend unless name is one of BACKEND_NAMES."""
+    if name not in BACKEND_NAMES:
+        raise UnknownStorageBackend(
+            f"Unknown storage backend {name!r}; use one of {', '.join(BACKEND_NAMES)}")
+
+
+def get_storage(name):
+    """
+    Returns the storage backend called name (see the module docstring).
+    Raises UnknownStorageBackend for any other name.
+    """
+    check_backend_name(name)
+    if name in BACKENDS:
+        return BACKENDS[name]
+    if name == "marketplace":
+        return CloudinaryStorage(name)
+    if name == "s3":
+        BACKENDS[name] = S3Storage.from_env()
+        return BACKENDS[name]
+    return LocalStorage(MEDIA_ROOT)
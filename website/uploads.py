@@ -0,0 +1,98 @@
+"""
+uploads.py - Streaming intake of photo uploads.
+
+Werkzeug already spools multipart file parts larger than 500 KB to disk.
+Rather than read() them back into memory, spool_upload() checks the magic
+bytes of the first chunk, copies the rest in fixed-size chunks into a spool
+file (enforcing a per-upload size limit as it goes), and lets Pillow parse
+only the header from that file, so a bad upload is refused without ever
+being held in memory. An accepted one is then streamed into the storage
+backend and its job carries only the key (see images.py), since the worker
+may run on another dyno.
+"""
+
+import os
+import tempfile
+
+from flask import current_app
+from PIL import Image, UnidentifiedImageError
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from .images import ALLOWED_FORMATS, InvalidImage, discard
+
+CHUNK_SIZE = 64 * 1024
+
+# Per-upload limits; MAX_CONTENT_LENGTH in create_app caps the whole request
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+MAX_AVATAR_BYTES = 5 * 1024 * 1024
+# Refuse images that would take more than ~160 MB to decode
+MAX_PIXELS = 40_000_000
+
+# Leading bytes of the formats we accept...
+ACCEPTED_MAGIC = {
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"\xff\xd8\xff": "JPEG",
+}
+# ...and of image formats we recognize but don't accept
+OTHER_IMAGE_MAGIC = (b"GIF87a", b"GIF89a", b"BM", b"II*\x00", b"MM\x00*", b"RIFF")
+
+
+def sniff_magic(head):
+    """
+    Checks the first bytes of an upload. Raises InvalidImage with the
+    user-facing error for anything that isn't a PNG or JPEG.
+    """
+    for magic in ACCEPTED_MAGIC:
+        if head.startswith(magic):
+            return
+    # HEIC/AVIF start with a length then "ftyp"
+    if head.startswith(OTHER_IMAGE_MAGIC) or head[4:8] == b"ftyp":
+        raise InvalidImage("Invalid image format")
+    raise InvalidImage("Invalid image file")
+
+
+def spool_dir():
+    """Directory uploads are checked in before they are queued."""
+    path = current_app.config["UPLOAD_SPOOL_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(file_storage, max_bytes=MAX_PHOTO_BYTES):
+    """
+    Streams an uploaded file into the spool directory and validates it.
+    Returns the spooled file's path; the caller queues it (which deletes the file).
+
+    Raises InvalidImage for files that aren't PNG/JPEG (or are absurdly
+    large images) and RequestEntityTooLarge past max_bytes.
+    """
+    stream = file_storage.stream
+    head = stream.read(CHUNK_SIZE)
+    sniff_magic(head)
+
+    fd, path = tempfile.mkstemp(prefix="upload_", dir=spool_dir())
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise RequestEntityTooLarge()
+                out.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+
+        # Image.open only parses the header; nothing is decoded here
+        try:
+            with Image.open(path) as img:
+                image_format, (width, height) = img.format, img.size
+        except (UnidentifiedImageError, OSError) as exc:
+            raise InvalidImage("Invalid image file") from exc
+        if image_format not in ALLOWED_FORMATS:
+            raise InvalidImage("Invalid image format")
+        if width * height > MAX_PIXELS:
+            raise InvalidImage("Image dimensions are too large")
+    except Exception:
+        discard(path)
+        raise
+    return path
@@ -1,19 +1,30 @@
 """views.py"""
 
 import os
-import io # for our file
-from datetime import datetime
-from PIL import Image, UnidentifiedImageError
-import cloudinary # to send our images to cloudinary
-import cloudinary.uploader
+import json
+import base64
+import hashlib
+from datetime import datetime, timedelta
 from flask import (
-    Blueprint, render_template, redirect, url_for, request, flash, send_from_directory, jsonify
+    Blueprint, render_template, redirect, url_for, request, flash, send_from_directory, jsonify,
+    current_app, session, abort
 )
 from flask_login import current_user, login_required
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import is_resource_modified
 from flask_socketio import emit, join_room, leave_room
+from sqlalchemy import and_, case, func, true, tuple_
+from sqlalchemy.orm import joinedload, selectinload
 from website.extensions import db, socketio
-from .models import User, Item
+from .models import (PAYMENT_METHODS, User, Item, ItemPaymentOption, Bookmark, Chat, Message,
+                     ListingVersion)
+from .search import apply_search, search_terms
+from .cache import feed_cache, suggest_cache
+from .chat import flush_quietly, message_buffer
+from .images import InvalidImage, queue_avatar, queue_item_photo
+from .realtime import FEED_ROOM, publish_feed
+from . import storage
+from .uploads import MAX_AVATAR_BYTES, MAX_PHOTO_BYTES, spool_upload
 
 # --- Blueprints ---
 main_blueprint = Blueprint('main', __name__)
@@ -21,14 +32,11 @@ item_blueprint = Blueprint('item', __name__)
 profile_blueprint = Blueprint('profile', __name__)
 
 # --- Paths & Upload Config (single source of truth) ---
+# Uploaded photos are kept by a storage backend; see storage.py
 HERE = os.path.abspath(os.path.dirname(__file__))  # this file's dir
 STATIC_DIR = os.path.join(HERE, "static")          # .../marketplace/static
-UPLOAD_FOLDER = os.path.join(STATIC_DIR, "uploads")    # .../static/uploads  (items)
-AVATAR_FOLDER = os.path.join(UPLOAD_FOLDER, "avatars") # .../static/uploads/avatars (avatars)
 DATA_FOLDER = os.path.join(STATIC_DIR, "data")         # .../static/data
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(AVATAR_FOLDER, exist_ok=True)
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
 # Want to check if it is being run locally or on Heroku
@@ -36,11 +44,231 @@ uri = os.getenv("DATABASE_URL")
 asset_folder = "marketplace"
 if uri is None:
     asset_folder = "local_marketplace"
+# Name of the storage backend photos go to (storage.get_storage); e.g. STORAGE_BACKEND=s3
+asset_folder = os.getenv("STORAGE_BACKEND", asset_folder)
+# A typo fails at startup, not at the first upload
+storage.check_backend_name(asset_folder)
 
 
 # Avatar (profile) strict mimetypes
 AVATAR_ALLOWED_MIMES = {'image/png', 'image/jpeg'}
 
+# Item list pagination: clients may ask for fewer, never more than MAX_PAGE_SIZE
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Most bookmark toggles one POST /api/bookmarks/batch may carry
+MAX_BOOKMARK_BATCH = 200
+
+# Chat: longest stored line, and history page sizes
+MAX_MESSAGE_LENGTH = 2000
+DEFAULT_MESSAGE_PAGE = 50
+MAX_MESSAGE_PAGE = 200
+
+# Search bar typeahead: top-k matches, cached in cache.suggest_cache
+SUGGEST_LIMIT = 8
+
+# Item list orders (see KEYSET_SORTS; relevance pages by offset), and the
+# "listed in the last N days" choices the posted facet counts
+SORTS = ("newest", "price_asc", "price_desc", "relevance")
+RECENCY_DAYS = (1, 7, 30)
+
+# Per-viewer fields of an item payload, overlaid on cached feed pages
+VIEWER_FIELDS = ("bookmarked", "is_owner")
+
+
+# =========================
+# Query helpers
+# =========================
+def item_list_query(user_id):
+    """
+    Query yielding (item, bookmarked) rows for the given viewer.
+
+    Each item's seller comes back in the same SELECT, loading only the
+    seller columns Item.to_dict() puts in the payload (plus updated_at, which
+    versions the response), and the page's payment methods in one more, so
+    serializing N items costs two queries instead of 2N + 1. The bookmarked
+    flag comes from an outer join on the bookmark table's (user_id, item_id)
+    primary key.
+    """
+    return (
+        Item.query
+        .options(joinedload(Item.seller).load_only(
+            User.id, User.first_name, User.last_name, User.updated_at),
+            selectinload(Item.payment_methods))
+        .outerjoin(Bookmark, and_(Bookmark.item_id == Item.id, Bookmark.user_id == user_id))
+        .add_columns(Bookmark.user_id.isnot(None).label("bookmarked"))
+    )
+
+
+def item_facet_filters(args):
+    """
+    The facet filters asked for in args (see api_list_items), as
+    {facet: SQL condition}. Values that don't parse are ignored.
+    """
+    filters = {}
+    min_price = args.get("min_price", type=float)
+    max_price = args.get("max_price", type=float)
+    price = [c for c in (min_price is not None and Item.price >= min_price,
+                         max_price is not None and Item.price <= max_price) if c is not False]
+    if price:
+        filters["price"] = and_(*price)
+    conditions = [c for c in args.getlist("condition") if c]
+    if conditions:
+        filters["condition"] = Item.condition.in_(conditions)
+    payments = [p for p in args.getlist("payment") if p in PAYMENT_METHODS]
+    if payments:
+        # Seeks ix_item_payment_option_method for each method
+        filters["payment"] = Item.id.in_(
+            db.select(ItemPaymentOption.item_id).where(ItemPaymentOption.method.in_(payments)))
+    days = args.get("days", type=int)
+    if days is not None and days > 0:
+        filters["posted"] = Item.date_created >= datetime.utcnow() - timedelta(days=days)
+    return filters
+
+
+def facet_counts(listed, facet_filters, q):
+    """
+    Counts for the filter menus, from one aggregate query per facet. Each
+    facet is counted under every filter but its own, so the menu still
+    shows what picking another value would give:
+
+        {"condition": {"New": 3, ...}, "payment": {"Cash": 5, "Venmo": 0, ...},
+         "price": {"min": 1.0, "max": 250.0},
+         "posted": {"1": 0, "7": 2, "30": 9}}    (items per "last N days")
+    """
+    def narrowed(query, facet):
+        query = query.filter(
+            listed, *(c for name, c in facet_filters.items() if name != facet))
+        if q:
+            query, _ = apply_search(query, q)
+        return query
+
+    conditions = narrowed(
+        db.session.query(Item.condition, func.count(Item.id)).select_from(Item), "condition")
+    payments = narrowed(
+        db.session.query(ItemPaymentOption.method, func.count(Item.id)).select_from(Item)
+        .join(ItemPaymentOption, ItemPaymentOption.item_id == Item.id), "payment")
+    low, high = narrowed(
+        db.session.query(func.min(Item.price), func.max(Item.price)).select_from(Item),
+        "price").one()
+    now = datetime.utcnow()
+    posted = narrowed(db.session.query(*(
+        func.coalesce(func.sum(case((Item.date_created >= now - timedelta(days=days), 1),
+                                    else_=0)), 0)
+        for days in RECENCY_DAYS)).select_from(Item), "posted").one()
+
+    by_method = dict(payments.group_by(ItemPaymentOption.method).all())
+    return {
+        "condition": dict(conditions.filter(Item.condition.isnot(None))
+                          .group_by(Item.condition).all()),
+        "payment": {method: by_method.get(method, 0) for method in PAYMENT_METHODS},
+        "price": {"min": low, "max": high},
+        "posted": {str(days): count for days, count in zip(RECENCY_DAYS, posted)},
+    }
+
+
+def arg_flag(name):
+    """Whether query param name is switched on (?name=1 or ?name=true)."""
+    return request.args.get(name, "").lower() in ("1", "true")
+
+
+# =========================
+# Pagination helpers
+# =========================
+# Keyset sorts of the item list: ORDER BY columns, ending in Item.id so
+# every row has a unique position (see keyset_after/keyset_position)
+KEYSET_SORTS = {
+    "newest": (Item.date_created.desc(), Item.id.desc()),
+    "price_asc": (Item.price.asc(), Item.id.asc()),
+    "price_desc": (Item.price.desc(), Item.id.desc()),
+}
+
+
+def keyset_position(sort, item):
+    """Where the page after item starts, for encode_cursor."""
+    if sort == "newest":
+        return {"created": item.date_created.isoformat(), "id": item.id}
+    return {"price": item.price, "id": item.id}
+
+
+def keyset_after(sort, position):
+    """
+    Condition selecting the rows after position in sort order. Row-value
+    comparisons, so the planner can range-scan the sort's index.
+    """
+    last_id = int(position["id"])
+    if sort == "newest":
+        created = datetime.fromisoformat(position["created"])
+        return tuple_(Item.date_created, Item.id) < (created, last_id)
+    price = float(position["price"])
+    if sort == "price_asc":
+        return tuple_(Item.price, Item.id) > (price, last_id)
+    return tuple_(Item.price, Item.id) < (price, last_id)
+
+
+def encode_cursor(position):
+    """
+    Builds the opaque cursor for the next page from a small dict describing
+    where that page starts. It is base64 encoded so clients treat it as a
+    token instead of something to build themselves.
+    """
+    raw = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Turns a cursor from encode_cursor back into its dict.
+    Raises ValueError when the cursor is malformed.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    position = json.loads(base64.urlsafe_b64decode(padded))
+    if not isinstance(position, dict):
+        raise ValueError("cursor must encode an object")
+    return position
+
+
+# =========================
+# Conditional GET helpers
+# =========================
+def conditional_json(version, last_modified, build):
+    """
+    Answers a GET for a JSON resource whose content is fully determined by
+    version (any tuple of values: timestamps, counts, ids...).
+
+    The weak ETag is a hash of version, so if the client's If-None-Match
+    (or If-Modified-Since, compared with last_modified) shows it already has
+    this version we answer 304 without calling build(). Otherwise build()
+    returns the body. Responses are private and revalidated on every use,
+    and vary with the session cookie since they depend on who is asking.
+    """
+    etag = hashlib.sha1(repr(version).encode()).hexdigest()
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.make_response(build())
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
+def latest(*timestamps):
+    """The newest of the given timestamps, ignoring missing ones (None if all are)."""
+    present = [t for t in timestamps if t is not None]
+    return max(present) if present else None
+
+
+def profile_response(user):
+    """A user's profile payload, as a conditional response (see conditional_json)."""
+    bookmark_count, last_bookmarked = Bookmark.version(user.id)
+    version = ("profile", user.id, user.updated_at, bookmark_count, last_bookmarked)
+    return conditional_json(version, latest(user.updated_at, last_bookmarked),
+                            lambda: {"user": user.to_dict()})
+
 
 # =====================================================
 # HTML ROUTES (NO JINJA DATA) – FRONTEND SHELL ONLY
@@ -64,6 +292,20 @@ def favicon():
 # =========================
 # Main / Browse
 # =========================
+@main_blueprint.route('/media/<path:key>')
+def media(key):
+    """
+    Serves photos kept by the local storage backend. Keys are content
+    hashes, so a URL never changes content and may be cached forever.
+    Raw uploads waiting for their job are not served.
+    """
+    if key.split("/", 1)[0] == storage.INCOMING_PREFIX:
+        abort(404)
+    response = send_from_directory(storage.MEDIA_ROOT, key, max_age=storage.IMMUTABLE_MAX_AGE)
+    response.headers["Cache-Control"] = storage.IMMUTABLE_CACHE_CONTROL
+    return response
+
+
 @main_blueprint.route('/')
 @login_required
 def goto_browse_items_page():
@@ -101,34 +343,160 @@ def create_item_page():
 
 
 # Socket.IO chat handlers
+def chat_room(item_id, buyer_id):
+    """Room of one conversation: the item's seller and one buyer."""
+    return f"chat:{item_id}:{buyer_id}"
+
+
+def inbox_room(item_id):
+    """Room where the seller sees every conversation about the item."""
+    return f"chat:{item_id}:inbox"
+
+
+def emit_chat(text, item_id, buyer_id):
+    """
+    Sends a line to a conversation, and to its seller's inbox as an
+    "inbox_message" that also names the buyer, so the seller knows whom to
+    reply to. With no buyer (the seller alone in their inbox) only the
+    inbox gets it, as a plain "message".
+    """
+    if buyer_id is None:
+        emit("message", text, to=inbox_room(item_id))
+        return
+    emit("message", text, to=chat_room(item_id, buyer_id))
+    emit("inbox_message", {"buyer_id": buyer_id, "text": text}, to=inbox_room(item_id))
+
+
+def sender_name():
+    """How chat lines name the logged-in user (from the session, no query)."""
+    return f"{current_user.first_name} {current_user.last_name}"
+
+
+def chat_buyer_id(value):
+    """A buyer id sent by a client, or None if it isn't one."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@socketio.on("connect")
+def handle_connect(auth=None):  # pylint: disable=unused-argument
+    """
+    Only logged-in users may open a socket; every event after that is
+    sent as current_user, whatever the client claims.
+    """
+    if not current_user.is_authenticated:
+        return False
+    return None
+
+
 @socketio.on("join")
-def handle_join(item, user):
+def handle_join(data):
     """
     This function handles when the user joins the chat room.
+    data is {"item_id": ...}, plus "buyer_id" for a seller opening one
+    buyer's conversation. A buyer joins their own conversation about the
+    item; the seller joins the item's inbox, or that buyer's conversation.
+    Messages then only reach that conversation's participants.
     """
-    item_id = item["id"]
-    room_id = item_id
+    if not isinstance(data, dict):
+        return
+    item_id = data.get("item_id")
+    seller_id = db.session.execute(
+        db.select(Item.seller_id).where(Item.id == item_id)).scalar()
+    if seller_id is None:
+        return  # no such item
+
+    buyer_id = chat_buyer_id(data.get("buyer_id"))
+    chat_id = None
+    if current_user.id != seller_id:
+        buyer_id = current_user.id
+        chat_id = Chat.for_conversation(item_id, seller_id, buyer_id).id
+    elif buyer_id is not None:
+        # The seller can only open a conversation the buyer started
+        existing = Chat.find(item_id, buyer_id)
+        if existing is None:
+            return
+        chat_id = existing.id
+    room_id = chat_room(item_id, buyer_id) if buyer_id is not None else inbox_room(item_id)
     join_room(room_id)
-    emit("message", f"{user['first_name']} {user['last_name']} has joined the chat", room=room_id)
+
+    # The socket's session remembers the conversation for later messages
+    chat = {"item_id": item_id, "seller_id": seller_id, "buyer_id": buyer_id,
+            "room": room_id, "chat_ids": {}}
+    if chat_id is not None:
+        chat["chat_ids"][str(buyer_id)] = chat_id
+        # Lets the page load earlier messages from /api/chats/<id>/messages
+        emit("chat_joined", {"chat_id": chat_id})
+    session["chat"] = chat
+    emit_chat(f"{sender_name()} has joined the chat", item_id, buyer_id)
 
 
 @socketio.on("message")
-def handle_message(data, user):
+def handle_message(data):
     """
     This function handles when the user sends a message to the chat room.
+    data is {"item_id": ..., "text": ...}; a seller in their inbox may add
+    "buyer_id" to answer that buyer.
+    Lines sent to a buyer are stored (in batches, see chat.py).
     """
-    emit("message", f"{user['first_name']} {user['last_name']}: {data}", broadcast=True)
+    if not isinstance(data, dict):
+        return
+    chat = session.get("chat")
+    if chat is None or chat["item_id"] != data.get("item_id"):
+        return  # not in this item's chat
+    buyer_id = chat["buyer_id"]
+    if buyer_id is None:
+        buyer_id = chat_buyer_id(data.get("buyer_id"))
+    body = str(data.get("text", ""))[:MAX_MESSAGE_LENGTH]
+
+    if buyer_id is not None:
+        chat_ids = chat["chat_ids"]
+        if str(buyer_id) not in chat_ids:
+            # Only reached by the seller answering from the inbox: the
+            # buyer's conversation was looked up when they joined
+            existing = Chat.find(chat["item_id"], buyer_id)
+            if existing is None:
+                return  # that buyer never wrote about this item
+            chat_ids[str(buyer_id)] = existing.id
+            session["chat"] = chat
+        message_buffer.add(chat_ids[str(buyer_id)], current_user.id, body)
+
+    emit_chat(f"{sender_name()}: {body}", chat["item_id"], buyer_id)
 
 
 @socketio.on("leave")
-def handle_disconnect(item, user):
+def handle_disconnect(data):  # pylint: disable=unused-argument
     """
     This function handles when the user leaves/disconenct from the chat/page.
     """
-    item_id = item["id"]
-    room_id = item_id
-    emit("message", f"{user['first_name']} {user['last_name']} left the chat", broadcast=True)
-    leave_room(room_id)
+    chat = session.pop("chat", None)
+    if chat is None:
+        return
+    emit_chat(f"{sender_name()} left the chat", chat["item_id"], chat["buyer_id"])
+    leave_room(chat["room"])
+    flush_quietly(current_app._get_current_object())  # pylint: disable=protected-access
+
+
+@socketio.on("disconnect")
+def handle_socket_closed(*args):  # pylint: disable=unused-argument
+    """A closed tab writes the lines it sent rather than leaving them in the buffer."""
+    flush_quietly(current_app._get_current_object())  # pylint: disable=protected-access
+
+
+def feed_payload(item):
+    """An item as the shared feed carries it: without VIEWER_FIELDS."""
+    data = item.to_dict()
+    for field in VIEWER_FIELDS:
+        data.pop(field, None)
+    return data
+
+
+@socketio.on("join_feed")
+def handle_join_feed():
+    """A browse page subscribes to listing changes."""
+    join_room(FEED_ROOM)
 
 
 @item_blueprint.route('/item/<int:item_id>/edit')
@@ -176,63 +544,23 @@ def save_profile_edits():
     bio = (request.form.get("profile_description") or "").strip()[:2000]
     current_user.profile_description = bio
 
-    # Optional avatar upload (strict PNG/JPEG)
+    # Optional avatar upload (strict PNG/JPEG), processed in the background
     f = request.files.get("avatar")
     if f and f.filename:
         if f.mimetype not in AVATAR_ALLOWED_MIMES:
             flash("Avatar must be PNG or JPEG (≤ 5 MB).", "error")
             return redirect(url_for("profile.goto_edit_profile_page"))
-        print(asset_folder)
-        if asset_folder == "marketplace":
-            # Read to memory so Pillow can validate the image
-            img_bytes = f.read()
-            img_file = io.BytesIO(img_bytes)
-
-            # Validate using magic bytes
-            try:
-                with Image.open(img_file) as img:
-                    if img.format not in ("PNG", "JPEG", "JPG"):
-                        return {"error": "Invalid image format"}, 400
-            except UnidentifiedImageError:
-                return {"error": "Invalid image file"}, 400
-
-            # Reset pointer after Pillow read
-            img_file.seek(0)
-
-            # Upload to Cloudinary
-            filename = secure_filename(f"{current_user.id}_{f.filename}")
-
-            upload_result = cloudinary.uploader.upload(
-                img_file,
-                public_id=f"{filename}",
-                unique_filename=True,
-                overwrite=True,
-                asset_folder=asset_folder+"_avatars"
-            )
 
-            image_path = upload_result.get("secure_url")
-            current_user.profile_image = image_path
-
-        else: # asset_folder == "local_marketplace"; we will save stuff locally if being run
-            filename = secure_filename(f"{current_user.id}_{f.filename}")
-            dest = os.path.join(AVATAR_FOLDER, filename)
-            f.save(dest)
-
-            # Magic-bytes sanity check
-            try:
-                with Image.open(dest) as img:
-                    if img.format not in ("PNG", "JPEG", "JPG"):
-                        os.remove(dest)
-                        flash("Invalid image file.", "error")
-                        return redirect(url_for("profile.goto_edit_profile_page"))
-            except UnidentifiedImageError:
-                os.remove(dest)
-                flash("Invalid image file.", "error")
-                return redirect(url_for("profile.goto_edit_profile_page"))
-
-            # Build a /static/... URL for templates & REST API
-            rel = os.path.relpath(dest, STATIC_DIR).replace("\\", "/")
-            current_user.profile_image = f"/static/{rel}"
+        try:
+            path = spool_upload(f, MAX_AVATAR_BYTES)
+        except InvalidImage:
+            flash("Invalid image file.", "error")
+            return redirect(url_for("profile.goto_edit_profile_page"))
+        except RequestEntityTooLarge:
+            flash("Avatar must be PNG or JPEG (≤ 5 MB).", "error")
+            return redirect(url_for("profile.goto_edit_profile_page"))
+
+        queue_avatar(current_user, path, asset_folder)
 
     db.session.commit()
     flash("Profile updated!", "success")
@@ -246,7 +574,7 @@ def api_profile_me():
     REST endpoint for current user's profile data.
     Used by profile.html and edit_profile.html via JS.
     """
-    return {"user": current_user.to_dict()}
+    return profile_response(current_user)
 
 
 # NEW: public view of any user's profile
@@ -270,7 +598,7 @@ def api_profile_user(user_id):
     Used when viewing seller profiles from an item page.
     """
     user = User.query.get_or_404(user_id)
-    return {"user": user.to_dict()}
+    return profile_response(user)
 
 
 # =====================================================
@@ -284,58 +612,226 @@ def api_profile_user(user_id):
 @login_required
 def api_list_items():
     """
-    REST endpoint for listing items.
+    REST endpoint for listing items, one page at a time.
 
     Optional query params:
       ?q=          full-text search on name/description/condition
+                   (every word matched as a prefix, best matches first)
       ?seller_id=  only items from a particular seller
+      ?mine=1      only the current user's own items (same as their seller_id)
+      ?bookmarked=1  only items the current user bookmarked
+      ?min_price=, ?max_price=  price range (inclusive)
+      ?condition=  only items in this condition (repeatable: any of them)
+      ?payment=    only items accepting this payment method (repeatable: any of them)
+      ?days=       only items listed in the last this many days
+      ?sort=       newest (default), price_asc, price_desc, or relevance
+                   (the default with q)
+      ?limit=      page size (capped at MAX_PAGE_SIZE)
+      ?after=      next_cursor from the previous page
+      ?facets=1    on the first page, also return facet counts (see facet_counts)
+
+    Filters combine with each other, with q, sort and pagination.
     """
     q = (request.args.get("q") or "").strip().lower()
     seller_id = request.args.get("seller_id", type=int)
-
-    query = Item.query
+    if arg_flag("mine"):
+        seller_id = current_user.id
+    bookmarked_only = arg_flag("bookmarked")
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = request.args.get("after")
+    # Four aggregates over every matching row: only for pages that show the filter menus
+    with_facets = after is None and arg_flag("facets")
+    sort = request.args.get("sort") or ("relevance" if q else "newest")
+    if sort not in SORTS:
+        return {"error": "Invalid sort"}, 400
+
+    query = item_list_query(current_user.id)
 
     if seller_id is not None:
-        query = query.filter_by(seller_id=seller_id)
-
+        listed = Item.seller_id == seller_id
+    else:
+        # The market itself only shows live listings (ix_item_live_created)
+        listed = Item.live_on_market == true()
+    if bookmarked_only:
+        # Seeks the user's rows in the bookmark primary key (user_id, item_id)
+        listed = and_(listed, Item.id.in_(
+            db.select(Bookmark.item_id).where(Bookmark.user_id == current_user.id)))
+    facet_filters = item_facet_filters(request.args)
+    query = query.filter(listed, *facet_filters.values())
+
+    # Every add, edit or delete of an item (or a seller's name) bumps the
+    # listings version, so this costs two index reads however many items are listed
+    listings_version, listings_changed = ListingVersion.current()
+    bookmark_count, last_bookmarked = Bookmark.version(current_user.id)
+    # ?days= also changes as items age out of the window, and so do the
+    # posted facet's "last N days" counts (checked daily)
+    now = datetime.utcnow()
+    clock = None
+    if "posted" in facet_filters:
+        clock = now.replace(second=0, microsecond=0)
+    elif with_facets:
+        clock = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    version = (request.full_path, current_user.id, listings_version,
+               bookmark_count, last_bookmarked, clock)
+    last_modified = latest(listings_changed, last_bookmarked, clock)
+
+    # Searches come back best match first, unless another sort is asked for
+    rank_order = None
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            Item.name.ilike(like) |
-            Item.description.ilike(like) |
-            Item.condition.ilike(like)
-        )
-
-    items = query.order_by(Item.date_created.desc()).all()
-    bookmarked_ids = set(current_user.bookmark_items or [])  # Sets bookmark value
+        query, rank_order = apply_search(query, q)
+    if sort == "relevance" and rank_order is None:
+        sort = "newest"  # nothing to rank by
 
+    try:
+        position = decode_cursor(after) if after else None
+
+        if sort == "relevance":
+            # Relevance has no stable keyset, but result sets are small: page by offset
+            offset = max(int(position["offset"]), 0) if position else 0
+            query = query.order_by(rank_order, Item.date_created.desc(), Item.id.desc())
+            query = query.offset(offset)
+        else:
+            # Keyset pagination: seek past the last row we handed out,
+            # so deep pages cost the same as the first one.
+            query = query.order_by(*KEYSET_SORTS[sort])
+            if position:
+                query = query.filter(keyset_after(sort, position))
+    except (KeyError, TypeError, ValueError):
+        return {"error": "Invalid cursor"}, 400
+
+    # The unfiltered feed is the same for everyone but the viewer's flags:
+    # pages come from cache.feed_cache. Keys carry the listings version, so
+    # a write in another process (whose invalidation can't reach this
+    # process's TTLCache) still retires the cached page.
+    is_feed = (seller_id is None and not bookmarked_only and not facet_filters
+               and sort == "newest" and not q and not with_facets)
+    cache_key = f"{listings_version}:{limit}:{after or ''}"
+
+    def build_page():
+        if is_feed:
+            page = feed_cache.get(cache_key)
+            if page is None:
+                page = build_shared_page()
+                feed_cache.set(cache_key, page)
+            return overlay_viewer(page)
+        return build_page_for(current_user.id)
+
+    def build_shared_page():
+        page = build_page_for(None)
+        for item in page["items"]:
+            for field in VIEWER_FIELDS:
+                item.pop(field, None)
+        return page
+
+    def build_page_for(viewer_id):
+        # Fetch one extra row to learn whether there is another page
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more and sort == "relevance":
+            next_cursor = encode_cursor({"offset": offset + limit})
+        elif has_more:
+            next_cursor = encode_cursor(keyset_position(sort, rows[-1].Item))
+
+        page = {
+            "items": [
+                item.to_dict(
+                    include_seller=True,
+                    bookmarked=bookmarked,
+                    current_user_id=viewer_id
+                )
+                for item, bookmarked in rows
+            ],
+            "next_cursor": next_cursor,
+        }
+        if with_facets:
+            page["facets"] = facet_counts(listed, facet_filters, q)
+        return page
+
+    return conditional_json(version, last_modified, build_page)
+
+
+def overlay_viewer(page):
+    """
+    Copies a cached feed page, adding the current user's bookmarked and
+    is_owner flags to each item (one bookmark lookup for the whole page).
+    """
+    ids = [item["id"] for item in page["items"]]
+    bookmarked = set(db.session.scalars(
+        db.select(Bookmark.item_id)
+        .where(Bookmark.user_id == current_user.id, Bookmark.item_id.in_(ids))
+    )) if ids else set()
     return {
+        **page,
         "items": [
-            item.to_dict(
-                include_seller=True,
-                bookmarked=(item.id in bookmarked_ids),
-                current_user_id=current_user.id
-            )
-            for item in items
-        ]
+            {**item,
+             "bookmarked": item["id"] in bookmarked,
+             "is_owner": item["seller_id"] == current_user.id}
+            for item in page["items"]
+        ],
     }
 
 
+@item_blueprint.route("/api/items/suggest", methods=["GET"])
+@login_required
+def api_suggest_items():
+    """
+    REST endpoint for the browse search bar typeahead.
+    Returns only id, name and thumbnail of the best name matches for ?q=.
+    """
+    terms = search_terms(request.args.get("q"))
+    if not terms:
+        return {"suggestions": []}
+
+    key = " ".join(terms)
+    # Versioned like the feed cache's keys (see api_list_items)
+    cache_key = f"{ListingVersion.current()[0]}:{key}"
+    suggestions = suggest_cache.get(cache_key)
+
+    if suggestions is None:
+        query = db.session.query(
+            Item.id, Item.name, Item.item_photos, Item.photo_variants
+        ).filter(
+            Item.live_on_market.is_(True)
+        )
+        query, rank_order = apply_search(query, key, name_only=True)
+        if rank_order is not None:
+            query = query.order_by(rank_order)
+        rows = query.order_by(Item.date_created.desc()).limit(SUGGEST_LIMIT).all()
+
+        suggestions = [
+            {"id": row.id, "name": row.name,
+             "thumbnail": Item.thumbnail_url(row.item_photos, row.photo_variants)}
+            for row in rows
+        ]
+        suggest_cache.set(cache_key, suggestions)
+
+    return {"suggestions": suggestions}
+
+
 @main_blueprint.route("/api/items/<int:item_id>", methods=["GET"], endpoint="api_get_item_v2")
 @login_required
 def api_get_item_v2(item_id):
     """
     REST endpoint for a single item, used by item.html via JS.
     """
-    item = Item.query.get_or_404(item_id)
-    bookmarked_ids = set(current_user.bookmark_items or [])
-    return {
-        "item": item.to_dict(
-            include_seller=True,
-            bookmarked=(item.id in bookmarked_ids),
-            current_user_id=current_user.id
-        )
-    }
+    item, bookmarked = item_list_query(current_user.id).filter(Item.id == item_id).first_or_404()
+    version = ("item", item.id, item.updated_at, item.seller.updated_at,
+               bool(bookmarked), current_user.id)
+    return conditional_json(
+        version,
+        latest(item.updated_at, item.seller.updated_at),
+        lambda: {
+            "item": item.to_dict(
+                include_seller=True,
+                bookmarked=bookmarked,
+                current_user_id=current_user.id
+            )
+        },
+    )
 
 
 @item_blueprint.route("/api/items", methods=["POST"])
@@ -363,45 +859,17 @@ def api_create_item():
     if price_val < 0:
         return {"error": "Price cannot be negative"}, 400
 
-    # handle file upload
+    if any(m not in PAYMENT_METHODS for m in payment_options):
+        return {"error": "Invalid payment option"}, 400
+
+    # Spool and check the upload now; the heavy lifting happens in a background job
     image_file = request.files.get("image_file")
+    photo = None
     if image_file and image_file.filename:
-        if asset_folder == "marketplace":
-            # Read to memory so Pillow can validate the image
-            img_bytes = image_file.read()
-            img_file = io.BytesIO(img_bytes)
-
-            # Validate using magic bytes
-            try:
-                with Image.open(img_file) as img:
-                    if img.format not in ("PNG", "JPEG", "JPG"):
-                        return {"error": "Invalid image format"}, 400
-            except Exception:
-                return {"error": "Invalid image file"}, 400
-
-            # Reset pointer after Pillow read
-            img_file.seek(0)
-
-            # Upload to Cloudinary
-            filename = secure_filename(f"{current_user.id}_{image_file.filename}")
-
-            upload_result = cloudinary.uploader.upload(
-                img_file,
-                public_id=f"{filename}",
-                unique_filename=True,
-                overwrite=True,
-                asset_folder=asset_folder+"_uploads"
-            )
-
-            image_path = upload_result.get("secure_url")
-
-        else: # asset_folder == "local_marketplace"; we will save stuff locally if being run
-            filename = secure_filename(f"{current_user.id}_{image_file.filename}")
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            image_file.save(filepath)
-            image_path = f"/static/uploads/{filename}"
-    else:
-        image_path = "/static/assets/item_placeholder.svg"
+        try:
+            photo = spool_upload(image_file, MAX_PHOTO_BYTES)
+        except InvalidImage as exc:
+            return {"error": str(exc)}, 400
 
     new_item = Item(
         seller_id=current_user.id,
@@ -410,17 +878,22 @@ def api_create_item():
         price=price_val,
         condition=condition,
         payment_options=payment_options,
-        item_photos=image_path
+        # Shown until the queued photo is processed
+        item_photos="/static/assets/item_placeholder.svg"
     )
 
     db.session.add(new_item)
+    db.session.flush()  # queue_item_photo and selling_items need the new id
+    if photo is not None:
+        queue_item_photo(new_item, photo, asset_folder)
+    current_user.selling_items = (current_user.selling_items or []) + [new_item.id]
     db.session.commit()
 
-    selling = current_user.selling_items or []
-    selling.append(new_item.id)
-    current_user.selling_items = selling
+    publish_feed("item_created", feed_payload(new_item))
 
-    return {"item": new_item.to_dict(current_user_id=current_user.id)}, 201
+    # 202: the item exists, its photo is still being processed
+    status = 202 if photo is not None else 201
+    return {"item": new_item.to_dict(current_user_id=current_user.id)}, status
 
 
 @main_blueprint.route('/api/items/<int:item_id>', methods=['GET'])
@@ -446,49 +919,7 @@ def api_update_item(item_id):
     price = request.form.get("price")
     condition = request.form.get("condition")
     payment_options = request.form.getlist("payment_options")
-
-    # --- Optional image upload ---
-    f = request.files.get("image_file")
-    if f and f.filename:
-        image_file = f
-
-        if asset_folder == "marketplace":
-            # Read to memory so Pillow can validate the image
-            img_bytes = image_file.read()
-            img_file = io.BytesIO(img_bytes)
-
-            # Validate using magic bytes
-            try:
-                with Image.open(img_file) as img:
-                    if img.format not in ("PNG", "JPEG", "JPG"):
-                        return {"error": "Invalid image format"}, 400
-            except Exception:
-                return {"error": "Invalid image file"}, 400
-
-            # Reset pointer after Pillow read
-            img_file.seek(0)
-
-            # Upload to Cloudinary
-            filename = secure_filename(f"{current_user.id}_{image_file.filename}")
-
-            upload_result = cloudinary.uploader.upload(
-                img_file,
-                public_id=f"{filename}",
-                unique_filename=True,
-                overwrite=True,
-                asset_folder=asset_folder + "_uploads"
-            )
-
-            image_path = upload_result.get("secure_url")
-
-        else:  # asset_folder == "local_marketplace"; save locally
-            filename = secure_filename(f"{current_user.id}_{image_file.filename}")
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            image_file.save(filepath)
-            image_path = f"/static/uploads/{filename}"
-
-        # Only update item_photos if a new image was actually uploaded
-        item.item_photos = image_path
+    before = feed_payload(item)
 
     # --- Always update these fields ---
     item.name = name
@@ -506,11 +937,29 @@ def api_update_item(item_id):
 
         item.price = price_val
 
+    if any(m not in PAYMENT_METHODS for m in payment_options):
+        return {"error": "Invalid payment option"}, 400
+
     item.condition = condition
     item.payment_options = payment_options
 
+    # --- Optional image upload, processed in the background ---
+    # The current photo stays up until the new one is ready
+    f = request.files.get("image_file")
+    photo = None
+    if f and f.filename:
+        try:
+            photo = spool_upload(f, MAX_PHOTO_BYTES)
+        except InvalidImage as exc:
+            return {"error": str(exc)}, 400
+        queue_item_photo(item, photo, asset_folder)
+
     db.session.commit()
-    return {"item": item.to_dict(current_user_id=current_user.id)}
+    changed = {k: v for k, v in feed_payload(item).items() if before.get(k) != v}
+    if changed:
+        publish_feed("item_updated", {"id": item.id, **changed})
+    status = 202 if photo is not None else 200
+    return {"item": item.to_dict(current_user_id=current_user.id)}, status
 
 
 @main_blueprint.route('/api/items/<int:item_id>', methods=['DELETE'])
@@ -522,8 +971,18 @@ def api_delete_item(item_id):
     if item.seller_id != current_user.id:
         return {"error": "You can only delete your own items."}, 403
 
+    # SQLite doesn't enforce ON DELETE CASCADE, so clear bookmarks ourselves
+    Bookmark.query.filter_by(item_id=item_id).delete()
+    # Chats reference the item without a cascade: drop them and their messages,
+    # including lines still waiting in the buffer
+    chat_ids = db.session.scalars(db.select(Chat.id).where(Chat.item_id == item_id)).all()
+    if chat_ids:
+        message_buffer.discard(chat_ids)
+        Message.query.filter(Message.chat_id.in_(chat_ids)).delete(synchronize_session=False)
+        Chat.query.filter(Chat.id.in_(chat_ids)).delete(synchronize_session=False)
     db.session.delete(item)
     db.session.commit()
+    publish_feed("item_deleted", {"id": item_id})
     return {"status": "deleted", "id": item_id}
 
 
@@ -551,25 +1010,132 @@ def api_bookmark():
     if item is None:
         return jsonify({"error": "Item not found"}), 404
 
-    # Normalize bookmark list
-    bookmarks = current_user.bookmark_items or []
-    try:
-        bookmarks = [int(b) for b in bookmarks]
-    except (TypeError, ValueError):
-        bookmarks = []
-
-    # Toggle bookmark
+    # One idempotent INSERT or DELETE on the (user_id, item_id) primary key
     if bool(bookmarked):
-        if item_id not in bookmarks:
-            bookmarks.append(item_id)
+        Bookmark.add(current_user.id, item_id)
     else:
-        bookmarks = [b for b in bookmarks if b != item_id]
-
-    current_user.bookmark_items = bookmarks
+        Bookmark.remove(current_user.id, item_id)
     db.session.commit()
 
     return jsonify({
         "status": "ok",
         "bookmarked": bool(bookmarked),
-        "bookmarks": bookmarks,
+        "bookmarks": Bookmark.item_ids(current_user.id),
+    }), 200
+
+
+@main_blueprint.route("/api/bookmarks/batch", methods=["POST"])
+@login_required
+def api_bookmark_batch():
+    """
+    REST endpoint applying many bookmark toggles in one transaction.
+    Body: {"operations": [{"item_id": 1, "bookmarked": true}, ...]}
+    Later operations on the same item win, so a burst of clicks collapses
+    to its final state. Items that no longer exist are reported as missing.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get("operations")
+
+    if not isinstance(operations, list) or len(operations) > MAX_BOOKMARK_BATCH:
+        return jsonify({"error": "Invalid payload"}), 400
+
+    final_state = {}
+    for operation in operations:
+        if not isinstance(operation, dict):
+            return jsonify({"error": "Invalid payload"}), 400
+        item_id = operation.get("item_id")
+        bookmarked = operation.get("bookmarked")
+        if item_id is None or bookmarked is None:
+            return jsonify({"error": "Invalid payload"}), 400
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return jsonify({"error": "item_id must be an integer"}), 400
+        final_state[item_id] = bool(bookmarked)
+
+    existing = set(db.session.scalars(
+        db.select(Item.id).where(Item.id.in_(list(final_state)))
+    ))
+    to_add = [i for i, on in final_state.items() if on and i in existing]
+    to_remove = [i for i, on in final_state.items() if not on]
+
+    Bookmark.add(current_user.id, *to_add)
+    Bookmark.remove(current_user.id, *to_remove)
+    db.session.commit()
+
+    return jsonify({
+        "status": "ok",
+        "missing": sorted(set(final_state) - existing),
+        "bookmarks": Bookmark.item_ids(current_user.id),
     }), 200
+
+
+# =========================
+# REST API: Chats
+# =========================
+@main_blueprint.route("/api/items/<int:item_id>/chats", methods=["GET"])
+@login_required
+def api_item_chats(item_id):
+    """
+    REST endpoint for the seller's inbox: every buyer's conversation
+    about the item, oldest first, so the page can open one at a time.
+    """
+    seller_id = db.session.execute(db.select(Item.seller_id).where(Item.id == item_id)).scalar()
+    if seller_id is None:
+        return {"error": "Item not found"}, 404
+    if seller_id != current_user.id:
+        return {"error": "Only the seller can see this item's chats."}, 403
+
+    rows = db.session.execute(
+        db.select(Chat.id, Chat.buyer_id, User.first_name, User.last_name)
+        .join(User, User.id == Chat.buyer_id)
+        .where(Chat.item_id == item_id)
+        .order_by(Chat.id)
+    )
+    return {"chats": [
+        {"id": chat_id, "buyer_id": buyer_id, "buyer_name": f"{first} {last}"}
+        for chat_id, buyer_id, first, last in rows
+    ]}
+
+
+@main_blueprint.route("/api/chats/<int:chat_id>/messages", methods=["GET"])
+@login_required
+def api_chat_messages(chat_id):
+    """
+    REST endpoint for a chat's history, newest page first.
+
+    Optional query params:
+      ?before=  only messages older than this message id (next_before
+                from the previous page)
+      ?limit=   page size (capped at MAX_MESSAGE_PAGE)
+
+    Messages in a page are oldest first, ready to prepend to the chat box,
+    and name their sender the way live lines do (see sender_name).
+    """
+    chat = db.session.get(Chat, chat_id)
+    if chat is None:
+        return {"error": "Chat not found"}, 404
+    if not chat.has_member(current_user.id):
+        return {"error": "You are not part of this chat."}, 403
+
+    before = request.args.get("before", type=int)
+    limit = request.args.get("limit", DEFAULT_MESSAGE_PAGE, type=int)
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE))
+
+    # Lines this process hasn't written yet belong in the history too
+    message_buffer.flush()
+
+    query = (db.select(Message, User.first_name, User.last_name)
+             .join(User, User.id == Message.sender_id)
+             .where(Message.chat_id == chat_id))
+    if before is not None:
+        query = query.where(Message.id < before)
+    rows = db.session.execute(query.order_by(Message.id.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "messages": [{**m.to_dict(), "sender_name": f"{first} {last}"}
+                     for m, first, last in reversed(rows)],
+        "next_before": rows[-1].Message.id if has_more else None,
+    }